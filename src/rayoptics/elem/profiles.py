@@ -8,7 +8,7 @@
 .. codeauthor: Michael J. Hayford
 """
 import numpy as np
-from math import sqrt, copysign, sin, atan2
+from math import sqrt, copysign, sin, atan2, isfinite
 from scipy import optimize
 
 from rayoptics.util.misc_math import normalize
@@ -19,6 +19,11 @@ def resize_list(lst, new_length, null_item=None):
     return lst + [null_item for item in range(new_length - len(lst))]
 
 
+def sqrt_batch(x):
+    """ square root of array *x*, NaN where *x* is negative """
+    return np.sqrt(np.where(x < 0.0, np.nan, x))
+
+
 def intersect_parabola(cv, p, d, z_dir=1.0):
     ''' Intersect a parabolid, starting from an arbitrary point.
 
@@ -43,12 +48,100 @@ def intersect_parabola(cv, p, d, z_dir=1.0):
     return s, p1
 
 
+def intersect_quadratic_batch(ax2, b, cx2, p, d, z_dir):
+    ''' Solve the ray-conic quadratic for a batch of rays.
+
+    The coefficients follow the conventions of :meth:`Conic.intersect`, i.e.
+    ax2 = 2a, cx2 = 2c for the equation ax**2 + bx + c = 0.
+
+    Returns:
+        tuple: distances *s* (N,), intersection points *p1* (N, 3) and a
+        boolean *missed* mask (N,). *s* and *p1* are NaN for missed rays.
+    '''
+    disc = b*b - ax2*cx2
+    missed = disc < 0.0
+    # Use z_dir to pick correct root
+    s = cx2/(z_dir*np.sqrt(np.where(missed, 0.0, disc)) - b)
+    s[missed] = np.nan
+    p1 = p + s[:, np.newaxis]*d
+    return s, p1, missed
+
+
+def intersect_quadric_batch(cx, cy, cz, p, d, z_dir):
+    ''' Intersect a batch of rays with the quadric surface
+    2z = cx*x**2 + cy*y**2 + cz*z**2.
+
+    A conic of curvature cv is the quadric with cx = cy = cv and
+    cz = (cc+1)*cv.
+
+    Returns:
+        tuple: distances *s* (N,), intersection points *p1* (N, 3) and a
+        boolean *missed* mask (N,), as in :func:`intersect_quadratic_batch`.
+    '''
+    ax2 = cx*d[:, 0]*d[:, 0] + cy*d[:, 1]*d[:, 1] + cz*d[:, 2]*d[:, 2]
+    cx2 = cx*p[:, 0]*p[:, 0] + cy*p[:, 1]*p[:, 1] + cz*p[:, 2]*p[:, 2] - \
+        2.0*p[:, 2]
+    b = cx*d[:, 0]*p[:, 0] + cy*d[:, 1]*p[:, 1] + cz*d[:, 2]*p[:, 2] - d[:, 2]
+    return intersect_quadratic_batch(ax2, b, cx2, p, d, z_dir)
+
+
+def intersect_quadric(cx, cy, cz, p, d, z_dir):
+    ''' Intersect a ray with the quadric surface 2z = cx*x**2 + cy*y**2 +
+    cz*z**2, as :func:`intersect_quadric_batch` does for a batch of rays.
+
+    Returns:
+        the distance *s* to the intersection point, or None if the ray
+        misses the quadric
+    '''
+    ax2 = cx*d[0]*d[0] + cy*d[1]*d[1] + cz*d[2]*d[2]
+    cx2 = cx*p[0]*p[0] + cy*p[1]*p[1] + cz*p[2]*p[2] - 2.0*p[2]
+    b = cx*d[0]*p[0] + cy*d[1]*p[1] + cz*d[2]*p[2] - d[2]
+    disc = b*b - ax2*cx2
+    if disc < 0.0:
+        return None
+    # Use z_dir to pick correct root
+    return cx2/(z_dir*sqrt(disc) - b)
+
+
+# count of the changes to the attributes of all profiles, see
+#  :func:`profile_version`
+_profile_version = 0
+
+
+def profile_version():
+    """ returns a counter that changes when any profile is changed
+
+    The counter is advanced whenever an attribute of a profile is set,
+    including when a profile is created. In place changes to a coefficient
+    list are only counted once the profile's update() is called.
+    """
+    return _profile_version
+
+
 class SurfaceProfile:
     """Base class for surface profiles. """
 
+    def __setattr__(self, name, value):
+        global _profile_version
+        _profile_version += 1
+        super().__setattr__(name, value)
+
     def __repr__(self):
         return "{!s}()".format(type(self).__name__)
 
+    def __json_encode__(self):
+        attrs = dict(vars(self))
+        attrs.pop('_intersect_stats', None)
+        return attrs
+
+    def __getstate__(self):
+        # the intersection statistics aren't part of the profile definition;
+        # leaving them out keeps pickled snapshots of the model, e.g.
+        # batchtrace.path_state, independent of the traces done
+        attrs = dict(vars(self))
+        attrs.pop('_intersect_stats', None)
+        return attrs
+
     def update(self):
         return self
 
@@ -103,7 +196,9 @@ class SurfaceProfile:
         ''' Intersect a profile, starting from an arbitrary point.
 
         From Welford, Aberrations of Optical Systems (ISBN-10: 0852745648),
-        eqs 4.34 thru 4.41.
+        eqs 4.34 thru 4.41. The iteration starts from the intersection with
+        the base conic of the profile, see :meth:`base_conic_seed_scalar`,
+        or from the z=0 plane if the ray misses it.
 
         Args:
             p0:  start point of the ray in the profile's coordinate system
@@ -121,9 +216,16 @@ class SurfaceProfile:
 
         p0 = np.array([p[0]+(d[0]/d[2])*p[2], p[1]+(d[1]/d[2])*p[2], 0])
 
-        z1 = self.sag(p0[0], p0[1])
-        p1 = np.array([p0[0], p0[1], z1])
-        delta = abs(z1)
+        # start from the intersection with the base conic, if there is one,
+        #  otherwise from the ray's intersection with the z=0 plane
+        s0 = self.base_conic_seed_scalar(p, d, z_dir)
+        if s0 is None:
+            x1, y1, z0 = p0
+        else:
+            x1, y1, z0 = p + s0*d
+        z1 = self.sag(x1, y1)
+        p1 = np.array([x1, y1, z1])
+        delta = abs(z1 - z0)
         # print("intersect", z1)
         iter = 0
         while delta > eps and iter < 1000:
@@ -147,6 +249,9 @@ class SurfaceProfile:
         From Spencer and Murty, `General Ray-Tracing Procedure
         <https://doi.org/10.1364/JOSA.52.000672>`_
 
+        The Newton iteration starts from the intersection with the base
+        conic of the profile, see :meth:`base_conic_seed_scalar`.
+
         Args:
             p0:  start point of the ray in the profile's coordinate system
             d:  direction cosine of the ray in the profile's coordinate system
@@ -159,11 +264,14 @@ class SurfaceProfile:
         Raises:
             :exc:`~rayoptics.raytr.traceerror.TraceMissedSurfaceError`
         '''
-        p = p0
-        s1 = -self.f(p)/np.dot(d, self.df(p))
-        delta = abs(s1)
+        s0 = self.base_conic_seed_scalar(p0, d, z_dir)
+        if s0 is None:
+            s0 = 0.0
+        p = p0 + s0*d
+        s1 = s0 - self.f(p)/np.dot(d, self.df(p))
+        delta = abs(s1 - s0)
         # print("intersect", s1)
-        iter = 0
+        iter = 1
         while delta > eps and iter < 1000:
             p = p0 + s1*d
             s2 = s1 - self.f(p)/np.dot(d, self.df(p))
@@ -198,8 +306,9 @@ class SurfaceProfile:
                 return f, df
             return func
 
-        conic = mutate_profile(self, 'Conic')
-        s1, p1 = conic.intersect(p0, d, eps, z_dir)
+        s1 = self.base_conic_seed_scalar(p0, d, z_dir)
+        if s1 is None:
+            s1 = 0.0
         f = gen_f(self, p0, d, z_dir)
         sol = optimize.root_scalar(f, x0=s1, fprime=True,
                                    method='newton', xtol=eps, maxiter=1000)
@@ -208,6 +317,204 @@ class SurfaceProfile:
         # print('intersect iter =', sol.function_calls, sol.converged, sol.flag)
         return s, p1
 
+    def f_batch(self, p):
+        """Returns the profile surface function at the (N, 3) points *p*. """
+        return np.array([self.f(pi) for pi in p])
+
+    def df_batch(self, p):
+        """Returns the (N, 3) gradient of the profile at the points *p*. """
+        return np.array([self.df(pi) for pi in p]).reshape(-1, 3)
+
+    def ddf_batch(self, p):
+        """Returns the (N, 3, 3) Hessian of the profile at the points *p*.
+
+        The default implementation uses central differences of
+        :meth:`df_batch`; profiles with a closed form override this.
+        """
+        p = np.asarray(p, dtype=float)
+        ddf = np.empty((len(p), 3, 3))
+        h = 1e-6*np.maximum(1.0, np.abs(p))
+        for j in range(3):
+            dp = np.zeros_like(p)
+            dp[:, j] = h[:, j]
+            ddf[:, :, j] = ((self.df_batch(p + dp) - self.df_batch(p - dp)) /
+                            (2.0*h[:, j, np.newaxis]))
+        return ddf
+
+    def normal_batch(self, p):
+        """Returns the (N, 3) unit normals of the profile at points *p*. """
+        df = self.df_batch(p)
+        return df/np.linalg.norm(df, axis=1)[:, np.newaxis]
+
+    def normal_curvature_batch(self, p, t):
+        """Returns the normal curvatures of the profile in directions *t*.
+
+        The curvatures have the same sign convention as cv, i.e. they equal
+        cv everywhere on a sphere.
+
+        Args:
+            p: (N, 3) array of points on the profile
+            t: (N, 3) array of unit vectors tangent to the profile at *p*
+        """
+        df = self.df_batch(p)
+        tHt = np.einsum('ni,nij,nj->n', t, self.ddf_batch(p), t)
+        return -tHt/np.linalg.norm(df, axis=1)
+
+    def sag_batch(self, x, y):
+        """Returns the sag at the x, y arrays; NaN where the sag isn't defined.
+        """
+        z = np.full(np.shape(x), np.nan)
+        for i, (xi, yi) in enumerate(zip(x, y)):
+            try:
+                z[i] = self.sag(xi, yi)
+            except TraceMissedSurfaceError:
+                pass
+        return z
+
+    def intersect_batch(self, p0, d, eps, z_dir):
+        ''' Intersect a batch of rays with the profile.
+
+        The default implementation parallels :meth:`intersect`, using
+        :meth:`intersect_spencer_batch`.
+
+        Args:
+            p0: (N, 3) array of ray start points in the profile's coordinates
+            d: (N, 3) array of ray direction cosines in profile's coordinates
+            z_dir: +1 if propagation positive direction, -1 if otherwise
+            eps: numeric tolerance for convergence of any iterative procedure
+
+        Returns:
+            tuple: distances *s* (N,), intersection points *p* (N, 3) and a
+            boolean *missed* mask (N,). *s* and *p* are NaN for missed rays.
+        '''
+        s, p, missed, _, _ = self.intersect_spencer_batch(p0, d, eps, z_dir)
+        return s, p, missed
+
+    def intersect_spencer_batch(self, p0, d, eps, z_dir, max_iter=1000):
+        ''' Intersect a batch of rays with the profile.
+
+        A vectorized version of :meth:`intersect_spencer`. All of the rays
+        are iterated together, starting from the intersections with the
+        base conic; rays are retired from the iteration as they converge, so
+        the cost of each step is proportional to the number of rays still
+        active.
+
+        Args:
+            p0: (N, 3) array of ray start points in the profile's coordinates
+            d: (N, 3) array of ray direction cosines in profile's coordinates
+            z_dir: +1 if propagation positive direction, -1 if otherwise
+            eps: numeric tolerance for convergence of any iterative procedure
+            max_iter: maximum number of Newton iterations for a ray
+
+        Returns:
+            (**s**, **p**, **missed**, **num_iter**, **converged**)
+
+            - **s** - (N,) array of distances to the intersection points
+            - **p** - (N, 3) array of intersection points
+            - **missed** - (N,) boolean array, True if the ray missed the
+              profile; **s** and **p** are NaN for these rays
+            - **num_iter** - (N,) array of the number of Newton steps for
+              each ray
+            - **converged** - (N,) boolean array, True if the iteration
+              converged within *max_iter* steps
+        '''
+        s0 = self.base_conic_seed(p0, d, z_dir)
+        p = p0 + s0[:, np.newaxis]*d
+        s1 = s0 - self.f_batch(p)/np.einsum('ij,ij->i', d, self.df_batch(p))
+        num_iter = np.ones(len(p0), dtype=int)
+        active = np.abs(s1 - s0) > eps
+        idx = np.flatnonzero(active)
+        iter = 1
+        while len(idx) > 0 and iter < max_iter:
+            p_act = p0[idx] + s1[idx, np.newaxis]*d[idx]
+            s2 = s1[idx] - (self.f_batch(p_act) /
+                            np.einsum('ij,ij->i', d[idx],
+                                      self.df_batch(p_act)))
+            delta = np.abs(s2 - s1[idx])
+            p[idx] = p_act
+            s1[idx] = s2
+            num_iter[idx] += 1
+            # retire converged rays, and any that have failed numerically
+            idx = idx[delta > eps]
+            iter += 1
+
+        missed = ~np.isfinite(s1)
+        s1[missed] = np.nan
+        p[missed] = np.nan
+        active[:] = False
+        active[idx] = True
+        converged = ~active & ~missed
+        self.record_iterations(num_iter)
+        return s1, p, missed, num_iter, converged
+
+    def base_conic(self):
+        """Returns the (cx, cy, cz) coefficients of the profile's base conic.
+
+        The base conic is the quadric surface 2z = cx*x**2 + cy*y**2 + cz*z**2
+        that an aspheric or toroidal profile departs from. Returns None if
+        the profile doesn't have a base conic.
+        """
+        return None
+
+    def base_conic_seed(self, p0, d, z_dir):
+        """Returns the (N,) starting distances for an iterative intersection.
+
+        These are the distances to the closed form intersection of the rays
+        with the :meth:`base_conic`, or zero, i.e. the ray start points,
+        where there is no base conic or the ray misses it.
+        """
+        s0 = np.zeros(len(p0))
+        coefs = self.base_conic()
+        if coefs is not None:
+            s, _, missed = intersect_quadric_batch(*coefs, p0, d, z_dir)
+            s0[~missed] = s[~missed]
+        return s0
+
+    def base_conic_seed_scalar(self, p0, d, z_dir):
+        """Returns the distance to the closed form intersection of a single
+        ray with the :meth:`base_conic`, or None where there is no base conic
+        or the ray misses it.
+        """
+        coefs = self.base_conic()
+        if coefs is not None:
+            s = intersect_quadric(*coefs, p0, d, z_dir)
+            if s is not None and isfinite(s):
+                return s
+        return None
+
+    def record_iterations(self, num_iter):
+        """Add *num_iter*, the Newton steps of an intersection, to the
+        statistics returned by :meth:`intersect_stats`.
+        """
+        num_iter = np.asarray(num_iter)
+        stats = self.__dict__.setdefault('_intersect_stats',
+                                         np.zeros(3, dtype=int))
+        stats[0] += num_iter.size
+        stats[1] += num_iter.sum()
+        stats[2] = max(stats[2], num_iter.max(initial=0))
+
+    def reset_intersect_stats(self):
+        """Clear the statistics returned by :meth:`intersect_stats`. """
+        self.__dict__.pop('_intersect_stats', None)
+
+    def intersect_stats(self):
+        """Returns statistics of the iterative intersections of the profile.
+
+        The batch intersections with the profile accumulate the number of
+        Newton steps, i.e. evaluations of f and df, per ray, until the
+        statistics are reset by :meth:`reset_intersect_stats`. The single
+        ray intersections aren't counted, to keep them cheap.
+
+        Returns:
+            (**num_rays**, **mean_iter**, **max_iter**), the number of rays
+            intersected, and the mean and maximum number of Newton steps per
+            ray
+        """
+        num_rays, num_iter, max_iter = self.__dict__.get(
+            '_intersect_stats', np.zeros(3, dtype=int))
+        mean_iter = num_iter/num_rays if num_rays > 0 else 0.0
+        return int(num_rays), mean_iter, int(max_iter)
+
 
 class Spherical(SurfaceProfile):
     """ Spherical surface profile parameterized by curvature. """
@@ -315,6 +622,33 @@ class Spherical(SurfaceProfile):
         else:
             return 0
 
+    def intersect_batch(self, p, d, eps, z_dir):
+        ''' Intersection of a batch of rays with a sphere. '''
+        ax2 = self.cv
+        cx2 = self.cv * np.einsum('ij,ij->i', p, p) - 2*p[:, 2]
+        b = self.cv * np.einsum('ij,ij->i', d, p) - d[:, 2]
+        return intersect_quadratic_batch(ax2, b, cx2, p, d, z_dir)
+
+    def f_batch(self, p):
+        return p[:, 2] - 0.5*self.cv*np.einsum('ij,ij->i', p, p)
+
+    def df_batch(self, p):
+        df = -self.cv*p
+        df[:, 2] += 1.0
+        return df
+
+    def ddf_batch(self, p):
+        return np.broadcast_to(-self.cv*np.identity(3), (len(p), 3, 3))
+
+    def sag_batch(self, x, y):
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        if self.cv != 0.0:
+            r = 1/self.cv
+            adj = sqrt_batch(r*r - x*x - y*y)
+            return r*(1 - np.abs(adj/r))
+        else:
+            return np.zeros_like(x)
+
     def profile(self, sd, dir=1, steps=6):
         prf = []
         if len(sd) == 1:
@@ -487,6 +821,35 @@ class Conic(SurfaceProfile):
             raise TraceMissedSurfaceError
         return z
 
+    def intersect_batch(self, p, d, eps, z_dir):
+        ''' Intersection of a batch of rays with a conic. '''
+        ax2 = self.cv*(1. + self.cc*d[:, 2]*d[:, 2])
+        cx2 = self.cv*(p[:, 0]*p[:, 0] + p[:, 1]*p[:, 1] +
+                       self.ec*p[:, 2]*p[:, 2]) - 2.0*p[:, 2]
+        b = self.cv*(d[:, 0]*p[:, 0] + d[:, 1]*p[:, 1] +
+                     self.ec*d[:, 2]*p[:, 2]) - d[:, 2]
+        return intersect_quadratic_batch(ax2, b, cx2, p, d, z_dir)
+
+    def f_batch(self, p):
+        return p[:, 2] - 0.5*self.cv*(p[:, 0]*p[:, 0] +
+                                      p[:, 1]*p[:, 1] +
+                                      (self.cc+1.0)*p[:, 2]*p[:, 2])
+
+    def df_batch(self, p):
+        df = -self.cv*p
+        df[:, 2] = 1.0-(self.cc+1.0)*self.cv*p[:, 2]
+        return df
+
+    def ddf_batch(self, p):
+        ddf = np.diag([-self.cv, -self.cv, -(self.cc+1.0)*self.cv])
+        return np.broadcast_to(ddf, (len(p), 3, 3))
+
+    def sag_batch(self, x, y):
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        r2 = x*x + y*y
+        z = self.cv*r2/(1. + sqrt_batch(1. - (self.cc+1.0)*self.cv*self.cv*r2))
+        return z
+
     def profile(self, sd, dir=1, steps=6):
         prf = []
         if len(sd) == 1:
@@ -675,6 +1038,9 @@ class EvenPolynomial(SurfaceProfile):
         self.gen_coef_list()
         return self
 
+    def base_conic(self):
+        return self.cv, self.cv, (self.cc+1.0)*self.cv
+
     def sag(self, x, y):
         r2 = x*x + y*y
         try:
@@ -713,6 +1079,67 @@ class EvenPolynomial(SurfaceProfile):
         e_tot = e + e_asp
         return np.array([-e_tot*p[0], -e_tot*p[1], 1.0])
 
+    def sag_batch(self, x, y):
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        r2 = x*x + y*y
+        # sphere + conic contribution
+        z = self.cv*r2/(1. + sqrt_batch(1. - (self.cc+1.0)*self.cv*self.cv*r2))
+
+        # polynomial asphere contribution
+        z_asp = np.zeros_like(r2)
+        r_pow = r2
+        for i in range(self.max_nonzero_coef):
+            z_asp += self.coefs[i]*r_pow
+            r_pow = r_pow*r2
+
+        z_tot = z + z_asp
+        return z_tot
+
+    def f_batch(self, p):
+        return p[:, 2] - self.sag_batch(p[:, 0], p[:, 1])
+
+    def df_batch(self, p):
+        # sphere + conic contribution
+        r2 = p[:, 0]*p[:, 0] + p[:, 1]*p[:, 1]
+        e = self.cv/sqrt_batch(1. - self.ec*self.cv*self.cv*r2)
+
+        # polynomial asphere contribution
+        r_pow = np.ones_like(r2)
+        e_asp = np.zeros_like(r2)
+        c_coef = 2.0
+        for i in range(self.max_nonzero_coef):
+            e_asp += c_coef*self.coefs[i]*r_pow
+            c_coef += 2.0
+            r_pow = r_pow*r2
+
+        e_tot = e + e_asp
+        return np.stack([-e_tot*p[:, 0], -e_tot*p[:, 1],
+                         np.ones_like(e_tot)], axis=1)
+
+    def ddf_batch(self, p):
+        x, y = p[:, 0], p[:, 1]
+        r2 = x*x + y*y
+        # sphere + conic contribution, e and its derivative wrt r2
+        arg = 1. - self.ec*self.cv*self.cv*r2
+        e = self.cv/sqrt_batch(arg)
+        de = 0.5*self.ec*self.cv**3/(arg*sqrt_batch(arg))
+
+        # polynomial asphere contribution
+        r_pow = np.ones_like(r2)
+        c_coef = 2.0
+        for i in range(self.max_nonzero_coef):
+            e = e + c_coef*self.coefs[i]*r_pow
+            if i < self.max_nonzero_coef - 1:
+                de = de + (c_coef+2.0)*(i+1)*self.coefs[i+1]*r_pow
+            c_coef += 2.0
+            r_pow = r_pow*r2
+
+        ddf = np.zeros((len(p), 3, 3))
+        ddf[:, 0, 0] = -e - 2.0*de*x*x
+        ddf[:, 1, 1] = -e - 2.0*de*y*y
+        ddf[:, 0, 1] = ddf[:, 1, 0] = -2.0*de*x*y
+        return ddf
+
     def profile(self, sd, dir=1, steps=21):
         return aspheric_profile(self, sd, dir, steps)
 
@@ -866,6 +1293,9 @@ class RadialPolynomial(SurfaceProfile):
         self.gen_coef_list()
         return self
 
+    def base_conic(self):
+        return self.cv, self.cv, self.ec*self.cv
+
     def sag(self, x, y):
         r2 = x*x + y*y
         r = sqrt(r2)
@@ -911,6 +1341,47 @@ class RadialPolynomial(SurfaceProfile):
         e_tot = e + e_asp
         return np.array([-e_tot*p[0], -e_tot*p[1], 1.0])
 
+    def sag_batch(self, x, y):
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        r2 = x*x + y*y
+        r = np.sqrt(r2)
+        # sphere + conic contribution
+        z = self.cv*r2/(1. + sqrt_batch(1. - self.ec*self.cv*self.cv*r2))
+
+        # polynomial asphere contribution
+        z_asp = np.zeros_like(r2)
+        r_pow = r
+        for coef in self.coefs[:self.max_nonzero_coef]:
+            z_asp += coef*r_pow
+            r_pow = r_pow*r
+
+        z_tot = z + z_asp
+        return z_tot
+
+    def f_batch(self, p):
+        return p[:, 2] - self.sag_batch(p[:, 0], p[:, 1])
+
+    def df_batch(self, p):
+        # sphere + conic contribution
+        r2 = p[:, 0]*p[:, 0] + p[:, 1]*p[:, 1]
+        r = np.sqrt(r2)
+        e = self.cv/sqrt_batch(1. - self.ec*self.cv*self.cv*r2)
+
+        # polynomial asphere contribution - compute using Horner's Rule
+        e_asp = np.zeros_like(r2)
+        # Initialize to 1/r because we multiply by r's components p[0] and
+        # p[1] at the final normalization step.
+        r_pow = np.divide(1.0, r, out=np.ones_like(r), where=r != 0.0)
+        c_coef = 1.0
+        for coef in self.coefs[:self.max_nonzero_coef]:
+            e_asp += c_coef*coef*r_pow
+            c_coef += 1.0
+            r_pow = r_pow*r
+
+        e_tot = e + e_asp
+        return np.stack([-e_tot*p[:, 0], -e_tot*p[:, 1],
+                         np.ones_like(e_tot)], axis=1)
+
     def profile(self, sd, dir=1, steps=21):
         return aspheric_profile(self, sd, dir, steps)
 
@@ -1069,6 +1540,9 @@ class YToroid(SurfaceProfile):
         self.gen_coef_list()
         return self
 
+    def base_conic(self):
+        return self.cR, self.cv, (self.cc+1.0)*self.cv
+
     def sag(self, x, y):
         fY = self.fY(y)
         if self.cR == 0:
@@ -1123,6 +1597,60 @@ class YToroid(SurfaceProfile):
 
         return np.array([Fx, Fy, Fz])
 
+    def sag_batch(self, x, y):
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        fY = self.fY_batch(y)
+        if self.cR == 0:
+            return fY
+        else:
+            rRp = self.rR - fY
+            z = rRp - sqrt_batch(rRp*rRp - x*x)
+
+            z_tot = z + fY
+            return z_tot
+
+    def fY_batch(self, y):
+        y2 = y*y
+        # sphere + conic contribution
+        z = self.cv*y2/(1. + sqrt_batch(1. - (self.cc+1.0)*self.cv*self.cv*y2))
+
+        # polynomial asphere contribution
+        z_asp = np.zeros_like(y2)
+        y_pow = y2
+        for i in range(self.max_nonzero_coef):
+            z_asp += self.coefs[i]*y_pow
+            y_pow = y_pow*y2
+
+        z_tot = z + z_asp
+        return z_tot
+
+    def f_batch(self, p):
+        fY = self.fY_batch(p[:, 1])
+        return (p[:, 2] - fY -
+                self.cR*(p[:, 0]*p[:, 0] + p[:, 2]*p[:, 2] - fY*fY)/2)
+
+    def df_batch(self, p):
+        # sphere + conic contribution
+        y2 = p[:, 1]*p[:, 1]
+        e = (self.cv*p[:, 1])/sqrt_batch(1. -
+                                         (self.cc+1.0)*self.cv*self.cv*y2)
+
+        # polynomial asphere contribution
+        e_asp = np.zeros_like(y2)
+        y_pow = np.ones_like(y2)
+        c_coef = 2.0
+        for i in range(self.max_nonzero_coef):
+            e_asp += c_coef*self.coefs[i]*y_pow
+            c_coef += 2.0
+            y_pow = y_pow*y2
+
+        dfdY = e + e_asp
+        Fx = -self.cR*p[:, 0]
+        Fy = (self.cR*self.fY_batch(p[:, 1]) - 1)*(dfdY)
+        Fz = 1 - self.cR*p[:, 2]
+
+        return np.stack([Fx, Fy, Fz], axis=1)
+
     def profile(self, sd, dir=1, steps=21):
         return aspheric_profile(self, sd, dir, steps)
 
@@ -1153,6 +1681,9 @@ class XToroid(YToroid):
     def normal(self, p):
         return super().normal(np.array([p[1], p[0], p[2]]))
 
+    def base_conic(self):
+        return self.cv, self.cR, (self.cc+1.0)*self.cv
+
     def sag(self, x, y):
         return super().sag(y, x)
 
@@ -1162,6 +1693,18 @@ class XToroid(YToroid):
     def df(self, p):
         return super().df(np.array([p[1], p[0], p[2]]))
 
+    def normal_batch(self, p):
+        return super().normal_batch(p[:, [1, 0, 2]])
+
+    def sag_batch(self, x, y):
+        return super().sag_batch(y, x)
+
+    def f_batch(self, p):
+        return super().f_batch(p[:, [1, 0, 2]])
+
+    def df_batch(self, p):
+        return super().df_batch(p[:, [1, 0, 2]])
+
 
 dispatch = {
   (Spherical, Spherical): Spherical.copyDataFrom,
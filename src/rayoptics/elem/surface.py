@@ -200,6 +200,31 @@ class Surface(interface.Interface):
     def normal(self, p):
         return self.profile.normal(p)
 
+    def intersect_batch(self, p0, d, eps=1.0e-12, z_dir=1.0):
+        return self.profile.intersect_batch(p0, d, eps, z_dir)
+
+    def normal_batch(self, p):
+        return self.profile.normal_batch(p)
+
+    def point_inside(self, x, y):
+        """ Returns True if x, y is inside all of the clear apertures.
+
+        A surface without clear apertures doesn't block any rays.
+        """
+        for ca in self.clear_apertures:
+            if not ca.point_inside(x, y):
+                return False
+        return True
+
+    def point_inside_batch(self, x, y):
+        """ Returns a boolean array, True where x, y are inside all of the
+        clear apertures.
+        """
+        is_inside = np.ones(np.shape(x), dtype=bool)
+        for ca in self.clear_apertures:
+            is_inside &= ca.point_inside_batch(x, y)
+        return is_inside
+
 
 class DecenterData():
     """ Maintains data and actions for position and orientation changes.
@@ -282,6 +307,12 @@ class Aperture():
     def point_inside(self, x, y):
         pass
 
+    def point_inside_batch(self, x, y):
+        """ Returns a boolean array, True where x, y are inside the aperture.
+        """
+        return np.array([self.point_inside(xi, yi) for xi, yi in zip(x, y)],
+                        dtype=bool)
+
     def bounding_box(self):
         center = np.array([self.x_offset, self.y_offset])
         extent = np.array(self.dimension())
@@ -292,8 +323,8 @@ class Aperture():
         self.y_offset *= scale_factor
 
     def tform(self, x, y):
-        x -= self.x_offset
-        y -= self.y_offset
+        x = x - self.x_offset
+        y = y - self.y_offset
         return x, y
 
 
@@ -315,6 +346,10 @@ class Circular(Aperture):
         x, y = self.tform(x, y)
         return sqrt(x*x + y*y) <= self.radius
 
+    def point_inside_batch(self, x, y):
+        x, y = self.tform(x, y)
+        return np.sqrt(x*x + y*y) <= self.radius
+
     def apply_scale_factor(self, scale_factor):
         super().apply_scale_factor(scale_factor)
         self.radius *= scale_factor
@@ -337,6 +372,11 @@ class Rectangular(Aperture):
         x, y = self.tform(x, y)
         return abs(x) <= self.x_half_width and abs(y) <= self.y_half_width
 
+    def point_inside_batch(self, x, y):
+        x, y = self.tform(x, y)
+        return ((np.abs(x) <= self.x_half_width) &
+                (np.abs(y) <= self.y_half_width))
+
     def apply_scale_factor(self, scale_factor):
         super().apply_scale_factor(scale_factor)
         self.x_half_width *= scale_factor
@@ -356,6 +396,14 @@ class Elliptical(Aperture):
         self.x_half_width = abs(x)
         self.y_half_width = abs(y)
 
+    def point_inside(self, x, y):
+        x, y = self.tform(x, y)
+        xa, ya = x/self.x_half_width, y/self.y_half_width
+        return xa*xa + ya*ya <= 1.0
+
+    def point_inside_batch(self, x, y):
+        return self.point_inside(x, y)
+
     def apply_scale_factor(self, scale_factor):
         super().apply_scale_factor(scale_factor)
         self.x_half_width *= scale_factor
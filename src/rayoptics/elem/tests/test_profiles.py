@@ -9,7 +9,9 @@ Created on Wed Oct 18 10:59:29 2017
 
 import unittest
 from pytest import approx
-from rayoptics.elem.profiles import Spherical, EvenPolynomial
+from rayoptics.elem.profiles import (Spherical, Conic, EvenPolynomial,
+                                     RadialPolynomial, YToroid, XToroid)
+from rayoptics.raytr.traceerror import TraceMissedSurfaceError
 from rayoptics.util.misc_math import normalize
 import numpy as np
 import numpy.testing as npt
@@ -154,5 +156,91 @@ class SphericalProfileTestCase(unittest.TestCase):
         npt.assert_allclose(dir_p1s1, dir_p1s1_truth, rtol=1e-14)
 
 
+class BatchProfileTestCase(unittest.TestCase):
+    def setUp(self):
+        y = np.linspace(-16., 16., 9)
+        self.p0 = np.stack([0.5*y, y, np.full_like(y, -1.)], axis=1)
+        self.d = np.tile(normalize(np.array([0.05, -0.1, 1.])), (len(y), 1))
+        self.eps = 1.0e-12
+        self.z_dir = 1.0
+
+    def compare_to_scalar(self, prf):
+        s, p, missed = prf.intersect_batch(self.p0, self.d,
+                                           self.eps, self.z_dir)
+        for i in range(len(self.p0)):
+            try:
+                s_i, p_i = prf.intersect(self.p0[i], self.d[i],
+                                         self.eps, self.z_dir)
+            except TraceMissedSurfaceError:
+                self.assertTrue(missed[i])
+                self.assertTrue(np.isnan(s[i]))
+            else:
+                self.assertFalse(missed[i])
+                self.assertAlmostEqual(s[i], s_i, places=12)
+                npt.assert_allclose(p[i], p_i, rtol=1e-14, atol=1e-14)
+                npt.assert_allclose(prf.normal_batch(p[i:i+1])[0],
+                                    prf.normal(p_i), rtol=1e-14, atol=1e-14)
+                self.assertAlmostEqual(prf.f_batch(p[i:i+1])[0],
+                                       prf.f(p_i), places=12)
+                self.assertAlmostEqual(prf.sag_batch(p[i:i+1, 0],
+                                                     p[i:i+1, 1])[0],
+                                       prf.sag(p_i[0], p_i[1]), places=12)
+        return missed
+
+    def test_spherical(self):
+        missed = self.compare_to_scalar(Spherical(r=15.))
+        self.assertFalse(np.all(missed))
+        self.assertTrue(np.any(missed))
+        self.compare_to_scalar(Spherical(r=-25.))
+        self.compare_to_scalar(Spherical(c=0.))
+
+    def test_conic(self):
+        self.compare_to_scalar(Conic(r=15., cc=-1.))
+        self.compare_to_scalar(Conic(r=-25., cc=-2.5))
+        self.compare_to_scalar(Conic(r=20., cc=0.5))
+
+
+    def test_iterative_profiles(self):
+        prfs = [EvenPolynomial(r=-30., cc=-0.5,
+                               coefs=[0., 1.e-4, -2.e-7, 1.e-10]),
+                RadialPolynomial(r=40., ec=0.5,
+                                 coefs=[0., 1.e-3, -1.e-5, 0., 1.e-8]),
+                YToroid(r=30., rR=-60., cc=-0.3, coefs=[0., 1.e-5]),
+                XToroid(r=30., rR=-60., cc=-0.3, coefs=[0., 1.e-5])]
+        for prf in prfs:
+            with self.subTest(profile=prf):
+                prf.update()
+                s, p, missed, num_iter, converged = \
+                    prf.intersect_spencer_batch(self.p0, self.d,
+                                                self.eps, self.z_dir)
+                self.assertTrue(np.all(converged))
+                self.assertTrue(np.all(num_iter > 0))
+                self.compare_to_scalar(prf)
+
+    def test_base_conic_seed(self):
+        # without polynomial terms the base conic seed is the intersection
+        prfs = [EvenPolynomial(r=-30., cc=-0.5),
+                RadialPolynomial(r=40., ec=0.5)]
+        for prf in prfs:
+            with self.subTest(profile=prf):
+                prf.update()
+                prf.reset_intersect_stats()
+                s, p, missed, num_iter, converged = \
+                    prf.intersect_spencer_batch(self.p0, self.d,
+                                                self.eps, self.z_dir)
+                self.assertTrue(np.all(num_iter[converged] == 1))
+                num_rays, mean_iter, max_iter = prf.intersect_stats()
+                self.assertEqual(num_rays, len(self.p0))
+                self.assertEqual(max_iter, np.max(num_iter))
+                self.assertAlmostEqual(mean_iter, np.mean(num_iter))
+                self.assertNotIn('_intersect_stats', prf.__json_encode__())
+                # the single ray seed matches the batch seed
+                s0 = prf.base_conic_seed(self.p0, self.d, self.z_dir)
+                for p0, d, s0_i in zip(self.p0, self.d, s0):
+                    s0_scalar = prf.base_conic_seed_scalar(p0, d, self.z_dir)
+                    self.assertAlmostEqual(0.0 if s0_scalar is None
+                                           else s0_scalar, s0_i, places=12)
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=3)
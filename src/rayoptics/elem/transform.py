@@ -117,7 +117,8 @@ def transform_after_surface(interface, ray_seg):
 
     Args:
         interface: the :class:'~seq.interface.Interface' for the path sequence
-        ray_seg: ray segment exiting from **interface**
+        ray_seg: ray segment exiting from **interface**; the point and
+                 direction may also be (N, 3) arrays for a batch of rays
 
     Returns:
         (**b4_pt**, **b4_dir**)
@@ -131,8 +132,8 @@ def transform_after_surface(interface, ray_seg):
         if r is None:
             b4_pt, b4_dir = (ray_seg[0] - t), ray_seg[1]
         else:
-            rt = r.transpose()
-            b4_pt, b4_dir = rt.dot(ray_seg[0] - t), rt.dot(ray_seg[1])
+            # v.dot(r) == r.transpose().dot(v), for single vectors and (N, 3)
+            b4_pt, b4_dir = (ray_seg[0] - t).dot(r), ray_seg[1].dot(r)
     else:
         b4_pt, b4_dir = ray_seg[0], ray_seg[1]
 
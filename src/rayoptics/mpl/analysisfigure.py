@@ -361,19 +361,32 @@ class Wavefront():
 class DiffractionPSF():
     """Point Spread Function (PSF) calculation and display.
 
+    By default, the PSF is calculated with a zero padded FFT of size
+    **maxdim**. If a **pitch** is given, the PSF is instead calculated on a
+    window of **npix** pixels of that pitch with a matrix Fourier
+    transform, see :func:`~.analyses.calc_psf_mft`.
+
     Attributes:
         pupil_grid: a RayGrid instance
         maxdim: the size of the sampling array
+        pitch: optional, the pixel pitch of the image window, in system units
+        npix: the number of pixels across the image window, defaults to
+              **maxdim**
+        center: the x, y offset of the center of the image window from the
+                reference image point
         title: title, if desired, of this plot panel
         yaxis_ticks_position: 'left' or 'right', default is 'left'
         cmap: color map for plot, defaults to 'RdBu_r'
         kwargs: passed to plot call
     """
 
-    def __init__(self, pupil_grid, maxdim,
-                 yaxis_ticks_position='left', **kwargs):
+    def __init__(self, pupil_grid, maxdim, pitch=None, npix=None,
+                 center=None, yaxis_ticks_position='left', **kwargs):
         self.pupil_grid = pupil_grid
         self.maxdim = maxdim
+        self.pitch = pitch
+        self.npix = maxdim if npix is None else npix
+        self.center = np.array([0., 0.]) if center is None else center
 
         if 'title' in kwargs:
             self.title = kwargs.pop('title', None)
@@ -393,12 +406,22 @@ class DiffractionPSF():
 
     def init_axis(self, ax):
         pupil_grid = self.pupil_grid
-        delta_x, delta_xp = analyses.calc_psf_scaling(pupil_grid,
-                                                      pupil_grid.num_rays,
-                                                      self.maxdim)
-        image_scale = self.image_scale = delta_xp * self.maxdim
-        ax.set_xlim(-image_scale, image_scale)
-        ax.set_ylim(-image_scale, image_scale)
+        if self.pitch is None:
+            delta_x, delta_xp = analyses.calc_psf_scaling(pupil_grid,
+                                                          pupil_grid.num_rays,
+                                                          self.maxdim)
+            image_scale = self.image_scale = delta_xp * self.maxdim / 2
+            self.extent = [-image_scale, image_scale,
+                           -image_scale, image_scale]
+        else:
+            nx, ny = np.broadcast_to(self.npix, (2,))
+            half_x = nx*self.pitch/2
+            half_y = ny*self.pitch/2
+            cx, cy = self.center
+            self.image_scale = max(half_x, half_y)
+            self.extent = [cx - half_x, cx + half_x, cy - half_y, cy + half_y]
+        ax.set_xlim(*self.extent[:2])
+        ax.set_ylim(*self.extent[2:])
         ax.tick_params(labelbottom=False, labelleft=False)
         ax.yaxis.set_ticks_position(self.yaxis_ticks_position)
         if self.title is not None:
@@ -411,18 +434,20 @@ class DiffractionPSF():
 
     def update_data(self, build='rebuild'):
         self.pupil_grid.update_data(build=build)
-        ndim = self.pupil_grid.num_rays
-        maxdim = self.maxdim
-        self.AP = analyses.calc_psf(self.pupil_grid.grid[2], ndim, maxdim)
+        if self.pitch is None:
+            ndim = self.pupil_grid.num_rays
+            maxdim = self.maxdim
+            self.AP = analyses.calc_psf(self.pupil_grid.grid[2], ndim, maxdim)
+        else:
+            self.AP = analyses.calc_psf_mft(self.pupil_grid, self.npix,
+                                            self.pitch, center=self.center)
         return self
 
     def plot(self, ax):
-        image_scale = self.image_scale
-        hmap = ax.imshow(self.AP,
+        hmap = ax.imshow(self.AP.T,
                          origin='lower',
                          norm=self.norm,
-                         extent=[-image_scale, image_scale,
-                                 -image_scale, image_scale],
+                         extent=self.extent,
                          **self.plot_kwargs
                          )
         ax.figure.colorbar(hmap, ax=ax, use_gridspec=True)
@@ -14,19 +14,55 @@ from rayoptics.mpl.axisarrayfigure import Fit
 from rayoptics.mpl.styledfigure import StyledFigure
 
 from rayoptics.raytr.opticalspec import Field
-from rayoptics.raytr.trace import trace_astigmatism
+from rayoptics.raytr.trace import trace_astigmatism_coddington_fans
 from rayoptics.parax.thirdorder import compute_third_order
 
 
+def astigmatism_curve_data(opt_model, eval_fct=None, num_flds=21):
+    """ returns the sagittal and tangential foci over the y field range
+
+    Args:
+        opt_model: the :class:`~.OpticalModel`
+        eval_fct: function evaluating the astigmatism at a single field,
+                  with the signature of :func:`~.trace.trace_astigmatism`.
+                  If None, all of the fields are evaluated together by
+                  :func:`~.trace.trace_astigmatism_coddington_fans`.
+        num_flds: number of field points from 0 to the maximum field
+
+    Returns:
+        (**s_data**, **t_data**, **field_data**) lists
+    """
+    osp = opt_model.optical_spec
+    _, wvl, foc = osp.lookup_fld_wvl_focus(0)
+    max_field = osp.field_of_view.max_field()[0]
+    field_data = list(np.linspace(0., max_field, num=num_flds))
+    if eval_fct is None:
+        flds = [Field(y=f) for f in field_data]
+        s_data, t_data = trace_astigmatism_coddington_fans(opt_model, flds,
+                                                           wvl, foc)
+        return list(s_data), list(t_data), field_data
+
+    s_data = []
+    t_data = []
+    fld = Field()
+    for f in field_data:
+        fld.y = f
+        s_foc, t_foc = eval_fct(opt_model, fld, wvl, foc)
+        s_data.append(s_foc)
+        t_data.append(t_foc)
+    return s_data, t_data, field_data
+
+
 class FieldCurveFigure(StyledFigure):
     """ Plot of astigmatism curves """
 
     def __init__(self, opt_model,
-                 eval_fct=trace_astigmatism,
+                 eval_fct=None, num_flds=21,
                  **kwargs):
         self.opt_model = opt_model
         self.scale_type = Fit.All
         self.eval_fct = eval_fct
+        self.num_flds = num_flds
 
         super().__init__(**kwargs)
 
@@ -38,20 +74,8 @@ class FieldCurveFigure(StyledFigure):
         return self
 
     def update_data(self, **kwargs):
-        self.s_data = []
-        self.t_data = []
-        self.field_data = []
-
-        osp = self.opt_model.optical_spec
-        _, wvl, foc = osp.lookup_fld_wvl_focus(0)
-        fld = Field()
-        max_field = osp.field_of_view.max_field()[0]
-        for f in np.linspace(0., max_field, num=21):
-            fld.y = f
-            s_foc, t_foc = self.eval_fct(self.opt_model, fld, wvl, foc)
-            self.s_data.append(s_foc)
-            self.t_data.append(t_foc)
-            self.field_data.append(f)
+        self.s_data, self.t_data, self.field_data = astigmatism_curve_data(
+            self.opt_model, eval_fct=self.eval_fct, num_flds=self.num_flds)
         return self
 
     def plot(self):
@@ -132,28 +156,17 @@ class AnalysisPlot(abc.ABC):
 
 
 class AstigmatismCurvePlot(AnalysisPlot):
-    def __init__(self, opt_model, eval_fct=trace_astigmatism, **kwargs):
+    def __init__(self, opt_model, eval_fct=None, num_flds=21, **kwargs):
         super().__init__(opt_model)
         self.scale_type = Fit.All
         self.eval_fct = eval_fct
+        self.num_flds = num_flds
 
         self.update_data()
 
     def update_data(self, **kwargs):
-        self.s_data = []
-        self.t_data = []
-        self.field_data = []
-
-        osp = self.opt_model.optical_spec
-        _, wvl, foc = osp.lookup_fld_wvl_focus(0)
-        fld = Field()
-        max_field = osp.field_of_view.max_field()[0]
-        for f in np.linspace(0., max_field, num=21):
-            fld.y = f
-            s_foc, t_foc = self.eval_fct(self.opt_model, fld, wvl, foc)
-            self.s_data.append(s_foc)
-            self.t_data.append(t_foc)
-            self.field_data.append(f)
+        self.s_data, self.t_data, self.field_data = astigmatism_curve_data(
+            self.opt_model, eval_fct=self.eval_fct, num_flds=self.num_flds)
 
     def plot(self):
         self.ax.cla()
@@ -104,7 +104,7 @@ class DiffractiveElement:
               .format(self.ref_pt[0], self.ref_pt[1], self.ref_pt[2],
                       self.ref_virtual))
 
-    def phase(self, pt, in_dir, srf_nrml, wl=None):
+    def phase(self, pt, in_dir, srf_nrml, wl=None, reverse=False):
         """Returns a diffracted ray and phase increment.
 
         Args:
@@ -112,6 +112,8 @@ class DiffractiveElement:
             in_dir: incoming direction cosine of incident ray
             srf_nrml: :class:`~.Interface` surface normal at pt
             wl: wavelength in nm for ray, defaults to ref_wl
+            reverse: if True, the ray is traced from image space back to the
+                     object, undoing the diffraction of the forward ray
 
         Returns:
             (**out_dir, dW**)
@@ -120,6 +122,11 @@ class DiffractiveElement:
             - dW: phase added by diffractive interaction
         """
         order = self.order
+        if reverse:
+            # the reversed ray is the forward ray diffracted in the opposite
+            #  order, with its directions reversed
+            order = -order
+            in_dir = -in_dir
         normal = normalize(srf_nrml)
         in_cosI = np.dot(in_dir, normal)
         mu = 1.0 if wl is None else wl/self.ref_wl
@@ -133,6 +140,8 @@ class DiffractiveElement:
 #              .format(mu, dW, dWdX, dWdY, b, c, Q))
         out_dir = in_dir + order*mu*(np.array([dWdX, dWdY, 0])) + Q*normal
         dW *= mu
+        if reverse:
+            out_dir = -out_dir
         return out_dir, dW
 
 
@@ -153,15 +162,19 @@ class HolographicElement:
               .format(self.obj_pt[0], self.obj_pt[1], self.obj_pt[2],
                       self.obj_virtual))
 
-    def phase(self, pt, in_dir, srf_nrml, wl=None):
+    def phase(self, pt, in_dir, srf_nrml, wl=None, reverse=False):
         normal = normalize(srf_nrml)
         ref_dir = normalize(pt - self.ref_pt)
         if self.ref_virtual:
             ref_dir = -ref_dir
-        ref_cosI = np.dot(ref_dir, normal)
         obj_dir = normalize(pt - self.obj_pt)
         if self.obj_virtual:
             obj_dir = -obj_dir
+        if reverse:
+            # undo the forward diffraction, see DiffractiveElement.phase
+            ref_dir, obj_dir = obj_dir, ref_dir
+            in_dir = -in_dir
+        ref_cosI = np.dot(ref_dir, normal)
         obj_cosI = np.dot(obj_dir, normal)
         in_cosI = np.dot(in_dir, normal)
         mu = 1.0 if wl is None else wl/self.ref_wl
@@ -173,4 +186,6 @@ class HolographicElement:
         Q = -b + sqrt(b*b - 2*c)
         out_dir = in_dir + mu*(obj_dir - ref_dir) + Q*normal
         dW = 0.
+        if reverse:
+            out_dir = -out_dir
         return out_dir, dW
@@ -116,5 +116,5 @@ class ThinLens(Interface):
         p = p0 + s1*d
         return s1, p
 
-    def phase(self, pt, d_in, normal, wl):
-        return self.phase_element.phase(pt, d_in, normal)
+    def phase(self, pt, d_in, normal, wl, reverse=False):
+        return self.phase_element.phase(pt, d_in, normal, reverse=reverse)
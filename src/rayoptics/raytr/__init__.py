@@ -5,11 +5,23 @@
 
         - Primitive and higher level ray tracing, :mod:`~.raytrace`,
           :mod:`~.trace`
+        - Vectorized tracing of batches of rays, :mod:`~.batchtrace`
+        - Optional numba compiled kernels for the batch trace,
+          :mod:`~.jitkernels`
+        - Derivatives of rays wrt pupil and field coordinates,
+          :mod:`~.difftrace`
+        - Interpolated ray aim points over a grid of fields,
+          :mod:`~.aimtable`
+        - Precomputed path data for the ray tracers, :mod:`~.traceplan`
         - Specification of aperture, field, wavelength and defocus,
           :mod:`~.opticalspec`
         - Tracing of fans, lists and grids of rays, including refocusing of OPD
           values, :mod:`~.analyses`
         - Sample generation for ray grids, :mod:`~.sampler`
+        - Pupil sampling reduced by the symmetry of the model,
+          :mod:`~.symmetry`
+        - Parallel tracing of large ray sets in a process pool,
+          :mod:`~.parallel`
 
     The overall optical model is managed by the :class:`~.OpticalModel` class
 """
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright © 2026 Michael J. Hayford
+""" Interpolated chief ray aim points over a grid of field points
+
+    Ray aiming solves for the point on the paraxial entrance pupil plane that
+    the chief ray must be aimed at to pass through the center of the stop.
+    This is done for each of the :class:`~.Field` instances in the
+    :class:`~.FieldSpec` when the model is updated. Full field maps and image
+    simulation need aim points at many more field points than that.
+
+    The :class:`AimPointTable` aims the chief rays at the nodes of a square
+    grid of field points, using :func:`~.trace.aim_chief_rays`. The aim points
+    at arbitrary field points are then interpolated with bicubic splines.
+    The difference between the bicubic and bilinear interpolations is
+    returned as a conservative estimate of the interpolation error.
+
+.. Created on Sun Oct 18 04:57:01 2026
+
+.. codeauthor: Michael J. Hayford
+"""
+
+import numpy as np
+from scipy.interpolate import RectBivariateSpline, RegularGridInterpolator
+
+from rayoptics.raytr.opticalspec import Field
+from rayoptics.raytr.trace import aim_chief_rays
+
+
+class AimPointTable:
+    """ chief ray aim points interpolated over a 2D grid of field points
+
+    The field coordinates are in the units of the model's
+    :class:`~.FieldSpec`, e.g. object angle in degrees or image height.
+
+    Attributes:
+        opt_model: the :class:`~.OpticalModel` the table was built for
+        wvl: wavelength in nm of the aimed chief rays
+        x: (num_x,) array of x field coordinates of the grid nodes
+        y: (num_y,) array of y field coordinates of the grid nodes
+        aim_pts: (num_y, num_x, 2) array of aim points at the grid nodes
+    """
+
+    def __init__(self, opt_model, num_pts=11, max_field=None, wvl=None):
+        """ build the table for a square grid of field points
+
+        Args:
+            opt_model: the :class:`~.OpticalModel`
+            num_pts: number of grid nodes along each axis
+            max_field: the grid extends from -max_field to max_field in x and
+                       y. Defaults to the maximum field of the FieldSpec.
+            wvl: wavelength in nm, defaults to central wavelength
+        """
+        self.opt_model = opt_model
+        self.num_pts = num_pts
+        self.max_field = max_field
+        self.wvl = wvl
+        self.update()
+
+    def update(self):
+        """ aim the chief rays at the grid nodes and setup the interpolants """
+        osp = self.opt_model.optical_spec
+        if self.wvl is None:
+            self.wvl = self.opt_model.seq_model.central_wavelength()
+        max_field = self.max_field
+        if max_field is None:
+            max_field, _ = osp.field_of_view.max_field()
+        if max_field == 0.:
+            max_field = 1.
+        self.x = np.linspace(-max_field, max_field, self.num_pts)
+        self.y = np.linspace(-max_field, max_field, self.num_pts)
+
+        flds = [Field(x=x, y=y) for y in self.y for x in self.x]
+        aim_pts = aim_chief_rays(self.opt_model, flds, self.wvl)
+        self.aim_pts = np.array(aim_pts).reshape(len(self.y), len(self.x), 2)
+
+        k = min(3, self.num_pts - 1)
+        self._splines = [RectBivariateSpline(self.y, self.x,
+                                             self.aim_pts[..., i],
+                                             kx=k, ky=k)
+                         for i in range(2)]
+        self._linear = RegularGridInterpolator((self.y, self.x),
+                                               self.aim_pts, method='linear',
+                                               bounds_error=False,
+                                               fill_value=None)
+        return self
+
+    def aim_pt(self, x, y):
+        """ returns the interpolated aim points at field points x, y
+
+        Args:
+            x: x field coordinate or array of coordinates
+            y: y field coordinate or array of coordinates
+
+        Returns:
+            (**aim_pt**, **error**)
+
+            - **aim_pt**: array of x, y aim points, with shape (..., 2)
+            - **error**: conservative estimate of the error of aim_pt, the
+              difference between the bicubic and bilinear interpolations
+        """
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=float),
+                                   np.asarray(y, dtype=float))
+        aim_pt = np.stack([spline.ev(y, x) for spline in self._splines],
+                          axis=-1)
+        linear = self._linear(np.stack([y, x], axis=-1))
+        error = np.abs(aim_pt - linear)
+        return aim_pt, error
+
+    def field(self, x, y, wt=1.):
+        """ returns a :class:`~.Field` at x, y with an interpolated aim_pt
+
+        The field can be traced directly by :func:`~.trace.trace_base` and
+        the other ray tracing functions, without aiming its chief ray.
+        """
+        fld = Field(x=x, y=y, wt=wt)
+        fld.aim_pt, _ = self.aim_pt(x, y)
+        return fld
@@ -23,15 +23,19 @@
 
     This module also has functions to calculate chief ray and reference sphere
     information as well as functions for calculating the monochromatic PSF of
-    the model.
+    the model. The :class:`~.PolychromaticPSF` class sums the weighted PSFs
+    of several wavelengths on a common image window.
 
 .. Created on Sat Feb 22 22:01:56 2020
 
 .. codeauthor: Michael J. Hayford
 """
+import copy
 from math import sqrt
+import threading
+
 import numpy as np
-from numpy.fft import fftshift, fft2
+from scipy import fft
 
 from scipy.interpolate import interp1d
 from rayoptics.util.misc_math import normalize
@@ -39,11 +43,16 @@ from rayoptics.util.misc_math import normalize
 import rayoptics.optical.model_constants as mc
 
 from rayoptics.raytr import sampler
+from rayoptics.raytr import parallel
 from rayoptics.raytr.raytrace import eic_distance
 from rayoptics.elem.transform import transform_after_surface
 from rayoptics.raytr import trace
+from rayoptics.raytr import batchtrace as bt
 from rayoptics.raytr import traceerror as terr
 
+# padded pupil buffers of calc_psf, per thread
+_psf_buffers = threading.local()
+
 
 # --- Wavefront aberration
 def get_chief_ray_pkg(opt_model, fld, wvl, foc):
@@ -78,6 +87,18 @@ def get_chief_ray_pkg(opt_model, fld, wvl, foc):
     return chief_ray_pkg
 
 
+def reference_focus(opt_model, foc):
+    """Returns a single focus shift for tracing the rays of a refocus.
+
+    The traced rays don't depend on the focus, but the reference sphere
+    saved with the field does. If **foc** is an array of focus shifts, the
+    reference sphere is set up at the model's focus shift.
+    """
+    if np.ndim(foc) == 0:
+        return foc
+    return opt_model.optical_spec.defocus.focus_shift
+
+
 def setup_exit_pupil_coords(opt_model, fld, wvl, foc,
                             chief_ray_pkg, image_pt_2d=None):
     """Compute the reference sphere for a defocussed image point at **fld**.
@@ -223,6 +244,67 @@ def wave_abr_calc(fod, fld, wvl, foc, ray_pkg, chief_ray_pkg,
     return opd
 
 
+def wave_abr_pre_calc_batch(fod, fld, wvl, foc, ray_batch, chief_ray_pkg):
+    """Pre-calculate the focus independent part of the OPD for a ray batch.
+
+    This is the array version of :func:`wave_abr_pre_calc`. All the rays in
+    **ray_batch** should have traced successfully.
+
+    Returns:
+        pre_opd_pkg: tuple of (N,) pre_opd and (N, 3) p_coord, b4_pt, b4_dir
+    """
+    cr, cr_exp_seg = chief_ray_pkg
+    chief_ray, chief_ray_op, wvl = cr
+    cr_exp_pt, cr_exp_dir, cr_exp_dist, ifc, cr_b4_pt, cr_b4_dir = cr_exp_seg
+
+    p = ray_batch.p
+    d = ray_batch.d
+
+    k = -2  # last interface in sequence
+
+    # eq 3.12
+    e1 = bt.eic_distance((p[:, 1], d[:, 0]),
+                         (chief_ray[1][mc.p], chief_ray[0][mc.d]))
+    # eq 3.13
+    ekp = bt.eic_distance((p[:, k], d[:, k]),
+                          (chief_ray[k][mc.p], chief_ray[k][mc.d]))
+
+    pre_opd = (-abs(fod.n_obj)*e1 - ray_batch.op + abs(fod.n_img)*ekp +
+               chief_ray_op)
+
+    b4_pt, b4_dir = transform_after_surface(ifc, (p[:, k], d[:, k]))
+    dst = ekp - cr_exp_dist
+    eic_exp_pt = b4_pt - dst[:, np.newaxis]*b4_dir
+    p_coord = eic_exp_pt - cr_exp_pt
+
+    return pre_opd, p_coord, b4_pt, b4_dir
+
+
+def wave_abr_calc_batch(fod, fld, wvl, foc, chief_ray_pkg,
+                        pre_opd_pkg, ref_sphere):
+    """Given pre-calculated arrays and a ref. sphere, return the rays' OPDs.
+
+    This is the array version of :func:`wave_abr_calc`; **pre_opd_pkg** is
+    returned by :func:`wave_abr_pre_calc_batch`.
+    """
+    cr, cr_exp_seg = chief_ray_pkg
+    image_pt, ref_dir, ref_sphere_radius = ref_sphere
+    pre_opd, p_coord, b4_pt, b4_dir = pre_opd_pkg
+
+    b4_dir_p = np.einsum('ij,ij->i', b4_dir, p_coord)
+    p_p = np.einsum('ij,ij->i', p_coord, p_coord)
+    F = b4_dir.dot(ref_dir) - b4_dir_p/ref_sphere_radius
+    J = p_p/ref_sphere_radius - 2.0*p_coord.dot(ref_dir)
+
+    sign_soln = -1 if ref_dir[2]*cr.ray[-1][mc.d][2] < 0 else 1
+    denom = F + sign_soln*np.sqrt(F**2 + J/ref_sphere_radius)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ep = np.where(denom == 0, 0., J/denom)
+
+    opd = pre_opd - abs(fod.n_img)*ep
+    return opd
+
+
 # --- Single ray
 class Ray():
     """A ray at the given field and wavelength.
@@ -286,10 +368,13 @@ class RayFan():
         opt_model: :class:`~.OpticalModel` instance
         f: index into :class:`~.FieldSpec` or a :class:`~.Field` instance
         wl: wavelength (nm) to trace the fan, or central wavelength if None
-        foc: focus shift to apply to the results
+        foc: focus shift to apply to the results, or an array of focus shifts
         image_pt_2d: image offset to apply to the results
         num_rays: number of samples along the fan
         xyfan: 'x' or 'y', specifies the axis the fan is sampled on
+
+    The fan data is in the fan attribute, see :func:`focus_fan`; there is a
+    fan for each focus shift if **foc** is an array.
     """
 
     def __init__(self, opt_model, f=0, wl=None, foc=None, image_pt_2d=None,
@@ -362,60 +447,39 @@ def trace_ray_fan(opt_model, fan_rng, fld, wvl, foc, **kwargs):
     stop = fan_rng[1]
     num = fan_rng[2]
     step = (stop - start)/(num - 1)
-    fan = []
+    pupils = []
     for r in range(num):
-        pupil = np.array(start)
-        ray_pkg = trace.trace_base(opt_model, pupil, fld, wvl, **kwargs)
-        fan.append([pupil[0], pupil[1], ray_pkg])
+        pupils.append(np.array(start))
         start += step
+    ray_batch = trace.trace_base_batch(opt_model, pupils, fld, wvl, **kwargs)
+    fan = []
+    for i, pupil in enumerate(pupils):
+        fan.append([pupil[0], pupil[1], ray_batch.ray_pkg(i)])
     return fan
 
 
 def eval_fan(opt_model, fld, wvl, foc, xy,
              image_pt_2d=None, num_rays=21):
     """Trace a fan of rays and evaluate dx, dy, & OPD across the fan."""
-    fod = opt_model.optical_spec.parax_data.fod
-    cr_pkg = get_chief_ray_pkg(opt_model, fld, wvl, foc)
-    ref_sphere = setup_exit_pupil_coords(opt_model, fld, wvl, foc, cr_pkg,
-                                         image_pt_2d=image_pt_2d)
-    fld.chief_ray = cr_pkg
-    fld.ref_sphere = ref_sphere
-
-    fan_start = np.array([0., 0.])
-    fan_stop = np.array([0., 0.])
-    fan_start[xy] = -1.0
-    fan_stop[xy] = 1.0
-    fan_def = [fan_start, fan_stop, num_rays]
-
-    fan = trace_ray_fan(opt_model, fan_def, fld, wvl, foc)
-
-    central_wvl = opt_model.optical_spec.spectral_region.central_wvl
-    convert_to_opd = 1/opt_model.nm_to_sys_units(central_wvl)
-
-    def rfc(fi):
-        pupil_x, pupil_y, ray_pkg = fi
-        if ray_pkg is not None:
-            image_pt = ref_sphere[0]
-            ray = ray_pkg[mc.ray]
-            dist = foc / ray[-1][mc.d][2]
-            defocused_pt = ray[-1][mc.p] - dist*ray[-1][mc.d]
-            t_abr = defocused_pt - image_pt
-
-            opdelta = wave_abr_full_calc(fod, fld, wvl, foc, ray_pkg,
-                                         cr_pkg, ref_sphere)
-            opd = convert_to_opd*opdelta
-            return (pupil_x, pupil_y), (t_abr[0], t_abr[1], opd)
-        else:
-            return pupil_x, pupil_y, np.NaN
-    fan_data = [rfc(i) for i in fan]
-
-    return fan_data
+    fan_pkg = trace_fan(opt_model, fld, wvl, foc, xy,
+                        image_pt_2d=image_pt_2d, num_rays=num_rays)
+    return focus_fan(opt_model, fan_pkg, fld, wvl, foc,
+                     image_pt_2d=image_pt_2d)
 
 
 def trace_fan(opt_model, fld, wvl, foc, xy,
               image_pt_2d=None, num_rays=21):
-    """Trace a fan of rays and precalculate data for rapid refocus later."""
+    """Trace a fan of rays and precalculate data for rapid refocus later.
+
+    The rays are traced once for all the focus shifts if **foc** is an
+    array, see :func:`reference_focus`.
+
+    Returns:
+        fan_pkg: tuple of ray_end_pkg and pre_opd_pkg, see
+        :func:`ray_endpoint_pkg` and :func:`wave_abr_pre_calc_batch`
+    """
     fod = opt_model.optical_spec.parax_data.fod
+    foc = reference_focus(opt_model, foc)
     cr_pkg = get_chief_ray_pkg(opt_model, fld, wvl, foc)
     ref_sphere = setup_exit_pupil_coords(opt_model, fld, wvl, foc, cr_pkg,
                                          image_pt_2d=image_pt_2d)
@@ -423,55 +487,52 @@ def trace_fan(opt_model, fld, wvl, foc, xy,
     fld.ref_sphere = ref_sphere
 
     """ xy determines whether x (=0) or y (=1) fan """
-    fan_start = np.array([0., 0.])
-    fan_stop = np.array([0., 0.])
-    fan_start[xy] = -1.0
-    fan_stop[xy] = 1.0
-    fan_def = [fan_start, fan_stop, num_rays]
-
-    fan = trace_ray_fan(opt_model, fan_def, fld, wvl, foc)
-
-    def wpc(fi):
-        pupil_x, pupil_y, ray_pkg = fi
-        if ray_pkg is not None:
-            pre_opd_pkg = wave_abr_pre_calc(fod, fld, wvl, foc,
-                                            ray_pkg, cr_pkg)
-            return pre_opd_pkg
-        else:
-            return None
+    pupils = np.zeros((num_rays, 2))
+    pupils[:, xy] = np.linspace(-1., 1., num_rays)
 
-    upd_fan = [wpc(i) for i in fan]
+    ray_batch = trace.trace_base_batch(opt_model, pupils, fld, wvl)
+    ray_end_pkg = ray_endpoint_pkg(pupils, ray_batch)
+    valid_rays = ray_batch.take(np.flatnonzero(ray_batch.valid))
+    pre_opd_pkg = wave_abr_pre_calc_batch(fod, fld, wvl, foc, valid_rays,
+                                          cr_pkg)
 
-    return fan, upd_fan
+    return ray_end_pkg, pre_opd_pkg
 
 
 def focus_fan(opt_model, fan_pkg, fld, wvl, foc, image_pt_2d=None):
-    """Refocus the fan of rays and return the tranverse abr. and OPD."""
+    """Refocus the fan of rays and return the tranverse abr. and OPD.
+
+    Returns:
+        a list of ((pupil_x, pupil_y), (dx, dy, opd)) for each ray in the
+        fan, or a list of these fans if **foc** is an (n_focus,) array of
+        focus shifts. The data of rays that failed is NaN.
+
+    Use :func:`focus_ray_endpoints` with the ray_end_pkg of **fan_pkg** to
+    get just the transverse aberrations as an array.
+    """
     fod = opt_model.optical_spec.parax_data.fod
-    fan, upd_fan = fan_pkg
+    ray_end_pkg, pre_opd_pkg = fan_pkg
+    pupils, valid, pts, dirs = ray_end_pkg
     cr_pkg = get_chief_ray_pkg(opt_model, fld, wvl, foc)
-    ref_sphere = setup_exit_pupil_coords(opt_model, fld, wvl, foc, cr_pkg,
-                                         image_pt_2d=image_pt_2d)
     central_wvl = opt_model.optical_spec.spectral_region.central_wvl
     convert_to_opd = 1/opt_model.nm_to_sys_units(central_wvl)
 
-    def rfc(fi, fiu):
-        pupil_x, pupil_y, ray_pkg = fi
-        if ray_pkg is not None:
-            image_pt = ref_sphere[0]
-            ray = ray_pkg[mc.ray]
-            dist = foc / ray[-1][mc.d][2]
-            defocused_pt = ray[-1][mc.p] - dist*ray[-1][mc.d]
-            t_abr = defocused_pt - image_pt
-
-            opdelta = wave_abr_calc(fod, fld, wvl, foc,
-                                    ray_pkg, cr_pkg, fiu, ref_sphere)
-            opd = convert_to_opd*opdelta
-            return (pupil_x, pupil_y), (t_abr[0], t_abr[1], opd)
-        else:
-            return pupil_x, pupil_y, np.NaN
-    fan_data = [rfc(fi, fiu) for fi, fiu in zip(fan, upd_fan)]
-    return fan_data
+    fan_data = np.full(np.shape(foc) + (len(pupils), 3), np.NaN)
+    fan_data[..., :2] = focus_ray_endpoints(opt_model, ray_end_pkg,
+                                            fld, wvl, foc,
+                                            image_pt_2d=image_pt_2d)
+    fans = []
+    for f, focus_data in zip(np.ravel(foc),
+                             fan_data.reshape(-1, len(pupils), 3)):
+        ref_sphere = setup_exit_pupil_coords(opt_model, fld, wvl, f, cr_pkg,
+                                             image_pt_2d=image_pt_2d)
+        opdelta = wave_abr_calc_batch(fod, fld, wvl, f, cr_pkg,
+                                      pre_opd_pkg, ref_sphere)
+        focus_data[valid, 2] = convert_to_opd*opdelta
+        fans.append([(tuple(p), tuple(data)) for p, data
+                     in zip(pupils.tolist(), focus_data.tolist())])
+
+    return fans[0] if np.ndim(foc) == 0 else fans
 
 
 # --- List of rays
@@ -492,8 +553,11 @@ class RayList():
                   pupil_gen are None.
         f: index into :class:`~.FieldSpec` or a :class:`~.Field` instance
         wl: wavelength (nm) to trace the fan, or central wavelength if None
-        foc: focus shift to apply to the results
+        foc: focus shift to apply to the results, or an array of focus shifts
         image_pt_2d: image offset to apply to the results
+
+    The transverse aberrations are in the ray_abr attribute, a (2, N) array of
+    dx, dy, or (2, n_focus, N) if **foc** is an array.
     """
 
     def __init__(self, opt_model,
@@ -550,20 +614,41 @@ class RayList():
             self.fld, self.wvl, self.foc,
             image_pt_2d=self.image_pt_2d)
 
-        self.ray_abr = np.rollaxis(ray_list_data, 1)
+        self.ray_abr = np.moveaxis(ray_list_data, -1, 0)
 
         return self
 
 
 def trace_ray_list(opt_model, pupil_coords, fld, wvl, foc,
-                   append_if_none=False, **kwargs):
-    """Trace a list of rays at fld and wvl and return ray_pkgs in a list."""
+                   append_if_none=False, executor=None, chunksize=None,
+                   use_symmetry=True, **kwargs):
+    """Trace a list of rays at fld and wvl and return ray_pkgs in a list.
+
+    If an **executor** is given, chunks of **chunksize** pupil coordinates are
+    traced in parallel, see :mod:`~.parallel`. If **use_symmetry** is True,
+    only the pupil coordinates that are unique under the symmetry of the
+    model and field are traced, see :mod:`~.symmetry`.
+    """
+
+    pupil_coords = list(pupil_coords)
+    if executor is not None:
+        return parallel.map_chunks(executor, trace_ray_list, opt_model,
+                                   pupil_coords, fld, wvl, foc,
+                                   chunksize=chunksize,
+                                   append_if_none=append_if_none,
+                                   use_symmetry=use_symmetry, **kwargs)
+
+    inside = [(pupil[0]**2 + pupil[1]**2) < 1.0 for pupil in pupil_coords]
+    ray_batch = trace.trace_base_batch(
+        opt_model, [pupil for pupil, ok in zip(pupil_coords, inside) if ok],
+        fld, wvl, use_symmetry=use_symmetry, **kwargs)
 
     ray_list = []
-    for pupil in pupil_coords:
-        if (pupil[0]**2 + pupil[1]**2) < 1.0:
-            ray_pkg = trace.trace_base(opt_model, pupil, fld, wvl, **kwargs)
-            ray_list.append([pupil[0], pupil[1], ray_pkg])
+    i = 0
+    for pupil, ok in zip(pupil_coords, inside):
+        if ok:
+            ray_list.append([pupil[0], pupil[1], ray_batch.ray_pkg(i)])
+            i += 1
         else:  # ray outside pupil
             if append_if_none:
                 ray_list.append([pupil[0], pupil[1], None])
@@ -571,7 +656,8 @@ def trace_ray_list(opt_model, pupil_coords, fld, wvl, foc,
     return ray_list
 
 
-def trace_list_of_rays(opt_model, rays, output_filter=None, **kwargs):
+def trace_list_of_rays(opt_model, rays, output_filter=None,
+                       executor=None, chunksize=None, **kwargs):
     """Trace a list of rays (pt, dir, wvl) and return ray_pkgs in a list.
 
     Args:
@@ -583,34 +669,47 @@ def trace_list_of_rays(opt_model, rays, output_filter=None, **kwargs):
             - wvl: wavelength in nm
 
         output_filter: None, "last", or a callable. See below
+        executor: optional :class:`concurrent.futures.Executor` used to
+                  trace chunks of rays in parallel, see :mod:`~.parallel`
+        chunksize: the number of rays in each chunk traced by the executor
         **kwargs: kwyword args passed to the trace function
 
     The output_filter keyword argument controls what ray data is returned to
     the caller.
 
         - if None, returns the entire traced ray
-        - if "last", returns the ray data from the last interface
+        - if "last", returns the ray data from the last interface. The rays
+          are traced with endpoint_only=True, without saving the intermediate
+          ray segments.
         - if a callable, it must take a ray_pkg as an argument and return the
-          desired data or None
+          desired data or None. If an executor is used, the callable must be
+          picklable.
 
     Returns:
-        A list with an entry for each ray in rays
+        A list with an entry for each ray in rays; the entry is None if the
+        ray failed
     """
+    if executor is not None:
+        return parallel.map_chunks(executor, trace_list_of_rays, opt_model,
+                                   rays, chunksize=chunksize,
+                                   output_filter=output_filter, **kwargs)
+
+    if output_filter == 'last':
+        kwargs['endpoint_only'] = True
     ray_list = []
-    for ray in rays:
-        pt0, dir0, wvl = ray
-        try:
-            ray_pkg = trace.trace(opt_model, pt0, dir0, wvl, **kwargs)
-        except terr.TraceError:
+    for pt0, dir0, wvl in rays:
+        ray, op_delta, wvl, status, _ = trace.trace(opt_model.seq_model,
+                                                    pt0, dir0, wvl,
+                                                    raise_errors=False,
+                                                    **kwargs)
+        if status != terr.TraceStatus.OK:
             ray_list.append(None)
+        elif output_filter is None:
+            ray_list.append((ray, op_delta, wvl))
+        elif output_filter == 'last':
+            ray_list.append((ray[-1], op_delta, wvl))
         else:
-            if output_filter is None:
-                ray_list.append(ray_pkg)
-            elif output_filter == 'last':
-                ray, op_delta, wvl = ray_pkg
-                ray_list.append((ray[-1], op_delta, wvl))
-            else:
-                ray_list.append(output_filter(ray_pkg))
+            ray_list.append(output_filter((ray, op_delta, wvl)))
 
     return ray_list
 
@@ -618,68 +717,100 @@ def trace_list_of_rays(opt_model, rays, output_filter=None, **kwargs):
 def eval_pupil_coords(opt_model, fld, wvl, foc,
                       image_pt_2d=None, num_rays=21):
     """Trace a list of rays and return the transverse abr."""
-    cr_pkg = get_chief_ray_pkg(opt_model, fld, wvl, foc)
-    ref_sphere = setup_exit_pupil_coords(opt_model, fld, wvl, foc, cr_pkg,
-                                         image_pt_2d=image_pt_2d)
-    fld.chief_ray = cr_pkg
-    fld.ref_sphere = ref_sphere
-
     grid_start = np.array([-1., -1.])
     grid_stop = np.array([1., 1.])
     grid_def = [grid_start, grid_stop, num_rays]
 
-    ray_list = trace_ray_list(opt_model, sampler.grid_ray_generator(grid_def),
-                              fld, wvl, foc)
-
-    def rfc(ri):
-        pupil_x, pupil_y, ray_pkg = ri
-        if ray_pkg is not None:
-            image_pt = ref_sphere[0]
-            ray = ray_pkg[mc.ray]
-            dist = foc / ray[-1][mc.d][2]
-            defocused_pt = ray[-1][mc.p] - dist*ray[-1][mc.d]
-            t_abr = defocused_pt - image_pt
-            return t_abr[0], t_abr[1]
-        else:
-            return np.NaN
-    ray_list_data = [rfc(ri) for ri in ray_list]
-    return np.array(ray_list_data)
+    ray_end_pkg = trace_pupil_coords(opt_model,
+                                     sampler.grid_ray_generator(grid_def),
+                                     fld, wvl, foc, image_pt_2d=image_pt_2d)
+    return focus_pupil_coords(opt_model, ray_end_pkg, fld, wvl, foc,
+                              image_pt_2d=image_pt_2d)
 
 
 def trace_pupil_coords(opt_model, pupil_coords, fld, wvl, foc,
                        image_pt_2d=None):
-    """Trace a list of rays and return data needed for rapid refocus."""
+    """Trace a list of rays and return data needed for rapid refocus.
+
+    Only the pupil coordinates inside the unit circle are traced. The rays
+    are traced once for all the focus shifts if **foc** is an array, see
+    :func:`reference_focus`.
+
+    Returns:
+        ray_end_pkg: the final ray segments, see :func:`ray_endpoint_pkg`
+    """
+    foc = reference_focus(opt_model, foc)
     cr_pkg = get_chief_ray_pkg(opt_model, fld, wvl, foc)
     ref_sphere = setup_exit_pupil_coords(opt_model, fld, wvl, foc, cr_pkg,
                                          image_pt_2d=image_pt_2d)
     fld.chief_ray = cr_pkg
     fld.ref_sphere = ref_sphere
 
-    ray_list = trace_ray_list(opt_model, pupil_coords,
-                              fld, wvl, foc)
+    pupils = np.array(list(pupil_coords), dtype=float).reshape(-1, 2)
+    pupils = pupils[np.sum(pupils**2, axis=1) < 1.0]
+    ray_batch = trace.trace_base_batch(opt_model, pupils, fld, wvl,
+                                       use_symmetry=True)
+
+    return ray_endpoint_pkg(pupils, ray_batch)
 
-    return ray_list
 
+def focus_pupil_coords(opt_model, ray_end_pkg, fld, wvl, foc,
+                       image_pt_2d=None):
+    """Given pre-traced rays and a ref. sphere, return the transverse abr.
+
+    See :func:`focus_ray_endpoints`.
+    """
+    return focus_ray_endpoints(opt_model, ray_end_pkg, fld, wvl, foc,
+                               image_pt_2d=image_pt_2d)
+
+
+def ray_endpoint_pkg(pupils, ray_batch):
+    """Package the final ray segments of **ray_batch** for rapid refocus.
+
+    Returns:
+        ray_end_pkg: tuple of pupils, valid, pts, dirs
 
-def focus_pupil_coords(opt_model, ray_list, fld, wvl, foc, image_pt_2d=None):
-    """Given pre-traced rays and a ref. sphere, return the transverse abr."""
+            - pupils: (N, 2) array of the pupil coordinates of the rays
+            - valid: (N,) boolean array, True for the rays that traced
+              successfully
+            - pts: (N, 3) array of the ray intersections with the image
+            - dirs: (N, 3) array of the ray direction cosines in image space
+    """
+    valid = ray_batch.valid
+    pts = np.where(valid[:, np.newaxis], ray_batch.p[:, -1], np.NaN)
+    dirs = np.where(valid[:, np.newaxis], ray_batch.d[:, -1], np.NaN)
+    return np.asarray(pupils, dtype=float), valid, pts, dirs
+
+
+def focus_ray_endpoints(opt_model, ray_end_pkg, fld, wvl, foc,
+                        image_pt_2d=None):
+    """Refocus the final ray segments and return the transverse abr.
+
+    Args:
+        opt_model: :class:`~.OpticalModel` instance
+        ray_end_pkg: the final ray segments, see :func:`ray_endpoint_pkg`
+        fld: :class:`~.Field` point of the rays
+        wvl: wavelength of the rays (nm)
+        foc: focus shift, or an (n_focus,) array of focus shifts
+        image_pt_2d: x, y image point in the (defocussed) image plane; if
+                     None, use the chief ray coordinate.
+
+    Returns:
+        (N, 2) array of dx, dy for each ray, or an (n_focus, N, 2) array if
+        **foc** is an array. The data of rays that failed is NaN.
+    """
+    pupils, valid, pts, dirs = ray_end_pkg
     cr_pkg = get_chief_ray_pkg(opt_model, fld, wvl, foc)
-    ref_sphere = setup_exit_pupil_coords(opt_model, fld, wvl, foc, cr_pkg,
-                                         image_pt_2d=image_pt_2d)
+    image_pts = np.array([setup_exit_pupil_coords(
+                              opt_model, fld, wvl, f, cr_pkg,
+                              image_pt_2d=image_pt_2d)[0][:2]
+                          for f in np.ravel(foc)])
+    image_pts = image_pts.reshape(np.shape(foc) + (1, 2))
 
-    def rfc(ri):
-        pupil_x, pupil_y, ray_pkg = ri
-        if ray_pkg is not None:
-            image_pt = ref_sphere[0]
-            ray = ray_pkg[mc.ray]
-            dist = foc / ray[-1][mc.d][2]
-            defocused_pt = ray[-1][mc.p] - dist*ray[-1][mc.d]
-            t_abr = defocused_pt - image_pt
-            return t_abr[0], t_abr[1]
-        else:
-            return np.NaN
-    ray_list_data = [rfc(ri) for ri in ray_list]
-    return np.array(ray_list_data)
+    # get distance along the rays corresponding to a z shift of the defocus
+    dist = np.multiply.outer(foc, 1/dirs[:, 2])[..., np.newaxis]
+    defocused_pts = pts[:, :2] - dist*dirs[:, :2]
+    return defocused_pts - image_pts
 
 
 # --- Square grid of rays
@@ -735,31 +866,47 @@ class RayGrid():
 
 
 def trace_ray_grid(opt_model, grid_rng, fld, wvl, foc, append_if_none=True,
-                   **kwargs):
-    """Trace a grid of rays at fld and wvl and return ray_pkgs in 2d list."""
+                   executor=None, chunksize=None, **kwargs):
+    """Trace a grid of rays at fld and wvl and return ray_pkgs in 2d list.
+
+    If an **executor** is given, chunks of **chunksize** rays are traced in
+    parallel, see :mod:`~.parallel`.
+    """
     start = np.array(grid_rng[0])
     stop = grid_rng[1]
     num = grid_rng[2]
     step = np.array((stop - start)/(num - 1))
+    pupils = []
+    for i in range(num):
+        for j in range(num):
+            pupils.append(np.array(start))
+            start[1] += step[1]
+
+        start[0] += step[0]
+        start[1] = grid_rng[0][1]
+
+    inside = [(pupil[0]**2 + pupil[1]**2) < 1.0 for pupil in pupils]
+    ray_list = trace_ray_list(opt_model,
+                              [pupil for pupil, ok in zip(pupils, inside)
+                               if ok],
+                              fld, wvl, foc, executor=executor,
+                              chunksize=chunksize, **kwargs)
+
     grid = []
+    k = 0
     for i in range(num):
         grid_row = []
 
         for j in range(num):
-            pupil = np.array(start)
-            if (pupil[0]**2 + pupil[1]**2) < 1.0:
-                ray_pkg = trace.trace_base(opt_model, pupil, fld, wvl,
-                                           **kwargs)
-                grid_row.append([pupil[0], pupil[1], ray_pkg])
+            pupil = pupils[i*num + j]
+            if inside[i*num + j]:
+                grid_row.append(ray_list[k])
+                k += 1
             else:  # ray outside pupil
                 if append_if_none:
                     grid_row.append([pupil[0], pupil[1], None])
 
-            start[1] += step[1]
-
         grid.append(grid_row)
-        start[0] += step[0]
-        start[1] = grid_rng[0][1]
 
     return grid
 
@@ -767,39 +914,26 @@ def trace_ray_grid(opt_model, grid_rng, fld, wvl, foc, append_if_none=True,
 def eval_wavefront(opt_model, fld, wvl, foc,
                    image_pt_2d=None, num_rays=21, value_if_none=np.NaN):
     """Trace a grid of rays and evaluate the OPD across the wavefront."""
-    fod = opt_model.optical_spec.parax_data.fod
-    cr_pkg = get_chief_ray_pkg(opt_model, fld, wvl, foc)
-    ref_sphere = setup_exit_pupil_coords(opt_model, fld, wvl, foc, cr_pkg,
-                                         image_pt_2d=image_pt_2d)
-    fld.chief_ray = cr_pkg
-    fld.ref_sphere = ref_sphere
-
-    grid_start = np.array([-1., -1.])
-    grid_stop = np.array([1., 1.])
-    grid_def = [grid_start, grid_stop, num_rays]
-
-    grid = trace_ray_grid(opt_model, grid_def, fld, wvl, foc)
-
-    central_wvl = opt_model.optical_spec.spectral_region.central_wvl
-    convert_to_opd = 1/opt_model.nm_to_sys_units(central_wvl)
-
-    def rfc(gij):
-        pupil_x, pupil_y, ray_pkg = gij
-        if ray_pkg is not None:
-            opdelta = wave_abr_full_calc(fod, fld, wvl, foc, ray_pkg,
-                                         cr_pkg, ref_sphere)
-            opd = convert_to_opd*opdelta
-            return pupil_x, pupil_y, opd
-        else:
-            return pupil_x, pupil_y, value_if_none
-    opd_grid = [[rfc(j) for j in i] for i in grid]
-
-    return np.array(opd_grid)
+    grid_pkg = trace_wavefront(opt_model, fld, wvl, foc,
+                               image_pt_2d=image_pt_2d, num_rays=num_rays)
+    return focus_wavefront(opt_model, grid_pkg, fld, wvl, foc,
+                           image_pt_2d=image_pt_2d,
+                           value_if_none=value_if_none)
 
 
 def trace_wavefront(opt_model, fld, wvl, foc,
                     image_pt_2d=None, num_rays=21):
-    """Trace a grid of rays and pre-calculate data needed for rapid refocus."""
+    """Trace a grid of rays and pre-calculate data needed for rapid refocus.
+
+    Returns:
+        grid_pkg: tuple of pupil_grid, valid, pre_opd_pkg
+
+            - pupil_grid: (num_rays, num_rays, 2) array of pupil coordinates
+            - valid: (num_rays, num_rays) boolean array, True for the rays
+              inside the pupil that traced successfully
+            - pre_opd_pkg: arrays for the valid rays, in row major order;
+              see :func:`wave_abr_pre_calc_batch`
+    """
     fod = opt_model.optical_spec.parax_data.fod
     cr_pkg = get_chief_ray_pkg(opt_model, fld, wvl, foc)
     ref_sphere = setup_exit_pupil_coords(opt_model, fld, wvl, foc, cr_pkg,
@@ -807,49 +941,47 @@ def trace_wavefront(opt_model, fld, wvl, foc,
     fld.chief_ray = cr_pkg
     fld.ref_sphere = ref_sphere
 
-    grid_start = np.array([-1., -1.])
-    grid_stop = np.array([1., 1.])
-    grid_def = [grid_start, grid_stop, num_rays]
-
-    grid = trace_ray_grid(opt_model, grid_def, fld, wvl, foc)
+    # pupil_grid[i, j] is (x[i], y[j]), the ordering of trace_ray_grid
+    samples = np.linspace(-1., 1., num_rays)
+    pupil_grid = np.stack(np.meshgrid(samples, samples, indexing='ij'),
+                          axis=-1)
+    inside = np.sum(pupil_grid**2, axis=-1) < 1.0
 
-    def wpc(gij):
-        pupil_x, pupil_y, ray_pkg = gij
-        if ray_pkg is not None:
-            pre_opd_pkg = wave_abr_pre_calc(fod, fld, wvl, foc,
-                                            ray_pkg, cr_pkg)
-            return pre_opd_pkg
-        else:
-            return None
-    upd_grid = [[wpc(j) for j in i] for i in grid]
+    ray_batch = trace.trace_base_batch(opt_model, pupil_grid[inside],
+                                       fld, wvl, use_symmetry=True)
+    valid = np.zeros_like(inside)
+    valid[inside] = ray_batch.valid
+    valid_rays = ray_batch.take(np.flatnonzero(ray_batch.valid))
+    pre_opd_pkg = wave_abr_pre_calc_batch(fod, fld, wvl, foc, valid_rays,
+                                          cr_pkg)
 
-    return grid, upd_grid
+    return pupil_grid, valid, pre_opd_pkg
 
 
 def focus_wavefront(opt_model, grid_pkg, fld, wvl, foc, image_pt_2d=None,
                     value_if_none=np.NaN):
-    """Given pre-traced rays and a ref. sphere, return the ray's OPD."""
+    """Given pre-traced rays and a ref. sphere, return the rays' OPD.
+
+    Returns:
+        (num_rays, num_rays, 3) array of pupil x, pupil y and OPD in waves
+    """
     fod = opt_model.optical_spec.parax_data.fod
-    grid, upd_grid = grid_pkg
+    pupil_grid, valid, pre_opd_pkg = grid_pkg
     cr_pkg = get_chief_ray_pkg(opt_model, fld, wvl, foc)
     ref_sphere = setup_exit_pupil_coords(opt_model, fld, wvl, foc, cr_pkg,
                                          image_pt_2d=image_pt_2d)
     central_wvl = opt_model.optical_spec.spectral_region.central_wvl
     convert_to_opd = 1/opt_model.nm_to_sys_units(central_wvl)
 
-    def rfc(gij, uij):
-        pupil_x, pupil_y, ray_pkg = gij
-        if ray_pkg is not None:
-            opdelta = wave_abr_calc(fod, fld, wvl, foc,
-                                    ray_pkg, cr_pkg, uij, ref_sphere)
-            opd = convert_to_opd*opdelta
-            return pupil_x, pupil_y, opd
-        else:
-            return pupil_x, pupil_y, value_if_none
-    refocused_grid = [[rfc(jg, ju) for jg, ju in zip(ig, iu)]
-                      for ig, iu in zip(grid, upd_grid)]
+    opdelta = wave_abr_calc_batch(fod, fld, wvl, foc, cr_pkg,
+                                  pre_opd_pkg, ref_sphere)
+
+    refocused_grid = np.empty(valid.shape + (3,))
+    refocused_grid[..., :2] = pupil_grid
+    refocused_grid[..., 2] = value_if_none
+    refocused_grid[..., 2][valid] = convert_to_opd*opdelta
 
-    return np.array(refocused_grid)
+    return refocused_grid
 
 
 # --- PSF calculation
@@ -902,7 +1034,36 @@ def calc_psf_scaling(pupil_grid, ndim, maxdim):
     return delta_x, delta_xp
 
 
-def calc_psf(wavefront, ndim, maxdim):
+def pupil_function(wavefront):
+    """Return the complex pupil function of **wavefront**, in waves.
+
+    The pupil function is zero where the wavefront has no data (nan).
+    """
+    valid = np.isfinite(wavefront)
+    return np.where(valid,
+                    np.exp(1j*2*np.pi*np.where(valid, wavefront, 0.)),
+                    0.)
+
+
+def psf_work_buffer(ndim, maxdim):
+    """Return the zero padded pupil buffer for **ndim**, **maxdim**.
+
+    The buffers are cached per (ndim, maxdim) and per thread. Only the ndim x
+    ndim window in the center of the buffer is ever written to, so the
+    padding stays zero between calls.
+
+    Returns: (buffer, window), the buffer and the slices of the pupil in it
+    """
+    buffers = _psf_buffers.__dict__.setdefault('buffers', {})
+    key = ndim, maxdim
+    if key not in buffers:
+        start = maxdim//2 - (ndim//2 - 1)
+        window = (slice(start, start+ndim), slice(start, start+ndim))
+        buffers[key] = np.zeros((maxdim, maxdim), dtype=complex), window
+    return buffers[key]
+
+
+def calc_psf(wavefront, ndim, maxdim, workers=None):
     """Calculate the point spread function of wavefront W.
 
     Args:
@@ -910,24 +1071,90 @@ def calc_psf(wavefront, ndim, maxdim):
                    condition is indicated by nan
         ndim: The sampling across the wavefront
         maxdim: The total width of the sampling grid
+        workers: the number of threads used by the FFT, -1 for all cores.
+                 The default, None, is a single thread, unless changed by
+                 :func:`scipy.fft.set_workers`.
 
     Returns: AP, the PSF of the input wavefront
     """
-    maxdim_by_2 = maxdim//2
-    W = np.zeros([maxdim, maxdim])
-    nd2 = ndim//2
-    W[maxdim_by_2-(nd2-1):maxdim_by_2+(nd2+1),
-      maxdim_by_2-(nd2-1):maxdim_by_2+(nd2+1)] = np.nan_to_num(wavefront)
+    pupil, window = psf_work_buffer(ndim, maxdim)
+    pupil[window] = pupil_function(wavefront)
+
+    # the PSF intensity doesn't depend on the origin of the pupil, so the
+    # buffer is transformed without an input fftshift
+    AP = fft.fftshift(np.abs(fft.fft2(pupil, workers=workers))**2)
+    AP_max = np.max(AP)
+    AP = AP/AP_max
+    return AP
 
-    phase = np.exp(1j*2*np.pi*W)
 
-    for i in range(len(phase)):
-        for j in range(len(phase)):
-            if phase[i][j] == 1:
-                phase[i][j] = 0
+def psf_window_coords(npix, pitch, center=None):
+    """Return the x and y pixel center coordinates of an image window.
 
-    AP = abs(fftshift(fft2(fftshift(phase))))**2
-    AP_max = np.nanmax(AP)
+    Args:
+        npix: the number of pixels across the window, or (nx, ny)
+        pitch: the pixel pitch, in system units
+        center: x, y offset of the window center from the reference image
+                point; defaults to (0, 0)
+
+    Returns: (x, y), arrays of the pixel centers
+    """
+    nx, ny = np.broadcast_to(npix, (2,))
+    cx, cy = (0., 0.) if center is None else center
+    x = cx + (np.arange(nx) - (nx - 1)/2)*pitch
+    y = cy + (np.arange(ny) - (ny - 1)/2)*pitch
+    return x, y
+
+
+def calc_psf_mft(pupil_grid, npix, pitch, center=None, norm='peak'):
+    """Calculate the PSF on an image window with a matrix Fourier transform.
+
+    Rather than sampling the image at the spacing set by the zero padding of
+    an FFT, the Fraunhofer integral is evaluated directly at the pixels of
+    the window, as a pair of matrix products. The cost scales with the
+    number of pupil samples times the number of pixels, so a finely sampled
+    PSF core, or a PSF matched to a detector's pixels, is cheap.
+
+    As with the FFT, the sampling of the pupil makes the PSF periodic; the
+    period, wvl*R/delta for pupil sample spacing delta, is the full width of
+    the calc_psf grid. The window should fit within one period.
+
+    Args:
+        pupil_grid: a RayGrid instance
+        npix: the number of pixels across the window, or (nx, ny)
+        pitch: the pixel pitch, in system units
+        center: x, y offset of the window center from the reference image
+                point; defaults to (0, 0)
+        norm: 'peak' to normalize to the peak of the unaberrated PSF, or
+              'energy' for the fraction of the energy through the pupil
+              falling on each pixel
+
+    Returns: AP, the (nx, ny) PSF on the window
+    """
+    opt_model = pupil_grid.opt_model
+    fod = opt_model.optical_spec.parax_data.fod
+    wl = opt_model.nm_to_sys_units(pupil_grid.wvl)
+    ref_sphere_radius = pupil_grid.fld.ref_sphere[2]
+    ndim = pupil_grid.num_rays
+
+    pupil = pupil_function(pupil_grid.grid[2])
+
+    # exit pupil sample spacing, as used by calc_psf_scaling
+    delta_exp = 2 * fod.exp_radius / ndim
+    n = np.arange(ndim) - ndim//2
+    x, y = psf_window_coords(npix, pitch, center=center)
+    scale = -2j*np.pi*delta_exp/(wl*ref_sphere_radius)
+    Ex = np.exp(scale*np.multiply.outer(x, n))
+    Ey = np.exp(scale*np.multiply.outer(y, n))
+
+    AP = np.abs(Ex @ pupil @ Ey.T)**2
+    if norm == 'energy':
+        # the PSF integrates to the pupil area over a period of the MFT
+        period = wl*ref_sphere_radius/delta_exp
+        AP_max = np.count_nonzero(pupil)*(period/pitch)**2
+    else:
+        # the peak of the unaberrated PSF is the square of the pupil area
+        AP_max = np.count_nonzero(pupil)**2
     AP = AP/AP_max
     return AP
 
@@ -938,3 +1165,119 @@ def update_psf_data(pupil_grid, build='rebuild'):
     maxdim = pupil_grid.maxdim
     AP = calc_psf(pupil_grid.grid[2], ndim, maxdim)
     return AP
+
+
+# --- Polychromatic PSF
+class PolychromaticPSF():
+    """Weighted broadband PSF at a field point, on a common image window.
+
+    The PSF of each wavelength is calculated with :func:`calc_psf_mft`
+    directly on the pixels of the image window, so the PSFs of the different
+    wavelengths need no resampling to a common pitch before they are
+    summed. The PSFs are normalized to the fraction of the energy falling on
+    each pixel and are cached by wavelength; changing the weights and calling
+    update_data(build='update') recombines them without retracing.
+
+    Attributes:
+        opt_model: :class:`~.OpticalModel` instance
+        f: index into :class:`~.FieldSpec` or a :class:`~.Field` instance
+        wvls: the wavelengths (nm), defaults to those of the spectral region
+        wts: the weights of **wvls**, defaults to the spectral weights
+        foc: focus shift to apply to the results
+        image_pt_2d: the image point the window is centered on, defaults to
+                     the chief ray of the central wavelength
+        num_rays: number of samples along the side of the pupil grid
+        npix: the number of pixels across the image window, or (nx, ny)
+        pitch: the pixel pitch, in system units
+        center: x, y offset of the center of the window from **image_pt_2d**
+        executor: optional :class:`concurrent.futures.Executor` used to
+                  calculate the wavelengths in parallel, see
+                  :mod:`~.parallel`
+        psfs: dict of the cached PSF of each wavelength
+        AP: the weighted sum of the PSFs of **wvls**
+    """
+
+    def __init__(self, opt_model, npix, pitch, f=0, wvls=None, wts=None,
+                 foc=None, image_pt_2d=None, num_rays=32, center=None,
+                 executor=None):
+        self.opt_model = opt_model
+        osp = opt_model.optical_spec
+        self.fld = osp.field_of_view.fields[f] if isinstance(f, int) else f
+        wvl_spec = osp.spectral_region
+        self.wvls = list(wvl_spec.wavelengths) if wvls is None else wvls
+        self.wts = list(wvl_spec.spectral_wts) if wts is None else wts
+
+        self.foc = osp.defocus.focus_shift if foc is None else foc
+        self.image_pt_2d = image_pt_2d
+
+        self.num_rays = num_rays
+        self.npix = npix
+        self.pitch = pitch
+        self.center = center
+        self.executor = executor
+
+        self.psfs = {}
+        self.update_data()
+
+    def __json_encode__(self):
+        attrs = dict(vars(self))
+        del attrs['opt_model']
+        del attrs['executor']
+        del attrs['psfs']
+        return attrs
+
+    def update_data(self, **kwargs):
+        """Calculate the PSFs of new wavelengths and sum the weighted PSFs.
+
+        A build of 'rebuild' recalculates all of the wavelengths.
+        """
+        build = kwargs.get('build', 'rebuild')
+        if build == 'rebuild':
+            self.psfs = {}
+
+        osp = self.opt_model.optical_spec
+        image_pt_2d = self.image_pt_2d
+        if image_pt_2d is None:
+            central_wvl = osp.spectral_region.central_wvl
+            cr_pkg = get_chief_ray_pkg(self.opt_model, self.fld, central_wvl,
+                                       self.foc)
+            ref_sphere = setup_exit_pupil_coords(self.opt_model, self.fld,
+                                                 central_wvl, self.foc, cr_pkg)
+            image_pt_2d = ref_sphere[0][:2]
+
+        new_wvls = [wvl for wvl in self.wvls if wvl not in self.psfs]
+        args = (self.fld, self.foc, image_pt_2d, self.num_rays,
+                self.npix, self.pitch, self.center)
+        if self.executor is not None:
+            psfs = parallel.map_chunks(self.executor, calc_wvl_psfs,
+                                       self.opt_model, new_wvls, *args,
+                                       chunksize=1)
+        else:
+            psfs = calc_wvl_psfs(self.opt_model, new_wvls, *args)
+        self.psfs.update(zip(new_wvls, psfs))
+
+        wts = np.asarray(self.wts, dtype=float)
+        AP = sum(wt*self.psfs[wvl] for wvl, wt in zip(self.wvls, wts))
+        self.AP = AP/np.sum(wts)
+
+        return self
+
+
+def calc_wvl_psfs(opt_model, wvls, fld, foc, image_pt_2d, num_rays,
+                  npix, pitch, center):
+    """Calculate the PSF of each wavelength in **wvls** on an image window.
+
+    The wavefront of each wavelength is referred to the image point
+    **image_pt_2d**. The PSFs are normalized to the fraction of the energy
+    falling on each pixel, see :func:`calc_psf_mft`.
+
+    Returns: a list of the PSFs of the wavelengths in **wvls**
+    """
+    psfs = []
+    for wvl in wvls:
+        # the chief ray and reference sphere are cached on the field
+        pupil_grid = RayGrid(opt_model, f=copy.copy(fld), wl=wvl, foc=foc,
+                             image_pt_2d=image_pt_2d, num_rays=num_rays)
+        psfs.append(calc_psf_mft(pupil_grid, npix, pitch, center=center,
+                                 norm='energy'))
+    return psfs
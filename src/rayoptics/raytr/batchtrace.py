@@ -0,0 +1,835 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright © 2026 Michael J. Hayford
+""" Functions to support tracing batches of rays through a sequential model
+
+    The functions in this module parallel the ones in :mod:`~.raytrace`, but
+    operate on (N, 3) arrays of starting points and direction cosines. All N
+    rays are pushed through each interface together, replacing the per ray
+    Python loop of :func:`~.raytrace.trace_raw` with array operations.
+
+    Ray failures (missed surfaces, TIR, evanescent diffraction) don't raise an
+    exception. Instead, the failed ray is dropped from the active set and its
+    :class:`~.TraceStatus` and failing interface are recorded in the
+    :class:`RayBatch` returned by the trace.
+
+    The ray data is held in a single structured array, with a record for each
+    ray and interface. The fields of the record follow the ray segment
+    indexing in :mod:`~.model_constants`, so a record can be used wherever a
+    legacy [pt, after_dir, after_dst, normal] segment is expected, without
+    copying.
+
+    :func:`trace_wavelengths` traces a set of rays in several wavelengths in a
+    single pass. The geometry of the path is shared; only the refractive
+    indices (and the wavelength seen by diffractive surfaces) differ from ray
+    to ray. The resulting :class:`RayBatch` has a leading wavelength axis.
+
+    :class:`IncrementalTrace` caches the state of the rays arriving at each
+    interface. When the model changes, the rays are retraced from the first
+    interface affected by the change rather than from the object.
+
+    :func:`trace_reverse` traces rays from the image interface back to the
+    object, e.g. to back project the pixels of a detector. It uses the reverse
+    path of the sequential model, so the batch engine itself is unchanged.
+
+    Very large geometric ray sets, e.g. for irradiance maps, can be traced
+    in single precision by passing dtype=np.float32 to :func:`trace_raw`,
+    halving the memory used by the ray data. The transfer from the object and
+    a Newton correction of each intersection are done in float64, and the
+    optical path is accumulated in float64; analyses that depend on the OPD
+    should use the default double precision trace. Measured against the
+    double precision trace over the bundled models, the float32 direction
+    cosines agree to about 1e-6 and the image intersection points to within
+    2.5e-6 of the overall length of the system. Systems that strongly magnify
+    angular errors, such as the afocal decenter test models, can do much
+    worse.
+
+    If `numba <https://numba.pydata.org>`_ is installed, the refraction,
+    reflection and the intersections with spherical, conic and even
+    polynomial profiles are done by the compiled kernels in
+    :mod:`~.jitkernels`. Otherwise, the NumPy implementation here is used.
+
+.. Created on Sun Oct 18 04:21:48 2026
+
+.. codeauthor: Michael J. Hayford
+"""
+
+import copy
+import pickle
+
+import numpy as np
+
+from .traceerror import TraceEvanescentRayError, TraceStatus
+from .traceplan import TracePlan, Reflect, Refract, Phase
+from . import raytrace as rt
+from . import jitkernels as jk
+
+
+def seg_dtype(dtype=float):
+    """ returns the ray segment record type with fields of type **dtype**
+
+    The fields are ordered as mc.p, mc.d, mc.dst, mc.nrml
+    """
+    return np.dtype([('p', dtype, (3,)),
+                     ('d', dtype, (3,)),
+                     ('dst', dtype),
+                     ('nrml', dtype, (3,))])
+
+
+# record for a double precision ray segment
+ray_seg_dtype = seg_dtype(float)
+
+
+class RayBatch():
+    """ Ray data for a batch of rays traced through a sequential model
+
+    The attributes **p**, **d**, **dst** and **nrml** are views of the fields
+    of **segs**.
+
+    If the batch was traced in more than one wavelength, **wvl** is an array
+    of the wavelengths and all of the per ray arrays below have an additional
+    leading wavelength axis, e.g. **op** is (num_wvls, num_rays). A ray is
+    then indexed by a (wvl index, ray index) tuple, and
+    :meth:`for_wavelength` returns a single wavelength view of the batch.
+
+    Attributes:
+        segs: (num_rays, num_ifcs) record array of ray segments, with fields
+              p, d, dst and nrml
+        p: (num_rays, num_ifcs, 3) array of ray intersection points
+        d: (num_rays, num_ifcs, 3) array of ray direction cosines following
+           each interface
+        dst: (num_rays, num_ifcs) array of geometric distance to the next
+             interface
+        nrml: (num_rays, num_ifcs, 3) array of surface normals at the
+              intersection points
+        op: (num_rays,) array of optical path wrt equally inclined chords to
+            the optical axis
+        wvl: wavelength (in nm) that the rays were traced in, or an array of
+             wavelengths
+        status: (num_rays,) array of :class:`~.TraceStatus` codes
+        fail_surf: (num_rays,) array of the interface index where the ray
+                   failed, -1 if the ray was traced successfully
+        num_segs: (num_rays,) array of the number of ray segments traced
+        acc_opl: (num_rays, num_ifcs) array of the optical path length
+                 accumulated by the rays arriving at each interface, or None
+                 if the trace wasn't run with **cache_state**
+        acc_phase: (num_rays, num_ifcs) array of the phase accumulated by the
+                   rays arriving at each interface, or None
+    """
+
+    def __init__(self, num_rays, num_ifcs, wvl, cache_state=False,
+                 dtype=float):
+        shape = (num_rays,) if np.ndim(wvl) == 0 else (len(wvl), num_rays)
+        self.segs = np.recarray(shape + (num_ifcs,), dtype=seg_dtype(dtype))
+        self.segs[...] = np.nan
+        self.op = np.full(shape, np.nan)
+        self.wvl = wvl if np.ndim(wvl) == 0 else np.array(wvl)
+        self.status = np.full(shape, TraceStatus.OK, dtype=int)
+        self.fail_surf = np.full(shape, -1)
+        self.num_segs = np.full(shape, num_ifcs)
+        if cache_state:
+            self.acc_opl = np.full(shape + (num_ifcs,), np.nan)
+            self.acc_phase = np.full(shape + (num_ifcs,), np.nan)
+        else:
+            self.acc_opl = None
+            self.acc_phase = None
+
+    def __len__(self):
+        return self.op.shape[-1]
+
+    @property
+    def p(self):
+        return self.segs.p
+
+    @property
+    def d(self):
+        return self.segs.d
+
+    @property
+    def dst(self):
+        return self.segs.dst
+
+    @property
+    def nrml(self):
+        return self.segs.nrml
+
+    @property
+    def valid(self):
+        """ (num_rays,) boolean array, True if the ray was traced ok """
+        return self.status == TraceStatus.OK
+
+    def ray_wvl(self, i):
+        """ returns the wavelength that ray **i** was traced in """
+        return self.wvl if np.ndim(self.wvl) == 0 else self.wvl[i[0]]
+
+    def for_wavelength(self, k):
+        """ returns a view of the rays traced in wavelength index **k** """
+        wvl_batch = copy.copy(self)
+        wvl_batch.segs = self.segs[k]
+        wvl_batch.op = self.op[k]
+        wvl_batch.wvl = self.wvl[k]
+        wvl_batch.status = self.status[k]
+        wvl_batch.fail_surf = self.fail_surf[k]
+        wvl_batch.num_segs = self.num_segs[k]
+        if self.acc_opl is not None:
+            wvl_batch.acc_opl = self.acc_opl[k]
+            wvl_batch.acc_phase = self.acc_phase[k]
+        return wvl_batch
+
+    def take(self, idx):
+        """ returns a copy of the batch with the rays in index array **idx**
+
+        For a multiple wavelength batch, **idx** selects the same rays in
+        each wavelength.
+        """
+        rb = copy.copy(self)
+        rb.segs = self.segs.take(idx, axis=-2)
+        for attr in ('op', 'status', 'fail_surf', 'num_segs'):
+            setattr(rb, attr, getattr(self, attr).take(idx, axis=-1))
+        if self.acc_opl is not None:
+            rb.acc_opl = self.acc_opl.take(idx, axis=-2)
+            rb.acc_phase = self.acc_phase.take(idx, axis=-2)
+        return rb
+
+    def ray(self, i):
+        """ returns ray **i** as a list of [pt, dir, dst, normal] segments """
+        segs = self.segs[i]
+        return [[segs.p[j], segs.d[j], segs.dst[j], segs.nrml[j]]
+                for j in range(self.num_segs[i])]
+
+    def ray_segs(self, i):
+        """ returns a record array view of the segments of ray **i**
+
+        Each record supports attribute access, e.g. seg.p, and indexing with
+        the ray segment constants, e.g. seg[mc.p], like a
+        :class:`~.trace.RaySeg`.
+        """
+        return self.segs[i][:self.num_segs[i]]
+
+    def ray_pkg(self, i):
+        """ returns (ray, op, wvl) for ray **i**, or None if the ray failed
+
+        The **ray** is a view returned by :meth:`ray_segs`; use :meth:`ray`
+        for the legacy list format.
+        """
+        if self.valid[i]:
+            return self.ray_segs(i), self.op[i], self.ray_wvl(i)
+        else:
+            return None
+
+    def set_seg(self, idx, j, pt, dir, dst, normal):
+        """ store ray segment **j** for the rays in the index array **idx**
+
+        **idx** indexes the rays in the flattened batch; for a multiple
+        wavelength batch the flat index is wvl index*num_rays + ray index.
+        """
+        segs = self.segs.reshape(-1, self.segs.shape[-1])
+        segs.p[idx, j] = pt
+        segs.d[idx, j] = dir
+        segs.dst[idx, j] = dst
+        segs.nrml[idx, j] = normal
+
+    def set_failed(self, idx, j, status, surf):
+        """ flag the rays in **idx** as failed at interface **surf**
+
+        Args:
+            idx: index array of the failed rays
+            j: index of the last ray segment of the failed rays
+            status: the :class:`~.TraceStatus` of the failed rays; either a
+                    single code or an array with a code for each ray
+            surf: index of the interface where the rays failed
+        """
+        self.status.reshape(-1)[idx] = status
+        self.fail_surf.reshape(-1)[idx] = surf
+        self.num_segs.reshape(-1)[idx] = j + 1
+
+    def set_state(self, idx, j, opl, phase):
+        """ store the path accumulated by rays **idx** arriving at **j** """
+        if self.acc_opl is not None:
+            self.acc_opl.reshape(-1, self.segs.shape[-1])[idx, j] = opl
+            self.acc_phase.reshape(-1, self.segs.shape[-1])[idx, j] = phase
+
+    def restart_from(self, j):
+        """ returns a copy of the batch, reset for a retrace from **j**
+
+        The rays that arrived at interface **j** are reset to unfailed and
+        their segments from **j** on are cleared, except for the segment at
+        **j**, which holds their starting point, direction and normal. The
+        batch must have been traced with **cache_state**.
+
+        Returns:
+            (**ray_batch**, **idx**), where **idx** is the flat index array
+            of the rays to be retraced
+        """
+        if self.acc_opl is None:
+            raise ValueError("ray batch was traced without cache_state")
+        rb = copy.copy(self)
+        for attr in ('segs', 'op', 'status', 'fail_surf', 'num_segs',
+                     'acc_opl', 'acc_phase'):
+            setattr(rb, attr, getattr(self, attr).copy())
+
+        num_ifcs = rb.segs.shape[-1]
+        status = rb.status.reshape(-1)
+        fail_surf = rb.fail_surf.reshape(-1)
+        idx = np.flatnonzero((status == TraceStatus.OK) | (fail_surf > j))
+        status[idx] = TraceStatus.OK
+        fail_surf[idx] = -1
+        rb.num_segs.reshape(-1)[idx] = num_ifcs
+        rb.op.reshape(-1)[idx] = np.nan
+        segs = rb.segs.reshape(-1, num_ifcs)
+        segs.dst[idx, j] = np.nan
+        segs[idx, j+1:] = np.nan
+        rb.acc_opl.reshape(-1, num_ifcs)[idx, j+1:] = np.nan
+        rb.acc_phase.reshape(-1, num_ifcs)[idx, j+1:] = np.nan
+        return rb, idx
+
+
+def bend(d_in, normal, n_in, n_out):
+    """ refract incoming directions, d_in, about normals
+
+    The refractive indices, **n_in** and **n_out**, may be scalars or (N,)
+    arrays.
+
+    Returns:
+        (**d_out**, **tir**)
+
+        - **d_out** - (N, 3) array of refracted direction cosines
+        - **tir** - (N,) boolean array, True if the ray was TIR'd
+    """
+    normal_len = np.sqrt(np.einsum('ij,ij->i', normal, normal))
+    cosI = np.einsum('ij,ij->i', d_in, normal)/normal_len
+    sinI_sqr = 1.0 - cosI*cosI
+    n_cosIp_sqr = n_out*n_out - n_in*n_in*sinI_sqr
+    tir = n_cosIp_sqr < 0.0
+    n_cosIp = np.copysign(np.sqrt(np.where(tir, 0.0, n_cosIp_sqr)), cosI)
+    alpha = n_cosIp - n_in*cosI
+    d_out = ((np.reshape(n_in, (-1, 1))*d_in + alpha[:, np.newaxis]*normal) /
+             np.reshape(n_out, (-1, 1)))
+    return d_out, tir
+
+
+def reflect(d_in, normal):
+    """ reflect incoming directions, d_in, about normals """
+    normal_len = np.sqrt(np.einsum('ij,ij->i', normal, normal))
+    cosI = np.einsum('ij,ij->i', d_in, normal)/normal_len
+    d_out = d_in - 2.0*cosI[:, np.newaxis]*normal
+    return d_out
+
+
+def eic_distance(r, r0):
+    """ calculate equally inclined chord distances between rays and r0
+
+    Args:
+        r: (p, d), (N, 3) arrays of points on the rays and their direction
+           cosines
+        r0: (p0, d0), a point on the ray r0 and its direction cosine, or
+            (N, 3) arrays of them
+
+    Returns:
+        (N,) array of distances along r from equally inclined chord point to p
+    """
+    p, d = r
+    p0, d0 = r0
+    # eq 3.9
+    e = (np.einsum('ij,ij->i', d + d0, p - p0) /
+         (1. + np.einsum('ij,ij->i', d, np.broadcast_to(d0, d.shape))))
+    return e
+
+
+def phase(ifc, inc_pt, d_in, normal, wvl, n_in, n_out, reverse=False):
+    """ apply phase shift to incoming directions, d_in, about normals
+
+    The phase elements are evaluated ray by ray. The wavelength, **wvl**,
+    and the refractive indices, **n_in** and **n_out**, may be scalars or
+    (N,) arrays. If **reverse** is True, the rays are traversing the phase
+    element from image space towards the object.
+
+    Returns:
+        (**d_out**, **dW**, **evanescent**)
+
+        - **d_out** - (N, 3) array of diffracted direction cosines
+        - **dW** - (N,) array of phase added by the interface
+        - **evanescent** - (N,) boolean array, True if the ray is evanescent
+    """
+    num_rays = len(inc_pt)
+    wvl = np.broadcast_to(wvl, num_rays)
+    n_in = np.broadcast_to(n_in, num_rays)
+    n_out = np.broadcast_to(n_out, num_rays)
+    d_out = np.array(d_in)
+    dW = np.zeros(num_rays)
+    evanescent = np.zeros(num_rays, dtype=bool)
+    for i in range(num_rays):
+        try:
+            d_out[i], dW[i] = rt.phase(ifc, inc_pt[i], d_in[i], normal[i],
+                                       wvl[i], n_in[i], n_out[i],
+                                       reverse=reverse)
+        except TraceEvanescentRayError:
+            evanescent[i] = True
+    return d_out, dW, evanescent
+
+
+def refine_intersection(ifc, p, d, s, dtype):
+    """ apply a Newton correction in float64 to reduced precision intersections
+
+    Interfaces without a profile are returned unchanged.
+
+    Args:
+        ifc: the :class:`~.Interface` that was intersected
+        p: (N, 3) array of ray starting points in the interface coordinates
+        d: (N, 3) array of ray direction cosines
+        s: (N,) array of the distances from p to the intersection points
+        dtype: the float type of the results
+
+    Returns:
+        (**s**, **p1**), the corrected distances and (N, 3) intersection
+        points, of type **dtype**
+    """
+    p = p.astype(float)
+    d = d.astype(float)
+    s = s.astype(float)
+    profile = getattr(ifc, 'profile', None)
+    if profile is not None:
+        p1 = p + s[:, np.newaxis]*d
+        with np.errstate(invalid='ignore', divide='ignore'):
+            s = s - (profile.f_batch(p1) /
+                     np.einsum('ij,ij->i', d, profile.df_batch(p1)))
+    p1 = p + s[:, np.newaxis]*d
+    return s.astype(dtype), p1.astype(dtype)
+
+
+def trace(seq_model, pt0, dir0, wvl, **kwargs):
+    """ fundamental batch raytrace function
+
+    Args:
+        seq_model: the sequential model to be traced
+        pt0: (N, 3) array of starting points in coords of first interface
+        dir0: (N, 3) array of starting direction cosines in coords of first
+              interface
+        wvl: wavelength in nm
+        eps: accuracy tolerance for surface intersection calculation
+        reverse: if True, the rays are traced from the image interface back
+                 to the object, see :func:`trace_reverse`
+
+    Returns:
+        a :class:`RayBatch` with the traced ray data
+    """
+    plan = seq_model.trace_plan(wvl, reverse=kwargs.pop('reverse', False))
+    kwargs['first_surf'] = kwargs.get('first_surf', 1)
+    kwargs['last_surf'] = kwargs.get('last_surf',
+                                     seq_model.get_num_surfaces()-2)
+    return trace_raw(plan, pt0, dir0, wvl, **kwargs)
+
+
+def trace_wavelengths(seq_model, pt0, dir0, wvls, **kwargs):
+    """ batch raytrace of a set of rays in several wavelengths in one pass
+
+    Each ray is traced in each of the wavelengths in **wvls**. The trace
+    plans for the wavelengths share the path geometry; the refractive indices
+    for each wavelength are gathered into a (num_ifcs, num_wvls) table and
+    all of the rays are traced together.
+
+    Args:
+        seq_model: the sequential model to be traced
+        pt0: (N, 3) array of starting points in coords of first interface
+        dir0: (N, 3) array of starting direction cosines in coords of first
+              interface
+        wvls: list of wavelengths in nm
+        eps: accuracy tolerance for surface intersection calculation
+        reverse: if True, the rays are traced from the image interface back
+                 to the object, see :func:`trace_reverse`
+
+    Returns:
+        a :class:`RayBatch` with a leading wavelength axis, i.e. the **op**
+        array is (num_wvls, N)
+    """
+    reverse = kwargs.pop('reverse', False)
+    plans = [seq_model.trace_plan(wvl, reverse=reverse) for wvl in wvls]
+    kwargs['rndx'] = np.stack([plan.rndx for plan in plans], axis=1)
+    kwargs['first_surf'] = kwargs.get('first_surf', 1)
+    kwargs['last_surf'] = kwargs.get('last_surf',
+                                     seq_model.get_num_surfaces()-2)
+    return trace_raw(plans[0], pt0, dir0, wvls, **kwargs)
+
+
+def trace_reverse(seq_model, pt0, dir0, wvl, **kwargs):
+    """ batch raytrace from image space back to the object
+
+    The rays are traced along the reverse path of **seq_model**, see
+    :meth:`~.SequentialModel.path`. The interfaces of the resulting
+    :class:`RayBatch` are in reverse order: segment 0 is at the image
+    interface and the last segment is at the object interface. Reversing the
+    direction of the final segment of a forward traced ray and tracing it in
+    reverse retraces the same path, with the same optical path length.
+
+    Args:
+        seq_model: the sequential model to be traced
+        pt0: (N, 3) array of starting points in coords of the image interface
+        dir0: (N, 3) array of starting direction cosines in coords of the
+              image interface, directed towards the object
+        wvl: wavelength in nm, or a list of wavelengths
+        **kwargs: keyword arguments for :func:`trace_raw`
+
+    Returns:
+        a :class:`RayBatch` with the traced ray data. If **wvl** is a list,
+        the RayBatch has a leading wavelength axis.
+    """
+    kwargs['reverse'] = True
+    if np.ndim(wvl) == 0:
+        return trace(seq_model, pt0, dir0, wvl, **kwargs)
+    else:
+        return trace_wavelengths(seq_model, pt0, dir0, wvl, **kwargs)
+
+
+# interface attributes that are derived from the trace or don't affect it
+_untraced_attrs = ('max_aperture', 'edge_apertures', 'label')
+
+
+def path_state(plan, rndx=None):
+    """ returns a snapshot of the data in **plan** that the trace depends on
+
+    Each interface is represented by a pickle of its attributes, omitting the
+    ones that don't affect the trace, e.g. max_aperture.
+    """
+    ifcs = [pickle.dumps({k: v for k, v in vars(ifc).items()
+                          if k not in _untraced_attrs})
+            for ifc in plan.ifcs]
+    return {'ifcs': ifcs,
+            'opcode': plan.opcode.copy(),
+            'rot': plan.rot.copy(),
+            't': plan.t.copy(),
+            'z_dir': plan.z_dir.copy(),
+            'rndx': (plan.rndx if rndx is None else rndx).copy()}
+
+
+def first_changed_surface(old_state, new_state):
+    """ returns the first surface where a trace of **new_state** may differ
+
+    The result is the interface index that a trace of the path described by
+    **new_state** can be restarted from, using the state of the rays traced
+    through **old_state**; a change in an interface, or the refractive index
+    preceding it, affects the segment arriving at the interface.
+
+    Args:
+        old_state: a :func:`path_state` of the previous trace, or None
+        new_state: a :func:`path_state` of the path to be traced
+
+    Returns:
+        surface index, or None if the states are the same
+    """
+    if old_state is None or len(old_state['ifcs']) != len(new_state['ifcs']):
+        return 0
+    for i in range(len(new_state['ifcs'])):
+        if (old_state['ifcs'][i] != new_state['ifcs'][i] or
+                old_state['opcode'][i] != new_state['opcode'][i] or
+                not np.array_equal(old_state['rndx'][i],
+                                   new_state['rndx'][i])):
+            return max(i-1, 0)
+        if (not np.array_equal(old_state['rot'][i], new_state['rot'][i]) or
+                not np.array_equal(old_state['t'][i], new_state['t'][i]) or
+                old_state['z_dir'][i] != new_state['z_dir'][i]):
+            return i
+    return None
+
+
+class IncrementalTrace:
+    """ retrace a fixed set of rays, restarting from the first changed surface
+
+    The state of the rays arriving at each interface is cached after each
+    trace. When the model is changed, e.g. by a dashboard slider or an
+    optimizer step, :meth:`trace` compares the trace plan with the one used
+    for the previous trace and restarts the rays at the first interface that
+    is affected by the changes.
+
+    Attributes:
+        seq_model: the sequential model to be traced
+        pt0: (N, 3) array of starting points in coords of first interface
+        dir0: (N, 3) array of starting direction cosines in coords of first
+              interface
+        wvl: wavelength in nm, or a list of wavelengths
+        ray_batch: the :class:`RayBatch` from the last trace
+        start_surf: the surface the last trace was restarted from, None if
+                    nothing changed
+    """
+
+    def __init__(self, seq_model, pt0, dir0, wvl, **kwargs):
+        self.seq_model = seq_model
+        self.pt0 = pt0
+        self.dir0 = dir0
+        self.wvl = wvl
+        self.kwargs = kwargs
+        self.ray_batch = None
+        self.start_surf = 0
+        self.path_state = None
+
+    def trace(self):
+        """ trace the rays through the current model
+
+        Returns:
+            a :class:`RayBatch` with the traced ray data
+        """
+        seq_model = self.seq_model
+        kwargs = dict(self.kwargs)
+        reverse = kwargs.pop('reverse', False)
+        kwargs['first_surf'] = kwargs.get('first_surf', 1)
+        kwargs['last_surf'] = kwargs.get('last_surf',
+                                         seq_model.get_num_surfaces()-2)
+        if np.ndim(self.wvl) == 0:
+            plan = seq_model.trace_plan(self.wvl, reverse=reverse)
+            new_state = path_state(plan)
+        else:
+            plans = [seq_model.trace_plan(wvl, reverse=reverse)
+                     for wvl in self.wvl]
+            plan = plans[0]
+            kwargs['rndx'] = np.stack([p.rndx for p in plans], axis=1)
+            new_state = path_state(plan, kwargs['rndx'])
+
+        self.start_surf = first_changed_surface(self.path_state, new_state)
+        if self.start_surf is None:
+            return self.ray_batch
+        if self.start_surf > 0:
+            kwargs['restart'] = self.ray_batch, self.start_surf
+
+        self.ray_batch = trace_raw(plan, self.pt0, self.dir0, self.wvl,
+                                   cache_state=True, **kwargs)
+        self.path_state = new_state
+        return self.ray_batch
+
+
+def trace_raw(path, pt0, dir0, wvl, eps=1.0e-12, **kwargs):
+    """ fundamental batch raytrace function
+
+    The results match those of :func:`~.raytrace.trace_raw` for each ray in
+    the batch. Rays that fail are removed from the active set at the failing
+    interface and flagged as invalid; the ray data up to the failure is
+    retained, as it would be in the exception raised by
+    :func:`~.raytrace.trace_raw`.
+
+    Args:
+        path: a :class:`~.TracePlan` or an iterator containing interfaces and
+              gaps to be traced. for each iteration, the sequence or generator
+              should return a list containing: **Intfc, Gap, Trfm, Index,
+              Z_Dir**
+        pt0: (N, 3) array of starting points in coords of first interface
+        dir0: (N, 3) array of starting direction cosines in coords of first
+              interface
+        wvl: wavelength in nm, or a list of wavelengths if **rndx** is given
+        eps: accuracy tolerance for surface intersection calculation
+        rndx: optional (num_ifcs, num_wvls) array of refractive indices for
+              each wavelength in **wvl**. If given, the rays are traced in
+              each wavelength and the result has a leading wavelength axis.
+        use_jit: if True, use the kernels in :mod:`~.jitkernels`. The
+                 default is True if numba is installed.
+        check_apertures: if True, rays that intersect an interface outside
+                         its clear apertures are blocked and removed from the
+                         active set
+        cache_state: if True, the optical path accumulated by the rays
+                     arriving at each interface is saved in the RayBatch, so
+                     that it can be used to restart the trace
+        restart: optional tuple (**ray_batch**, **surf**). The rays in
+                 **ray_batch**, traced with **cache_state** along an
+                 identical path up to interface **surf**, are retraced from
+                 their state at **surf**; pt0 and dir0 must be those of
+                 **ray_batch**.
+        dtype: the float type of the ray data, default float. If
+               np.float32, the ray segments are stored and propagated in
+               single precision; the intersection points are refined by a
+               float64 Newton step, see :func:`refine_intersection`. The
+               optical path is accumulated in float64.
+
+    Returns:
+        a :class:`RayBatch` with the traced ray data
+    """
+    wvls = np.array(wvl, ndmin=1)
+    plan = path if isinstance(path, TracePlan) else TracePlan(path, wvls[0])
+    rndx = kwargs.get('rndx', None)
+    if rndx is None:
+        rndx = plan.rndx[:, np.newaxis]
+    dtype = np.dtype(kwargs.get('dtype', float))
+    reduced_precision = dtype != np.float64
+    plan_rot, plan_t = plan.rot, plan.t
+    if reduced_precision:
+        plan_rot, plan_t = plan_rot.astype(dtype), plan_t.astype(dtype)
+        rndx = rndx.astype(dtype)
+
+    if kwargs.get('use_jit', jk.HAS_NUMBA):
+        bend_fct, reflect_fct = jk.bend, jk.reflect
+        intersect_fct, normal_fct = jk.intersect, jk.normal
+    else:
+        bend_fct, reflect_fct = bend, reflect
+
+        def intersect_fct(plan, i, p, d, eps, z_dir):
+            return plan.ifcs[i].intersect_batch(p, d, eps=eps, z_dir=z_dir)
+
+        def normal_fct(plan, i, p):
+            return plan.ifcs[i].normal_batch(p)
+    pt0 = np.array(pt0, dtype=float, ndmin=2)
+    dir0 = np.array(dir0, dtype=float, ndmin=2)
+    num_rays = len(pt0)
+
+    first_surf = kwargs.get('first_surf', 0)
+    last_surf = kwargs.get('last_surf', None)
+    check_apertures = kwargs.get('check_apertures', False)
+    cache_state = kwargs.get('cache_state', False)
+    restart_batch, start_surf = kwargs.get('restart', (None, 0))
+    if restart_batch is None:
+        start_surf = 0
+
+    if start_surf == 0:
+        rb = RayBatch(num_rays, len(plan), wvl, cache_state=cache_state,
+                      dtype=dtype)
+    else:
+        rb, act = restart_batch.restart_from(start_surf)
+
+    # the rays for each wavelength are stacked in a flat ray index
+    num_wvls = len(wvls)
+    wvl_idx = np.repeat(np.arange(num_wvls), num_rays)
+    pt0 = np.tile(pt0, (num_wvls, 1))
+    dir0 = np.tile(dir0, (num_wvls, 1))
+    num_rays *= num_wvls
+
+    def in_surface_range(s):
+        if first_surf == last_surf:
+            return False
+        if s < first_surf:
+            return False
+        if last_surf is None:
+            return True
+        else:
+            return s < last_surf
+
+    op_delta = np.zeros(num_rays)
+    opl = np.zeros(num_rays)
+    if start_surf == 0:
+        # trace object surface
+        srf_obj = plan.ifcs[0]
+        dst_b4, pt_obj, _ = srf_obj.intersect_batch(pt0, dir0,
+                                                    z_dir=plan.z_dir[0])
+
+        # indices of the rays still being traced
+        act = np.arange(num_rays)
+
+        before_pt = pt_obj
+        before_dir = dir0
+        before_normal = srf_obj.normal_batch(before_pt)
+    else:
+        # pick up the rays arriving at start_surf from the restart batch
+        segs = rb.segs.reshape(-1, len(plan))
+        before_pt = segs.p[act, start_surf]
+        before_dir = segs.d[act, start_surf]
+        before_normal = segs.nrml[act, start_surf]
+        opl[act] = rb.acc_opl.reshape(-1, len(plan))[act, start_surf]
+        op_delta[act] = rb.acc_phase.reshape(-1, len(plan))[act, start_surf]
+
+    # loop of remaining surfaces in path
+    for surf in range(start_surf, len(plan)-1):
+        rb.set_state(act, surf, opl[act], op_delta[act])
+        if surf == 0:
+            # the transfer from the object, which may be very distant, is
+            #  always done in float64
+            rot, t = plan.rot[surf], plan.t[surf]
+        else:
+            rot, t = plan_rot[surf], plan_t[surf]
+        b4_pt = np.matmul(before_pt - t, rot.T)
+        b4_dir = np.matmul(before_dir, rot.T)
+
+        pp_dst = -np.einsum('ij,ij->i', b4_pt, b4_dir)
+        pp_pt_before = b4_pt + pp_dst[:, np.newaxis]*b4_dir
+
+        ifc = plan.ifcs[surf+1]
+        z_dir_before = plan.z_dir[surf]
+        op_code = plan.opcode[surf+1]
+
+        # intersect rays with profile
+        pp_dst_intrsct, inc_pt, missed = intersect_fct(
+            plan, surf+1, pp_pt_before, b4_dir, eps, z_dir_before)
+        if reduced_precision:
+            pp_dst_intrsct, inc_pt = refine_intersection(
+                ifc, pp_pt_before, b4_dir, pp_dst_intrsct, dtype)
+        dst_b4 = pp_dst + pp_dst_intrsct
+
+        if np.any(missed):
+            idx = act[missed]
+            rb.set_seg(idx, surf, before_pt[missed], before_dir[missed],
+                       pp_dst[missed], before_normal[missed])
+            rb.set_failed(idx, surf, TraceStatus.MissedSurface, surf+1)
+            hit = ~missed
+            act = act[hit]
+            before_pt, before_dir = before_pt[hit], before_dir[hit]
+            before_normal = before_normal[hit]
+            b4_dir, dst_b4, inc_pt = b4_dir[hit], dst_b4[hit], inc_pt[hit]
+        rb.set_seg(act, surf, before_pt, before_dir, dst_b4, before_normal)
+
+        act_wvl = wvl_idx[act]
+        n_before, n_after = rndx[surf, act_wvl], rndx[surf+1, act_wvl]
+
+        if in_surface_range(surf):
+            opl[act] += n_before * dst_b4
+
+        if check_apertures:
+            blocked = ~ifc.point_inside_batch(inc_pt[:, 0], inc_pt[:, 1])
+            if np.any(blocked):
+                idx = act[blocked]
+                rb.set_seg(idx, surf+1, inc_pt[blocked], before_dir[blocked],
+                           0.0, normal_fct(plan, surf+1, inc_pt[blocked]))
+                rb.set_failed(idx, surf+1, TraceStatus.Blocked, surf+1)
+                ok = ~blocked
+                act = act[ok]
+                before_dir, b4_dir = before_dir[ok], b4_dir[ok]
+                inc_pt = inc_pt[ok]
+                n_before, n_after = n_before[ok], n_after[ok]
+                act_wvl = act_wvl[ok]
+
+        normal = normal_fct(plan, surf+1, inc_pt).astype(dtype, copy=False)
+        status = np.full(len(act), TraceStatus.OK, dtype=int)
+
+        def apply_phase(d_in):
+            d_out, phs, evanescent = phase(ifc, inc_pt, d_in, normal,
+                                           wvls[act_wvl], n_before, n_after,
+                                           reverse=plan.reverse)
+            op_delta[act] += phs
+            status[evanescent & (status == TraceStatus.OK)] = \
+                TraceStatus.Evanescent
+            return d_out
+
+        # if the interface has a phase element, process that first. The
+        #  output of the phase element becomes the input for the
+        #  refraction/reflection calculation. A reverse trace undoes these
+        #  steps in the opposite order.
+        if op_code & Phase and not plan.reverse:
+            b4_dir = apply_phase(b4_dir)
+
+        # refract or reflect rays at interface
+        if op_code & Reflect:
+            after_dir = reflect_fct(b4_dir, normal)
+        elif op_code & Refract:
+            after_dir, tir = bend_fct(b4_dir, normal, n_before, n_after)
+            status[tir & (status == TraceStatus.OK)] = TraceStatus.TIR
+        else:  # no action, input becomes output
+            after_dir = b4_dir
+
+        if op_code & Phase and plan.reverse:
+            after_dir = apply_phase(after_dir)
+
+        failed = status != TraceStatus.OK
+        if np.any(failed):
+            idx = act[failed]
+            rb.set_seg(idx, surf+1, inc_pt[failed], before_dir[failed], 0.0,
+                       normal[failed])
+            rb.set_failed(idx, surf+1, status[failed], surf+1)
+            ok = ~failed
+            act = act[ok]
+            inc_pt = inc_pt[ok]
+            after_dir = after_dir[ok]
+            normal = normal[ok]
+
+        before_pt = inc_pt
+        before_normal = normal
+        before_dir = after_dir.astype(dtype, copy=False)
+
+    rb.set_seg(act, len(plan)-1, before_pt, before_dir, 0.0, before_normal)
+    rb.set_state(act, len(plan)-1, opl[act], op_delta[act])
+    op_delta += opl
+    valid = rb.valid.reshape(-1)
+    rb.op.reshape(-1)[valid] = op_delta[valid]
+
+    return rb
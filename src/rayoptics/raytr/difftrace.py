@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright © 2026 Michael J. Hayford
+""" Differential ray trace, for the derivatives of rays wrt pupil and field
+
+    A differential trace propagates the derivatives of the ray intersection
+    points and direction cosines with respect to a set of parameters, e.g.
+    the pupil and field coordinates of the ray, along with the rays
+    themselves. The derivatives are carried analytically through the
+    transfer between interfaces, the intersection with each profile, and the
+    refraction or reflection at the interface. The change in the surface
+    normal along the ray uses the profile's Hessian,
+    :meth:`~.SurfaceProfile.ddf_batch`.
+
+    The Jacobians of the ray coordinates at any interface are then available
+    from a single trace, without choosing a finite difference step. Uses
+    include ray aiming, local magnification and the astigmatic foci about a
+    chief ray, see :func:`trace_astigmatism`.
+
+    The rays are traced with :func:`~.batchtrace.trace_raw`; the derivatives
+    are propagated in a second pass over the stored ray segments. Phase
+    elements are differentiated by central differences of
+    :func:`~.batchtrace.phase`.
+
+.. Created on Sun Oct 18 05:10:50 2026
+
+.. codeauthor: Michael J. Hayford
+"""
+
+import numpy as np
+
+from . import batchtrace as bt
+from .traceplan import TracePlan, Reflect, Refract, Phase
+
+
+class DifferentialRays:
+    """ A batch of rays and their derivatives wrt M parameters
+
+    Rays that failed to trace have NaN derivatives.
+
+    Attributes:
+        ray_batch: the :class:`~.RayBatch` of the traced rays
+        dp: (num_rays, num_ifcs, M, 3) array of the derivatives of the
+            intersection points, in the local coordinates of each interface
+        dd: (num_rays, num_ifcs, M, 3) array of the derivatives of the
+            direction cosines following each interface
+        params: list of the names of the M parameters
+    """
+
+    def __init__(self, ray_batch, dp, dd, params=None):
+        self.ray_batch = ray_batch
+        self.dp = dp
+        self.dd = dd
+        self.params = params
+
+    def jacobian(self, surf=-1):
+        """ returns the (num_rays, 2, M) Jacobian of x, y at interface surf """
+        return np.swapaxes(self.dp[:, surf, :, :2], 1, 2)
+
+    def dir_jacobian(self, surf=-1):
+        """ returns the (num_rays, 2, M) Jacobian of the x, y direction
+        cosines following interface surf
+        """
+        return np.swapaxes(self.dd[:, surf, :, :2], 1, 2)
+
+
+def intersect_derivative(normal, d, s, dp, dd):
+    """ derivative of the intersection point of rays p + s*d with a surface
+
+    Args:
+        normal: (N, 3) array of surface normals at the intersection points
+        d: (N, 3) array of ray direction cosines
+        s: (N,) array of distances from p to the intersection points
+        dp: (N, M, 3) array of the derivatives of the ray starting points
+        dd: (N, M, 3) array of the derivatives of the direction cosines
+
+    Returns:
+        (N, M, 3) array of the derivatives of the intersection points
+    """
+    dp_s = dp + s[:, np.newaxis, np.newaxis]*dd
+    ds = (-np.einsum('nk,nmk->nm', normal, dp_s) /
+          np.einsum('nk,nk->n', normal, d)[:, np.newaxis])
+    return dp_s + ds[:, :, np.newaxis]*d[:, np.newaxis, :]
+
+
+def normal_derivative(ifc, p, normal, dp):
+    """ derivative of the unit normals of **ifc** at points p along dp
+
+    Args:
+        ifc: the :class:`~.Interface`
+        p: (N, 3) array of points on the interface
+        normal: (N, 3) array of the unit normals at p
+        dp: (N, M, 3) array of the derivatives of p
+
+    Returns:
+        (N, M, 3) array of the derivatives of the unit normals
+    """
+    profile = getattr(ifc, 'profile', None)
+    if profile is not None:
+        df = profile.df_batch(p)
+        df_len = np.sqrt(np.einsum('nk,nk->n', df, df))
+        d_df = np.einsum('nij,nmj->nmi', profile.ddf_batch(p), dp)
+        d_df_n = np.einsum('nk,nmk->nm', normal, d_df)
+        return ((d_df - d_df_n[:, :, np.newaxis]*normal[:, np.newaxis, :]) /
+                df_len[:, np.newaxis, np.newaxis])
+    else:
+        dn = np.empty_like(dp)
+        for m in range(dp.shape[1]):
+            h = 1e-6/np.maximum(np.max(np.abs(dp[:, m]), axis=1), 1e-12)
+            dpm = h[:, np.newaxis]*dp[:, m]
+            dn[:, m] = ((ifc.normal_batch(p + dpm) -
+                         ifc.normal_batch(p - dpm))/(2.0*h[:, np.newaxis]))
+        return dn
+
+
+def bend_derivative(d_in, normal, n_in, n_out, dd_in, dn):
+    """ derivative of the refracted directions, see :func:`~.batchtrace.bend`
+
+    Args:
+        d_in: (N, 3) array of incoming direction cosines
+        normal: (N, 3) array of unit surface normals
+        n_in: refractive index before the interface
+        n_out: refractive index after the interface
+        dd_in: (N, M, 3) array of the derivatives of d_in
+        dn: (N, M, 3) array of the derivatives of the normals
+
+    Returns:
+        (N, M, 3) array of the derivatives of the refracted directions
+    """
+    cosI = np.einsum('nk,nk->n', d_in, normal)
+    d_cosI = (np.einsum('nk,nmk->nm', normal, dd_in) +
+              np.einsum('nk,nmk->nm', d_in, dn))
+    n_cosIp = np.copysign(np.sqrt(n_out*n_out - n_in*n_in*(1.0 - cosI*cosI)),
+                          cosI)
+    alpha = n_cosIp - n_in*cosI
+    d_n_cosIp = n_in*n_in*(cosI/n_cosIp)[:, np.newaxis]*d_cosI
+    d_alpha = d_n_cosIp - n_in*d_cosI
+    return (n_in*dd_in + d_alpha[:, :, np.newaxis]*normal[:, np.newaxis, :] +
+            alpha[:, np.newaxis, np.newaxis]*dn)/n_out
+
+
+def reflect_derivative(d_in, normal, dd_in, dn):
+    """ derivative of the reflected directions, see
+    :func:`~.batchtrace.reflect`
+    """
+    cosI = np.einsum('nk,nk->n', d_in, normal)
+    d_cosI = (np.einsum('nk,nmk->nm', normal, dd_in) +
+              np.einsum('nk,nmk->nm', d_in, dn))
+    return dd_in - 2.0*(d_cosI[:, :, np.newaxis]*normal[:, np.newaxis, :] +
+                        cosI[:, np.newaxis, np.newaxis]*dn)
+
+
+def phase_derivative(ifc, p, d_in, normal, wvl, n_in, n_out, dp, dd_in, dn):
+    """ central difference derivative of the directions after a phase element
+
+    Returns:
+        (**d_out**, **dd_out**), the (N, 3) directions following the phase
+        element and their (N, M, 3) derivatives
+    """
+    d_out, _, _ = bt.phase(ifc, p, d_in, normal, wvl, n_in, n_out)
+    dd_out = np.empty_like(dd_in)
+    for m in range(dd_in.shape[1]):
+        scale = np.maximum(np.max(np.abs(dp[:, m]), axis=1),
+                           np.max(np.abs(dd_in[:, m]), axis=1))
+        h = (1e-6/np.maximum(scale, 1e-12))[:, np.newaxis]
+        d_plus, _, _ = bt.phase(ifc, p + h*dp[:, m], d_in + h*dd_in[:, m],
+                                normal + h*dn[:, m], wvl, n_in, n_out)
+        d_minus, _, _ = bt.phase(ifc, p - h*dp[:, m], d_in - h*dd_in[:, m],
+                                 normal - h*dn[:, m], wvl, n_in, n_out)
+        dd_out[:, m] = (d_plus - d_minus)/(2.0*h)
+    return d_out, dd_out
+
+
+def trace_raw(path, pt0, dir0, wvl, dpt0, ddir0, eps=1.0e-12, params=None,
+              **kwargs):
+    """ differential batch raytrace function
+
+    Args:
+        path: a :class:`~.TracePlan` or an iterator containing interfaces and
+              gaps to be traced, as in :func:`~.batchtrace.trace_raw`
+        pt0: (N, 3) array of starting points in coords of first interface
+        dir0: (N, 3) array of starting direction cosines in coords of first
+              interface
+        wvl: wavelength in nm
+        dpt0: (N, M, 3) array of the derivatives of pt0 wrt the M parameters
+        ddir0: (N, M, 3) array of the derivatives of dir0
+        eps: accuracy tolerance for surface intersection calculation
+        params: optional list of the names of the M parameters
+        **kwargs: keyword arguments passed to :func:`~.batchtrace.trace_raw`
+
+    Returns:
+        a :class:`DifferentialRays` instance
+    """
+    plan = path if isinstance(path, TracePlan) else TracePlan(path, wvl)
+    pt0 = np.array(pt0, dtype=float, ndmin=2)
+    dir0 = np.array(dir0, dtype=float, ndmin=2)
+    dpt0 = np.asarray(dpt0, dtype=float)
+    ddir0 = np.asarray(ddir0, dtype=float)
+    rb = bt.trace_raw(plan, pt0, dir0, wvl, eps=eps, **kwargs)
+
+    num_rays, num_ifcs = rb.segs.shape
+    num_params = dpt0.shape[1]
+    dp = np.full((num_rays, num_ifcs, num_params, 3), np.nan)
+    dd = np.full((num_rays, num_ifcs, num_params, 3), np.nan)
+
+    # the derivatives are propagated for the rays that traced successfully
+    act = np.flatnonzero(rb.valid)
+    segs = rb.segs[act]
+
+    # object surface
+    p_obj = segs.p[:, 0]
+    s0 = np.einsum('nk,nk->n', p_obj - pt0[act], dir0[act])
+    dp_cur = intersect_derivative(segs.nrml[:, 0], dir0[act], s0,
+                                  dpt0[act], ddir0[act])
+    dd_cur = ddir0[act]
+    dp[act, 0] = dp_cur
+    dd[act, 0] = dd_cur
+
+    for surf in range(len(plan)-1):
+        rot = plan.rot[surf]
+        b4_dir = np.matmul(segs.d[:, surf], rot.T)
+        dp_b4 = np.matmul(dp_cur, rot.T)
+        dd_b4 = np.matmul(dd_cur, rot.T)
+
+        ifc = plan.ifcs[surf+1]
+        inc_pt = segs.p[:, surf+1]
+        normal = segs.nrml[:, surf+1]
+        dp_cur = intersect_derivative(normal, b4_dir, segs.dst[:, surf],
+                                      dp_b4, dd_b4)
+        dn = normal_derivative(ifc, inc_pt, normal, dp_cur)
+
+        op_code = plan.opcode[surf+1]
+        n_before, n_after = plan.rndx[surf], plan.rndx[surf+1]
+        if op_code & Phase:
+            b4_dir, dd_b4 = phase_derivative(ifc, inc_pt, b4_dir, normal,
+                                             wvl, n_before, n_after,
+                                             dp_cur, dd_b4, dn)
+        if op_code & Reflect:
+            dd_cur = reflect_derivative(b4_dir, normal, dd_b4, dn)
+        elif op_code & Refract:
+            dd_cur = bend_derivative(b4_dir, normal, n_before, n_after,
+                                     dd_b4, dn)
+        else:
+            dd_cur = dd_b4
+
+        dp[act, surf+1] = dp_cur
+        dd[act, surf+1] = dd_cur
+
+    return DifferentialRays(rb, dp, dd, params=params)
+
+
+def obj_coords_jacobian(optical_spec, fld):
+    """ returns the (3, 2) derivative of the object point wrt fld.x, fld.y
+
+    This is the derivative of :meth:`~.OpticalSpecs.obj_coords`.
+    """
+    fov = optical_spec.field_of_view
+    fod = optical_spec.parax_data.fod
+    field, obj_img_key, value_key = fov.key
+    jac = np.zeros((3, 2))
+    if obj_img_key == 'object':
+        if value_key == 'angle':
+            ang_rad = np.deg2rad(np.array([fld.x, fld.y]))
+            dtan = (1.0 + np.tan(ang_rad)**2)*np.pi/180.0
+            jac[0, 0], jac[1, 1] = -dtan*(fod.obj_dist+fod.enp_dist)
+        elif value_key == 'height':
+            jac[0, 0] = jac[1, 1] = 1.0
+    elif obj_img_key == 'image':
+        if value_key == 'height':
+            jac[0, 0] = jac[1, 1] = fod.red
+    return jac
+
+
+def trace_pupil_field(opt_model, pupils, fld, wvl, **kwargs):
+    """ differential trace of rays wrt relative pupil and field coordinates
+
+    The rays are specified as for :func:`~.trace.trace_base_batch`. The
+    derivatives are taken wrt the parameters ('px', 'py', 'fx', 'fy'): the
+    relative pupil coordinates, including vignetting, and the field
+    coordinates fld.x and fld.y, in the units of the
+    :class:`~.FieldSpec`. The aim point of **fld** is held fixed.
+
+    Args:
+        opt_model: instance of :class:`~.OpticalModel` to trace
+        pupils: (N, 2) array of relative pupil coordinates of the rays
+        fld: instance of :class:`~.Field`
+        wvl: ray trace wavelength in nm
+        **kwargs: keyword arguments passed to :func:`~.batchtrace.trace_raw`
+
+    Returns:
+        a :class:`DifferentialRays` instance
+    """
+    seq_model = opt_model.seq_model
+    osp = opt_model.optical_spec
+    fod = osp.parax_data.fod
+    eprad = fod.enp_radius
+    pupils = np.array(pupils, dtype=float).reshape(-1, 2)
+    vig_pupils = np.array([fld.apply_vignetting(pupil)
+                           for pupil in pupils]).reshape(-1, 2)
+    vig_scale = np.stack([np.where(pupils[:, 0] < 0.0, 1.0 - fld.vlx,
+                                   1.0 - fld.vux),
+                          np.where(pupils[:, 1] < 0.0, 1.0 - fld.vly,
+                                   1.0 - fld.vuy)], axis=1)
+    aim_pt = np.array([0., 0.])
+    if getattr(fld, 'aim_pt', None) is not None:
+        aim_pt = fld.aim_pt
+
+    num_rays = len(pupils)
+    pt1 = np.empty((num_rays, 3))
+    pt1[:, :2] = eprad*vig_pupils + aim_pt
+    pt1[:, 2] = fod.obj_dist + fod.enp_dist
+    pt0 = np.tile(osp.obj_coords(fld), (num_rays, 1))
+    dir0 = pt1 - pt0
+    length = np.linalg.norm(dir0, axis=1)
+    dir0 = dir0/length[:, np.newaxis]
+
+    # derivatives of the starting and aim points
+    dpt0 = np.zeros((num_rays, 4, 3))
+    dpt0[:, 2:] = obj_coords_jacobian(osp, fld).T
+    dpt1 = np.zeros((num_rays, 4, 3))
+    dpt1[:, 0, 0] = eprad*vig_scale[:, 0]
+    dpt1[:, 1, 1] = eprad*vig_scale[:, 1]
+    dv = dpt1 - dpt0
+    ddir0 = ((dv - np.einsum('nk,nmk->nm', dir0, dv)[:, :, np.newaxis] *
+              dir0[:, np.newaxis, :])/length[:, np.newaxis, np.newaxis])
+
+    kwargs['first_surf'] = kwargs.get('first_surf', 1)
+    kwargs['last_surf'] = kwargs.get('last_surf',
+                                     seq_model.get_num_surfaces()-2)
+    return trace_raw(seq_model.trace_plan(wvl), pt0, dir0, wvl, dpt0, ddir0,
+                     params=['px', 'py', 'fx', 'fy'], **kwargs)
+
+
+def trace_astigmatism(opt_model, fld, wvl, foc):
+    """ calculate astigmatism by a differential trace of the chief ray
+
+    This is the limit of :func:`~.trace.trace_astigmatism` as the pupil
+    increments go to zero, obtained from a single differential trace of the
+    chief ray at **fld**. The same symmetry assumptions apply.
+
+    Args:
+        opt_model: the optical model
+        fld: a Field object
+        wvl: wavelength in nm
+        foc: defocus amount
+
+    Returns:
+        tuple: sagittal and tangential focus shifts at **fld**
+    """
+    diff_rays = trace_pupil_field(opt_model, [[0., 0.]], fld, wvl)
+    d = diff_rays.ray_batch.d[0, -1]
+    foci = []
+    for m in range(2):
+        # the focus of the pupil fan m is where the transverse separation
+        #  of the neighboring rays, dp + s*dd, is smallest
+        dp = diff_rays.dp[0, -1, m]
+        dd = diff_rays.dd[0, -1, m]
+        dp_perp = dp - np.dot(dp, d)*d
+        dd_perp = dd - np.dot(dd, d)*d
+        s = -np.dot(dp_perp, dd_perp)/np.dot(dd_perp, dd_perp)
+        foci.append(s*d[2])
+    s_foc, t_foc = foci
+    if foc is not None:
+        s_foc -= foc
+        t_foc -= foc
+    return s_foc, t_foc
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright © 2026 Michael J. Hayford
+""" Compiled kernels for the inner loop of the batch ray trace
+
+    The functions in this module loop over the rays of a batch one at a time,
+    using the profile data (cv, cc, coefs) stored in a :class:`~.TracePlan`.
+    When `numba <https://numba.pydata.org>`_ is installed, the loops are
+    compiled to machine code, avoiding the temporary arrays and Python
+    dispatch of the NumPy implementation in :mod:`~.batchtrace`.
+
+    If numba isn't available, :data:`HAS_NUMBA` is False and
+    :func:`~.batchtrace.trace_raw` uses the NumPy implementation. The kernels
+    still run as ordinary (slow) Python functions, which is useful for
+    testing.
+
+    Interfaces whose profile type is :data:`~.traceplan.PrfOther` are traced
+    with the interface's own intersect_batch() and normal_batch() methods.
+
+.. Created on Sun Oct 18 04:47:34 2026
+
+.. codeauthor: Michael J. Hayford
+"""
+
+from math import sqrt, copysign
+
+import numpy as np
+
+from .traceplan import PrfConic, PrfEvenPoly
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+HAS_NUMBA = numba is not None
+
+
+def jit(fct):
+    """ compile **fct** with numba if it is available """
+    if numba is None:
+        return fct
+    return numba.njit(cache=True)(fct)
+
+
+@jit
+def _bend(d_in, normal, n_in, n_out, d_out, tir):
+    for i in range(d_in.shape[0]):
+        normal_len = sqrt(normal[i, 0]*normal[i, 0] +
+                          normal[i, 1]*normal[i, 1] +
+                          normal[i, 2]*normal[i, 2])
+        cosI = (d_in[i, 0]*normal[i, 0] + d_in[i, 1]*normal[i, 1] +
+                d_in[i, 2]*normal[i, 2])/normal_len
+        sinI_sqr = 1.0 - cosI*cosI
+        n_cosIp_sqr = n_out[i]*n_out[i] - n_in[i]*n_in[i]*sinI_sqr
+        if n_cosIp_sqr < 0.0:
+            tir[i] = True
+            n_cosIp_sqr = 0.0
+        n_cosIp = copysign(sqrt(n_cosIp_sqr), cosI)
+        alpha = n_cosIp - n_in[i]*cosI
+        for k in range(3):
+            d_out[i, k] = (n_in[i]*d_in[i, k] + alpha*normal[i, k])/n_out[i]
+
+
+@jit
+def _reflect(d_in, normal, d_out):
+    for i in range(d_in.shape[0]):
+        normal_len = sqrt(normal[i, 0]*normal[i, 0] +
+                          normal[i, 1]*normal[i, 1] +
+                          normal[i, 2]*normal[i, 2])
+        cosI = (d_in[i, 0]*normal[i, 0] + d_in[i, 1]*normal[i, 1] +
+                d_in[i, 2]*normal[i, 2])/normal_len
+        for k in range(3):
+            d_out[i, k] = d_in[i, k] - 2.0*cosI*normal[i, k]
+
+
+@jit
+def _intersect_conic(p, d, cv, cc, z_dir, s, p1, missed):
+    ec = cc + 1.0
+    for i in range(p.shape[0]):
+        # For quadratic equation ax**2 + bx + c = 0:
+        #  ax2 = 2a
+        #  cx2 = 2c
+        ax2 = cv*(1. + cc*d[i, 2]*d[i, 2])
+        cx2 = cv*(p[i, 0]*p[i, 0] + p[i, 1]*p[i, 1] +
+                  ec*p[i, 2]*p[i, 2]) - 2.0*p[i, 2]
+        b = cv*(d[i, 0]*p[i, 0] + d[i, 1]*p[i, 1] +
+                ec*d[i, 2]*p[i, 2]) - d[i, 2]
+        disc = b*b - ax2*cx2
+        if disc < 0.0:
+            missed[i] = True
+            s[i] = np.nan
+        else:
+            # Use z_dir to pick correct root
+            s[i] = cx2/(z_dir*sqrt(disc) - b)
+        for k in range(3):
+            p1[i, k] = p[i, k] + s[i]*d[i, k]
+
+
+@jit
+def _conic_df(x, y, z, cv, cc, df):
+    df[0] = -cv*x
+    df[1] = -cv*y
+    df[2] = 1.0-(cc+1.0)*cv*z
+
+
+@jit
+def _even_poly_sag(x, y, cv, cc, coefs, num_coefs):
+    r2 = x*x + y*y
+    # sphere + conic contribution
+    arg = 1. - (cc+1.0)*cv*cv*r2
+    if arg < 0.0:
+        return np.nan
+    z = cv*r2/(1. + sqrt(arg))
+
+    # polynomial asphere contribution
+    z_asp = 0.0
+    r_pow = r2
+    for j in range(num_coefs):
+        z_asp += coefs[j]*r_pow
+        r_pow = r_pow*r2
+
+    return z + z_asp
+
+
+@jit
+def _even_poly_df(x, y, cv, cc, coefs, num_coefs, df):
+    # sphere + conic contribution
+    r2 = x*x + y*y
+    arg = 1. - (cc+1.0)*cv*cv*r2
+    if arg < 0.0:
+        e = np.nan
+    else:
+        e = cv/sqrt(arg)
+
+    # polynomial asphere contribution
+    r_pow = 1.0
+    e_asp = 0.0
+    c_coef = 2.0
+    for j in range(num_coefs):
+        e_asp += c_coef*coefs[j]*r_pow
+        c_coef += 2.0
+        r_pow = r_pow*r2
+
+    e_tot = e + e_asp
+    df[0] = -e_tot*x
+    df[1] = -e_tot*y
+    df[2] = 1.0
+
+
+@jit
+def _intersect_even_poly(p0, d, s0, cv, cc, coefs, num_coefs, eps, max_iter,
+                         s, p, missed, num_iter):
+    df = np.empty(3)
+    for i in range(p0.shape[0]):
+        # Spencer and Murty iteration, starting from the base conic
+        x = p0[i, 0] + s0[i]*d[i, 0]
+        y = p0[i, 1] + s0[i]*d[i, 1]
+        z = p0[i, 2] + s0[i]*d[i, 2]
+        f = z - _even_poly_sag(x, y, cv, cc, coefs, num_coefs)
+        _even_poly_df(x, y, cv, cc, coefs, num_coefs, df)
+        s1 = s0[i] - f/(d[i, 0]*df[0] + d[i, 1]*df[1] + d[i, 2]*df[2])
+        iter = 1
+        delta = abs(s1 - s0[i])
+        while delta > eps and iter < max_iter:
+            x = p0[i, 0] + s1*d[i, 0]
+            y = p0[i, 1] + s1*d[i, 1]
+            z = p0[i, 2] + s1*d[i, 2]
+            f = z - _even_poly_sag(x, y, cv, cc, coefs, num_coefs)
+            _even_poly_df(x, y, cv, cc, coefs, num_coefs, df)
+            s2 = s1 - f/(d[i, 0]*df[0] + d[i, 1]*df[1] + d[i, 2]*df[2])
+            delta = abs(s2 - s1)
+            s1 = s2
+            iter += 1
+        num_iter[i] = iter
+        if np.isfinite(s1):
+            s[i] = s1
+            p[i, 0], p[i, 1], p[i, 2] = x, y, z
+        else:
+            missed[i] = True
+            s[i] = np.nan
+            p[i, 0], p[i, 1], p[i, 2] = np.nan, np.nan, np.nan
+
+
+@jit
+def _normal(p, prf_type, cv, cc, coefs, num_coefs, nrml):
+    df = np.empty(3)
+    for i in range(p.shape[0]):
+        if prf_type == PrfEvenPoly:
+            _even_poly_df(p[i, 0], p[i, 1], cv, cc, coefs, num_coefs, df)
+        else:
+            _conic_df(p[i, 0], p[i, 1], p[i, 2], cv, cc, df)
+        df_len = sqrt(df[0]*df[0] + df[1]*df[1] + df[2]*df[2])
+        for k in range(3):
+            nrml[i, k] = df[k]/df_len
+
+
+def bend(d_in, normal, n_in, n_out):
+    """ refract incoming directions, d_in, about normals
+
+    Args:
+        d_in: (N, 3) array of incoming direction cosines
+        normal: (N, 3) array of surface normals
+        n_in: (N,) array of refractive indices before the interface
+        n_out: (N,) array of refractive indices after the interface
+
+    Returns:
+        (**d_out**, **tir**), as in :func:`~.batchtrace.bend`
+    """
+    d_out = np.empty_like(d_in)
+    tir = np.zeros(len(d_in), dtype=bool)
+    _bend(d_in, normal, np.ascontiguousarray(n_in, dtype=float),
+          np.ascontiguousarray(n_out, dtype=float), d_out, tir)
+    return d_out, tir
+
+
+def reflect(d_in, normal):
+    """ reflect incoming directions, d_in, about normals """
+    d_out = np.empty_like(d_in)
+    _reflect(d_in, normal, d_out)
+    return d_out
+
+
+def intersect(plan, i, p, d, eps, z_dir, max_iter=1000):
+    """ intersect (N, 3) rays p, d with interface **i** of the **plan**
+
+    Returns:
+        (**s**, **p**, **missed**), as in :meth:`~.Interface.intersect_batch`
+    """
+    prf_type = plan.prf_type[i]
+    if prf_type == PrfConic:
+        s = np.empty(len(p))
+        p1 = np.empty_like(p)
+        missed = np.zeros(len(p), dtype=bool)
+        _intersect_conic(p, d, plan.cv[i], plan.cc[i], z_dir, s, p1, missed)
+        return s, p1, missed
+    elif prf_type == PrfEvenPoly:
+        s = np.empty(len(p))
+        p1 = np.empty_like(p)
+        missed = np.zeros(len(p), dtype=bool)
+        num_iter = np.zeros(len(p), dtype=int)
+        profile = plan.ifcs[i].profile
+        s0 = profile.base_conic_seed(p, d, z_dir)
+        _intersect_even_poly(p, d, s0, plan.cv[i], plan.cc[i], plan.coefs[i],
+                             plan.num_coefs[i], eps, max_iter,
+                             s, p1, missed, num_iter)
+        profile.record_iterations(num_iter)
+        return s, p1, missed
+    else:
+        return plan.ifcs[i].intersect_batch(p, d, eps=eps, z_dir=z_dir)
+
+
+def normal(plan, i, p):
+    """ returns the (N, 3) unit normals of interface **i** at points **p** """
+    prf_type = plan.prf_type[i]
+    if prf_type == PrfConic or prf_type == PrfEvenPoly:
+        nrml = np.empty_like(p)
+        _normal(p, prf_type, plan.cv[i], plan.cc[i], plan.coefs[i],
+                plan.num_coefs[i], nrml)
+        return nrml
+    else:
+        return plan.ifcs[i].normal_batch(p)
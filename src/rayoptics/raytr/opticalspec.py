@@ -12,7 +12,7 @@ import math
 import numpy as np
 
 from rayoptics.parax.firstorder import compute_first_order, list_parax_trace
-from rayoptics.raytr.trace import aim_chief_ray
+from rayoptics.raytr.trace import aim_chief_rays
 from rayoptics.optical import model_enums
 import rayoptics.optical.model_constants as mc
 from opticalglass.spectral_lines import get_wavelength
@@ -88,8 +88,9 @@ class OpticalSpecs:
 
         self.parax_data = compute_first_order(self.opt_model, stop, wvl)
         if self.do_aiming and self.opt_model.seq_model.get_num_surfaces() > 2:
-            for i, fld in enumerate(self.field_of_view.fields):
-                aim_pt = aim_chief_ray(self.opt_model, fld, wvl)
+            flds = self.field_of_view.fields
+            aim_pts = aim_chief_rays(self.opt_model, flds, wvl)
+            for fld, aim_pt in zip(flds, aim_pts):
                 fld.aim_pt = aim_pt
 
     def lookup_fld_wvl_focus(self, fi, wl=None, fr=0.0):
@@ -458,7 +459,7 @@ class Field:
         self.ref_sphere = None
 
     def apply_vignetting(self, pupil):
-        vig_pupil = pupil[:]
+        vig_pupil = np.array(pupil, dtype=float)
         if pupil[0] < 0.0:
             if self.vlx != 0.0:
                 vig_pupil[0] *= (1.0 - self.vlx)
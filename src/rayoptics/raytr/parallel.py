@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright © 2026 Michael J. Hayford
+""" Support for tracing large sets of rays using a pool of processes
+
+    The ray list and grid functions in :mod:`~.analyses` and :mod:`~.trace`
+    accept an optional **executor** keyword argument. If given, the rays are
+    split into chunks that are traced in parallel by the executor, typically a
+    :class:`concurrent.futures.ProcessPoolExecutor`. The results are
+    reassembled in the order of the input rays.
+
+    A :class:`ModelPoolExecutor` sends the optical model to each of its
+    worker processes once, when the worker starts, and the chunks of the jobs
+    for that model carry only the rays. With any other executor, the model is
+    pickled once per job, but the pickled model is sent with every chunk;
+    each worker process unpickles it the first time it receives a chunk of
+    the job and reuses it for the remaining chunks.
+
+    Functions and filters passed to the workers must be picklable, i.e.
+    defined at module level rather than lambdas or nested functions.
+
+.. Created on Sun Oct 18 04:44:10 2026
+
+.. codeauthor: Michael J. Hayford
+"""
+
+import math
+import os
+import pickle
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+# the optical model for the current job in a worker process
+_job_models = {}
+
+# the optical model sent to a worker process of a ModelPoolExecutor
+_worker_model = None
+
+
+def _init_worker(model_bytes):
+    global _worker_model
+    _worker_model = pickle.loads(model_bytes)
+
+
+def _model_for_job(job_id, model_bytes):
+    """ returns the model for **job_id**, unpickling it on first use """
+    opt_model = _job_models.get(job_id)
+    if opt_model is None:
+        opt_model = pickle.loads(model_bytes)
+        _job_models.clear()
+        _job_models[job_id] = opt_model
+    return opt_model
+
+
+def _trace_chunk(job_id, model_bytes, fct, chunk, args, kwargs):
+    opt_model = _model_for_job(job_id, model_bytes)
+    return fct(opt_model, chunk, *args, **kwargs)
+
+
+def _trace_chunk_with_worker_model(fct, chunk, args, kwargs):
+    return fct(_worker_model, chunk, *args, **kwargs)
+
+
+class ModelPoolExecutor(ProcessPoolExecutor):
+    """ A process pool whose workers each receive an optical model once
+
+    The model is pickled when the pool is created and unpickled by each
+    worker process when it starts. :func:`map_chunks` then sends only the
+    chunks of rays for the jobs on **opt_model**.
+
+    The workers trace the model as it was when the pool was created; create
+    a new pool after changing the model.
+
+    Attributes:
+        opt_model: the :class:`~.OpticalModel` sent to the workers
+    """
+
+    def __init__(self, opt_model, max_workers=None, **kwargs):
+        self.opt_model = opt_model
+        super().__init__(max_workers=max_workers, initializer=_init_worker,
+                         initargs=(pickle.dumps(opt_model),), **kwargs)
+
+
+def default_chunksize(executor, num_items):
+    """ returns a chunk size giving about 4 chunks per worker """
+    num_workers = getattr(executor, '_max_workers', None) or os.cpu_count()
+    return max(1, math.ceil(num_items/(4*num_workers)))
+
+
+def map_chunks(executor, fct, opt_model, items, *args, chunksize=None,
+               **kwargs):
+    """ apply fct to chunks of **items** in parallel, preserving order
+
+    If **executor** is a :class:`ModelPoolExecutor` created for
+    **opt_model**, the workers use the model they received at start up;
+    otherwise the pickled model is sent with each chunk.
+
+    Args:
+        executor: a :class:`concurrent.futures.Executor`
+        fct: a module level function, fct(opt_model, chunk, \\*args,
+             \\*\\*kwargs), that returns a list with an entry for each item
+             in chunk
+        opt_model: the :class:`~.OpticalModel` passed to fct
+        items: list of items to be divided into chunks
+        chunksize: the number of items in each chunk. If None, a chunk size
+                   giving about 4 chunks per worker is used.
+
+    Returns:
+        list of the results for all of the items, in the order of **items**
+    """
+    items = list(items)
+    if len(items) == 0:
+        return []
+    if chunksize is None:
+        chunksize = default_chunksize(executor, len(items))
+
+    chunks = [items[i:i+chunksize] for i in range(0, len(items), chunksize)]
+    if (isinstance(executor, ModelPoolExecutor) and
+            executor.opt_model is opt_model):
+        futures = [executor.submit(_trace_chunk_with_worker_model, fct,
+                                   chunk, args, kwargs)
+                   for chunk in chunks]
+    else:
+        job_id = uuid.uuid4().hex
+        model_bytes = pickle.dumps(opt_model)
+        futures = [executor.submit(_trace_chunk, job_id, model_bytes, fct,
+                                   chunk, args, kwargs)
+                   for chunk in chunks]
+
+    results = []
+    for future in futures:
+        results.extend(future.result())
+    return results
@@ -17,7 +17,9 @@ from rayoptics.elem.transform import (transform_before_surface,
                                       transform_after_surface)
 from rayoptics.optical.model_constants import Intfc, Gap, Indx, Tfrm, Zdir
 from .traceerror import (TraceMissedSurfaceError, TraceTIRError,
-                         TraceEvanescentRayError)
+                         TraceEvanescentRayError, TraceRayBlockedError,
+                         TraceStatus)
+from .traceplan import TracePlan, Reflect, Refract, Phase
 
 
 def bend(d_in, normal, n_in, n_out):
@@ -42,10 +44,10 @@ def reflect(d_in, normal):
     return d_out
 
 
-def phase(ifc, inc_pt, d_in, normal, wvl, n_in, n_out):
+def phase(ifc, inc_pt, d_in, normal, wvl, n_in, n_out, reverse=False):
     """ apply phase shift to incoming direction, d_in, about normal """
     try:
-        d_out, dW = ifc.phase(inc_pt, d_in, normal, wvl)
+        d_out, dW = ifc.phase(inc_pt, d_in, normal, wvl, reverse=reverse)
         return d_out, dW
     except ValueError:
         raise TraceEvanescentRayError(ifc, inc_pt, d_in, normal, n_in, n_out)
@@ -60,6 +62,12 @@ def trace(seq_model, pt0, dir0, wvl, **kwargs):
         dir0: starting direction cosines in coords of first interface
         wvl: wavelength in nm
         eps: accuracy tolerance for surface intersection calculation
+        raise_errors: if False, return the ray status instead of raising a
+                      :class:`~.TraceError`; see :func:`trace_raw`
+        endpoint_only: if True, only the last ray segment is returned; see
+                       :func:`trace_raw`
+        check_apertures: if True, rays outside the clear apertures of a
+                         surface are blocked; see :func:`trace_raw`
 
     Returns:
         (**ray**, **op_delta**, **wvl**)
@@ -77,24 +85,35 @@ def trace(seq_model, pt0, dir0, wvl, **kwargs):
           optical axis
         - **wvl** - wavelength (in nm) that the ray was traced in
     """
-    path = seq_model.path(wvl)
+    plan = seq_model.trace_plan(wvl)
     kwargs['first_surf'] = kwargs.get('first_surf', 1)
     kwargs['last_surf'] = kwargs.get('last_surf',
                                      seq_model.get_num_surfaces()-2)
-    return trace_raw(path, pt0, dir0, wvl, **kwargs)
+    return trace_raw(plan, pt0, dir0, wvl, **kwargs)
 
 
 def trace_raw(path, pt0, dir0, wvl, eps=1.0e-12, **kwargs):
     """ fundamental raytrace function
 
     Args:
-        path: an iterator containing interfaces and gaps to be traced.
-              for each iteration, the sequence or generator should return a
-              list containing: **Intfc, Gap, Trfm, Index, Z_Dir**
+        path: a :class:`~.TracePlan` or an iterator containing interfaces and
+              gaps to be traced. for each iteration, the sequence or generator
+              should return a list containing: **Intfc, Gap, Trfm, Index,
+              Z_Dir**
         pt0: starting point in coords of first interface
         dir0: starting direction cosines in coords of first interface
         wvl: wavelength in nm
         eps: accuracy tolerance for surface intersection calculation
+        raise_errors: if True (the default), a ray failure raises a
+                      :class:`~.TraceError`. If False, the status of the ray
+                      is returned instead.
+        endpoint_only: if True, the ray segments aren't saved as the ray is
+                       traced; **ray** contains only the last segment.
+        check_apertures: if True, a ray that intersects an interface outside
+                         its clear apertures is blocked, raising a
+                         :class:`~.TraceRayBlockedError`
+        print_details: if True, print the intersection point, direction and
+                       equally inclined chord data at each interface
 
     Returns:
         (**ray**, **op_delta**, **wvl**)
@@ -110,11 +129,23 @@ def trace_raw(path, pt0, dir0, wvl, eps=1.0e-12, **kwargs):
         - **op_delta** - optical path wrt equally inclined chords to the
           optical axis
         - **wvl** - wavelength (in nm) that the ray was traced in
+
+        If raise_errors is False, (**ray**, **op_delta**, **wvl**,
+        **status**, **surf**) is returned.
+
+        - **status** - the :class:`~.TraceStatus` of the ray
+        - **surf** - the index of the interface where the ray failed, or
+          None if the ray was traced successfully
+
+        The **ray** of a failed ray stops at the failing interface, as in
+        the exception that would have been raised, and **op_delta** is None.
     """
     ray = []
-    eic = []
 
     print_details = kwargs.get('print_details', False)
+    raise_errors = kwargs.get('raise_errors', True)
+    endpoint_only = kwargs.get('endpoint_only', False)
+    check_apertures = kwargs.get('check_apertures', False)
 
     first_surf = kwargs.get('first_surf', 0)
     last_surf = kwargs.get('last_surf', None)
@@ -129,6 +160,9 @@ def trace_raw(path, pt0, dir0, wvl, eps=1.0e-12, **kwargs):
         else:
             return s <= last_surf if include_last_surf else s < last_surf
 
+    plan = path if isinstance(path, TracePlan) else TracePlan(path, wvl)
+    path = iter(plan)
+
     # trace object surface
     obj = next(path)
     srf_obj = obj[Intfc]
@@ -143,7 +177,6 @@ def trace_raw(path, pt0, dir0, wvl, eps=1.0e-12, **kwargs):
 
     op_delta = 0.0
     opl = 0.0
-    opl_eic = 0.0
     surf = 0
     # loop of remaining surfaces in path
     while True:
@@ -163,18 +196,27 @@ def trace_raw(path, pt0, dir0, wvl, eps=1.0e-12, **kwargs):
             pp_dst_intrsct, inc_pt = ifc.intersect(pp_pt_before, b4_dir,
                                                    eps=eps, z_dir=z_dir_before)
             dst_b4 = pp_dst + pp_dst_intrsct
-            ray.append([before_pt, before_dir, dst_b4, before_normal])
+            if not endpoint_only:
+                ray.append([before_pt, before_dir, dst_b4, before_normal])
 
             if in_surface_range(surf):
                 opl += before[Indx] * dst_b4
 
             normal = ifc.normal(inc_pt)
 
-            eic_dst_before = eic_distance_from_axis((inc_pt, b4_dir),
-                                                    z_dir_before)
+            if check_apertures and not ifc.point_inside(inc_pt[0],
+                                                        inc_pt[1]):
+                raise TraceRayBlockedError(ifc, inc_pt, b4_dir,
+                                           before[Indx], after[Indx])
+
+            if print_details:
+                eic_dst_before = eic_distance_from_axis((inc_pt, b4_dir),
+                                                        z_dir_before)
+
+            op_code = plan.opcode[surf+1]
 
             # if the interface has a phase element, process that first
-            if hasattr(ifc, 'phase_element'):
+            if op_code & Phase:
                 doe_dir, phs = phase(ifc, inc_pt, b4_dir, normal, wvl,
                                      before[Indx], after[Indx])
                 # the output of the phase element becomes the input for the
@@ -183,30 +225,25 @@ def trace_raw(path, pt0, dir0, wvl, eps=1.0e-12, **kwargs):
                 op_delta += phs
 
             # refract or reflect ray at interface
-            if ifc.interact_mode == 'reflect':
+            if op_code & Reflect:
                 after_dir = reflect(b4_dir, normal)
-            elif ifc.interact_mode == 'transmit':
+            elif op_code & Refract:
                 after_dir = bend(b4_dir, normal, before[Indx], after[Indx])
             else:  # no action, input becomes output
                 after_dir = b4_dir
 
-            eic_dst_after = eic_distance_from_axis((inc_pt, after_dir),
-                                                   z_dir_after)
-
             surf += 1
 
-            # Per `Hopkins, 1981 <https://dx.doi.org/10.1080/713820605>`_, the
-            #  propagation direction is given by the direction cosines of the
-            #  ray and therefore doesn't require the use of a negated
-            #  refractive index following a reflection. Thus we use the
-            #  (positive) refractive indices from the seq_model.rndx array.
-            dW = after[Indx]*eic_dst_after - before[Indx]*eic_dst_before
-            eic.append([before[Indx], eic_dst_before,
-                        after[Indx], eic_dst_after, dW])
-            if in_surface_range(surf, include_last_surf=True):
-                opl_eic += dW
-
             if print_details:
+                eic_dst_after = eic_distance_from_axis((inc_pt, after_dir),
+                                                       z_dir_after)
+                # Per `Hopkins, 1981 <https://dx.doi.org/10.1080/713820605>`_,
+                #  the propagation direction is given by the direction
+                #  cosines of the ray and therefore doesn't require the use
+                #  of a negated refractive index following a reflection.
+                #  Thus we use the (positive) refractive indices from the
+                #  seq_model.rndx array.
+                dW = after[Indx]*eic_dst_after - before[Indx]*eic_dst_before
                 print("after:", surf, inc_pt, after_dir)
                 print("e{}= {:12.5g} e{}'= {:12.5g} dW={:10.8g} n={:8.5g}"
                       " n'={:8.5g} zdb4={:2.0f} zdaft={:2.0f}"
@@ -227,7 +264,9 @@ def trace_raw(path, pt0, dir0, wvl, eps=1.0e-12, **kwargs):
             ray_miss.ifc = ifc
             ray_miss.prev_tfrm = before[Tfrm]
             ray_miss.ray = ray
-            raise ray_miss
+            if raise_errors:
+                raise ray_miss
+            return ray, None, wvl, ray_miss.status, ray_miss.surf
 
         except TraceTIRError as ray_tir:
             ray.append([inc_pt, before_dir, 0.0, normal])
@@ -235,7 +274,17 @@ def trace_raw(path, pt0, dir0, wvl, eps=1.0e-12, **kwargs):
             ray_tir.ifc = ifc
             ray_tir.int_pt = inc_pt
             ray_tir.ray = ray
-            raise ray_tir
+            if raise_errors:
+                raise ray_tir
+            return ray, None, wvl, ray_tir.status, ray_tir.surf
+
+        except TraceRayBlockedError as ray_blk:
+            ray.append([inc_pt, before_dir, 0.0, normal])
+            ray_blk.surf = surf+1
+            ray_blk.ray = ray
+            if raise_errors:
+                raise ray_blk
+            return ray, None, wvl, ray_blk.status, ray_blk.surf
 
         except TraceEvanescentRayError as ray_evn:
             ray.append([inc_pt, before_dir, 0.0, normal])
@@ -243,14 +292,19 @@ def trace_raw(path, pt0, dir0, wvl, eps=1.0e-12, **kwargs):
             ray_evn.ifc = ifc
             ray_evn.int_pt = inc_pt
             ray_evn.ray = ray
-            raise ray_evn
+            if raise_errors:
+                raise ray_evn
+            return ray, None, wvl, ray_evn.status, ray_evn.surf
 
         except StopIteration:
             ray.append([inc_pt, after_dir, 0.0, normal])
             op_delta += opl
             break
 
-    return ray, op_delta, wvl
+    if raise_errors:
+        return ray, op_delta, wvl
+    else:
+        return ray, op_delta, wvl, TraceStatus.OK, None
 
 
 def calc_path_length(eic, offset=0):
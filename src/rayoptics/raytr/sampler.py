@@ -12,7 +12,7 @@ import math
 import numpy as np
 
 
-def grid_ray_generator(grid_rng):
+def grid_ray_generator(grid_rng, dtype=float):
     """Generator function to produce a 2d square regular grid.
 
     arguments:
@@ -20,6 +20,8 @@ def grid_ray_generator(grid_rng):
         start: 2d numpy array of lower left grid coords
         stop: 2d numpy array of upper right grid coords
         num: the number of samples along each axis
+        dtype: float type of the samples, e.g. np.float32 for use with a
+               reduced precision batch trace
 
     A sample input might be:
         grid_start = np.array([-1., -1.])
@@ -28,8 +30,8 @@ def grid_ray_generator(grid_rng):
 
     """
     start, stop, num = grid_rng
-    sample_pt = np.array(start)
-    step = np.array((stop - start)/(num - 1))
+    sample_pt = np.array(start, dtype=dtype)
+    step = np.array((stop - start)/(num - 1), dtype=dtype)
     for i in range(num):
         for j in range(num):
             yield np.array(sample_pt)
@@ -39,7 +41,7 @@ def grid_ray_generator(grid_rng):
         sample_pt[1] = start[1]
 
 
-def csd_grid_ray_generator(grid_rng):
+def csd_grid_ray_generator(grid_rng, dtype=float):
     start = np.array(grid_rng[0])
     stop = grid_rng[1]
     num = grid_rng[2]
@@ -47,21 +49,21 @@ def csd_grid_ray_generator(grid_rng):
     for i in range(num):
         for j in range(num):
             xy = concentric_sample_disk(start, offset=False)
-            yield xy
+            yield np.asarray(xy, dtype=dtype)
             start[1] += step[1]
 
         start[0] += step[0]
         start[1] = grid_rng[0][1]
 
 
-def polar_grid_ray_generator(grid_rng):
+def polar_grid_ray_generator(grid_rng, dtype=float):
     start = np.array(grid_rng[0])
     stop = grid_rng[1]
     num = grid_rng[2]
     step = np.array((stop - start)/(num - 1))
     for i in range(num):
         for j in range(num):
-            yield np.array(start)
+            yield np.array(start, dtype=dtype)
             start[1] += step[1]
 
         start[0] += step[0]
@@ -79,12 +81,22 @@ def phi(d):
     return x
 
 
-def R_2_quasi_random_generator(n):
+def R_2_quasi_random_generator(n, dtype=float):
     """A 2d sequence based on a R**2 quasi-random sequence
 
     See `The Unreasonable Effectiveness of Quasirandom Sequences 
     <http://extremelearning.com.au/unreasonable-effectiveness-of-quasirandom-sequences/ >`
     """
+    for z in R_2_quasi_random(n, dtype=dtype):
+        yield z
+
+
+def R_2_quasi_random(n, dtype=float):
+    """Returns an (n, 2) array of the R**2 quasi-random sequence
+
+    The sequence is computed in float64 and then converted to **dtype**, so
+    that a float32 sequence doesn't accumulate rounding errors.
+    """
     d = 2
     g = phi(d)
     alpha = np.zeros(d)
@@ -96,10 +108,9 @@ def R_2_quasi_random_generator(n):
     # But seed = 0.5 is generally better.
     seed = 0.5
 
-    z = np.zeros((n, d))
-    for i in range(n):
-        z[i] = (seed + alpha*(i+1)) % 1
-        yield z[i]
+    i = np.arange(1, n+1)[:, np.newaxis]
+    z = (seed + alpha*i) % 1
+    return z.astype(dtype)
 
 
 def concentric_sample_disk(u, offset=True):
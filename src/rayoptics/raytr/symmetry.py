@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright © 2026 Michael J. Hayford
+""" Detection and use of the symmetry of a model for pupil sampling
+
+    Many optical systems are rotationally symmetric, or at least symmetric
+    about the YZ plane, e.g. systems folded or tilted about the x axis. For a
+    field point on the plane of symmetry, the rays through the pupil points
+    (px, py) and (-px, py) are mirror images of each other; on axis in a
+    rotationally symmetric system, all of the rays at the same pupil radius
+    are rotated copies of a single ray.
+
+    The grid and list analyses use this to trace only the unique half or
+    quadrant of the pupil, or a single radial fan on axis.
+    :func:`unique_pupils` reduces a list of pupil points to the unique ones,
+    and :func:`expand_ray_batch` mirrors or rotates the traced rays back to
+    the full list.
+
+    The symmetry of a model is one of :data:`NoSymmetry`, :data:`Bilateral`
+    (symmetric about the YZ plane), :data:`Biaxial` (symmetric about the YZ
+    and XZ planes, e.g. toroids) or :data:`Rotational`. The requirements
+    are checked by :func:`model_symmetry` and :func:`field_symmetry`.
+
+.. Created on Sun Oct 18 05:26:54 2026
+
+.. codeauthor: Michael J. Hayford
+"""
+
+import numpy as np
+
+from rayoptics.elem.profiles import (Spherical, Conic, EvenPolynomial,
+                                     RadialPolynomial, YToroid, XToroid)
+from rayoptics.oprops.doe import DiffractiveElement, radial_phase_fct
+
+# model symmetry, in increasing order of symmetry
+NoSymmetry = 0
+Bilateral = 1
+Biaxial = 2
+Rotational = 3
+
+# profiles that are rotationally symmetric, or symmetric about the YZ and XZ
+# planes
+rotational_profiles = (Spherical, Conic, EvenPolynomial, RadialPolynomial)
+biaxial_profiles = rotational_profiles + (YToroid, XToroid)
+
+
+def interface_symmetry(ifc):
+    """ returns the symmetry of the interface **ifc** about its local z axis
+    """
+    symmetry = Rotational
+
+    dec = getattr(ifc, 'decenter', None)
+    if dec is not None:
+        if dec.dec[0] != 0.0 or dec.euler[1] != 0.0 or dec.euler[2] != 0.0:
+            return NoSymmetry
+        if dec.dec[1] != 0.0 or dec.euler[0] != 0.0:
+            symmetry = Bilateral
+
+    profile = getattr(ifc, 'profile', None)
+    if profile is not None:
+        if type(profile) not in biaxial_profiles:
+            return NoSymmetry
+        if type(profile) not in rotational_profiles:
+            symmetry = min(symmetry, Biaxial)
+
+    phase_element = getattr(ifc, 'phase_element', None)
+    if phase_element is not None:
+        if not (isinstance(phase_element, DiffractiveElement) and
+                phase_element.phase_fct is radial_phase_fct):
+            return NoSymmetry
+
+    return symmetry
+
+
+def model_symmetry(seq_model):
+    """ returns the symmetry of the sequential model """
+    return min((interface_symmetry(ifc) for ifc in seq_model.ifcs),
+               default=Rotational)
+
+
+def field_symmetry(opt_model, fld):
+    """ returns the symmetry of the rays traced from **fld**
+
+    The field point must lie on the plane of symmetry of the model, with
+    the aim point and vignetting also symmetric: x = 0 for
+    :data:`Bilateral`, and on axis for :data:`Biaxial` and
+    :data:`Rotational` symmetry.
+    """
+    symmetry = model_symmetry(opt_model.seq_model)
+    aim_pt = getattr(fld, 'aim_pt', None)
+    if aim_pt is None:
+        aim_pt = np.array([0., 0.])
+
+    if symmetry == Rotational and fld.vux != fld.vuy:
+        symmetry = Biaxial
+    if symmetry >= Biaxial:
+        if (fld.x != 0.0 or fld.y != 0.0 or np.any(aim_pt != 0.0) or
+                fld.vux != fld.vlx or fld.vuy != fld.vly):
+            symmetry = Bilateral
+    if symmetry == Bilateral:
+        if fld.x != 0.0 or aim_pt[0] != 0.0 or fld.vux != fld.vlx:
+            symmetry = NoSymmetry
+    return symmetry
+
+
+def unique_pupils(pupils, symmetry):
+    """ reduce the (N, 2) array **pupils** to the unique pupil points
+
+    Args:
+        pupils: (N, 2) array of relative pupil coordinates
+        symmetry: the symmetry of the traced rays, see
+                  :func:`field_symmetry`
+
+    Returns:
+        (**unique**, **index**, **xfrm**)
+
+        - **unique** - (M, 2) array of the unique pupil points. These are
+          (abs(px), py) for bilateral symmetry, (abs(px), abs(py)) for
+          biaxial symmetry and (0, r) for rotational symmetry.
+        - **index** - (N,) index of the unique pupil for each pupil point
+        - **xfrm** - (N, 2, 2) array of the rotation or reflection taking
+          the x, y coordinates of the unique ray to those of each pupil
+          point, or None if there is no symmetry
+    """
+    pupils = np.asarray(pupils, dtype=float).reshape(-1, 2)
+    if symmetry == NoSymmetry:
+        return pupils, np.arange(len(pupils)), None
+
+    xfrm = np.zeros((len(pupils), 2, 2))
+    if symmetry == Bilateral:
+        mirror = pupils[:, 0] < 0.0
+        canonical = np.stack([np.abs(pupils[:, 0]), pupils[:, 1]], axis=1)
+        xfrm[:, 0, 0] = np.where(mirror, -1.0, 1.0)
+        xfrm[:, 1, 1] = 1.0
+    elif symmetry == Biaxial:
+        canonical = np.abs(pupils)
+        xfrm[:, 0, 0] = np.where(pupils[:, 0] < 0.0, -1.0, 1.0)
+        xfrm[:, 1, 1] = np.where(pupils[:, 1] < 0.0, -1.0, 1.0)
+    else:
+        r = np.hypot(pupils[:, 0], pupils[:, 1])
+        canonical = np.stack([np.zeros_like(r), r], axis=1)
+        # rotation about z taking (0, r) to (px, py)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cos_t = np.where(r > 0.0, pupils[:, 1]/r, 1.0)
+            sin_t = np.where(r > 0.0, -pupils[:, 0]/r, 0.0)
+        xfrm[:, 0, 0] = cos_t
+        xfrm[:, 0, 1] = -sin_t
+        xfrm[:, 1, 0] = sin_t
+        xfrm[:, 1, 1] = cos_t
+
+    # pupil grids symmetric about 0 match only to within roundoff
+    key = np.round(canonical, decimals=12)
+    _, first, index = np.unique(key, axis=0, return_index=True,
+                                return_inverse=True)
+    return canonical[first], index.reshape(-1), xfrm
+
+
+def expand_ray_batch(ray_batch, index, xfrm):
+    """ returns a :class:`~.RayBatch` of the rays for the full pupil list
+
+    Args:
+        ray_batch: the rays traced for the unique pupil points
+        index: (N,) index of the unique ray for each pupil point
+        xfrm: (N, 2, 2) transforms of the x, y components of the unique rays
+
+    The arguments **index** and **xfrm** are returned by
+    :func:`unique_pupils`. The optical path, distances and trace status of
+    each ray are those of its unique ray.
+    """
+    if xfrm is None:
+        return ray_batch
+    rb = ray_batch.take(index)
+    r = xfrm[..., np.newaxis]
+    for vec in (rb.p, rb.d, rb.nrml):
+        x = vec[..., 0].copy()
+        y = vec[..., 1].copy()
+        vec[..., 0] = r[:, 0, 0]*x + r[:, 0, 1]*y
+        vec[..., 1] = r[:, 1, 0]*x + r[:, 1, 1]*y
+    return rb
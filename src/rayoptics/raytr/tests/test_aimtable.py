@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright © 2026 Michael J. Hayford
+"""Test interpolated aim points against aiming the chief ray
+
+.. Created on Sun Oct 18 04:57:01 2026
+
+.. codeauthor: Michael J. Hayford
+"""
+
+
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+import rayoptics.optical.model_constants as mc
+from rayoptics.gui.appcmds import open_model
+from rayoptics.raytr import trace
+from rayoptics.raytr.aimtable import AimPointTable
+from rayoptics.raytr.opticalspec import Field
+
+
+class AimPointTableTestCase(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        root_pth = Path(ro.__file__).resolve().parent
+        self.opm = open_model(root_pth/'codev/tests/threemir.seq')
+
+    def test_grid_nodes(self):
+        table = AimPointTable(self.opm, num_pts=5)
+        self.assertEqual(table.aim_pts.shape, (5, 5, 2))
+        aim_pt, error = table.aim_pt(table.x[1], table.y[3])
+        npt.assert_allclose(aim_pt, table.aim_pts[3, 1], atol=1e-9)
+        npt.assert_allclose(error, 0., atol=1e-9)
+
+    def test_interpolation(self):
+        table = AimPointTable(self.opm, num_pts=11)
+        sm = self.opm.seq_model
+        max_field = table.x[-1]
+        xy = np.array([[0.13, -0.41], [-0.57, 0.22], [0.6, 0.65]])*max_field
+        aim_pts, errors = table.aim_pt(xy[:, 0], xy[:, 1])
+        self.assertEqual(aim_pts.shape, (3, 2))
+        for (x, y), aim_pt, error in zip(xy, aim_pts, errors):
+            true_aim_pt = trace.aim_chief_ray(self.opm, Field(x=x, y=y))
+            self.assertTrue(np.all(np.abs(aim_pt - true_aim_pt) <=
+                                   error + 1e-6))
+            fld = table.field(x, y)
+            npt.assert_array_equal(fld.aim_pt, aim_pt)
+            ray, _, _ = trace.trace_base(self.opm, [0., 0.], fld, table.wvl)
+            npt.assert_allclose(ray[sm.stop_surface][mc.p][:2], 0.,
+                                atol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
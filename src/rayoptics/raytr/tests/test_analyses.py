@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright © 2026 Michael J. Hayford
+"""Test the array based refocus of ray lists and grids against per ray calcs
+
+.. Created on Sun Oct 18 05:37:28 2026
+
+.. codeauthor: Michael J. Hayford
+"""
+
+
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.raytr import analyses
+
+
+class WavefrontTestCase(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        self.root_pth = Path(ro.__file__).resolve().parent
+
+    def compare_wavefronts(self, opm, num_rays=9):
+        osp = opm.optical_spec
+        fod = osp.parax_data.fod
+        wvl = opm.seq_model.central_wavelength()
+        convert_to_opd = 1/opm.nm_to_sys_units(osp.spectral_region.central_wvl)
+        grid_rng = [np.array([-1., -1.]), np.array([1., 1.]), num_rays]
+        for fld in osp.field_of_view.fields:
+            grid_pkg = analyses.trace_wavefront(opm, fld, wvl, 0.,
+                                                num_rays=num_rays)
+            grid = analyses.trace_ray_grid(opm, grid_rng, fld, wvl, 0.,
+                                           use_symmetry=False)
+            cr_pkg = analyses.get_chief_ray_pkg(opm, fld, wvl, 0.)
+            for foc in (0., 0.05, -0.2):
+                opd = analyses.focus_wavefront(opm, grid_pkg, fld, wvl, foc)
+                ref_sphere = analyses.setup_exit_pupil_coords(opm, fld, wvl,
+                                                              foc, cr_pkg)
+                for row, opd_row in zip(grid, opd):
+                    for (px, py, ray_pkg), opd_ij in zip(row, opd_row):
+                        npt.assert_allclose(opd_ij[:2], [px, py], atol=1e-15)
+                        if ray_pkg is None:
+                            self.assertTrue(np.isnan(opd_ij[2]))
+                        else:
+                            opd_full = analyses.wave_abr_full_calc(
+                                fod, fld, wvl, foc, ray_pkg, cr_pkg,
+                                ref_sphere)
+                            self.assertAlmostEqual(opd_ij[2],
+                                                   convert_to_opd*opd_full,
+                                                   places=8)
+
+    def test_dblgauss(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        self.compare_wavefronts(opm)
+
+    def test_folded_lenses(self):
+        opm = open_model(self.root_pth/'codev/tests/folded_lenses.seq')
+        self.compare_wavefronts(opm)
+
+
+class TransverseAbrTestCase(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        root_pth = Path(ro.__file__).resolve().parent
+        self.opm = open_model(root_pth/'codev/tests/ag_dblgauss.seq')
+
+    def test_focus_cube(self):
+        osp = self.opm.optical_spec
+        fld = osp.field_of_view.fields[-1]
+        wvl = self.opm.seq_model.central_wavelength()
+        focs = np.array([-0.2, 0., 0.05])
+        pupils = [np.array([x, y]) for x in np.linspace(-1., 1., 7)
+                  for y in np.linspace(-1., 1., 7)]
+        ray_end_pkg = analyses.trace_pupil_coords(self.opm, pupils,
+                                                  fld, wvl, 0.)
+        cube = analyses.focus_pupil_coords(self.opm, ray_end_pkg,
+                                           fld, wvl, focs)
+        ray_list = analyses.trace_ray_list(self.opm, pupils, fld, wvl, 0.,
+                                           use_symmetry=False)
+        self.assertEqual(cube.shape, (len(focs), len(ray_list), 2))
+        for foc, t_abr in zip(focs, cube):
+            image_pt = analyses.Ray(self.opm, [0., 0.], f=fld, wl=wvl,
+                                    foc=foc).t_abr
+            for (px, py, ray_pkg), t_abr_i in zip(ray_list, t_abr):
+                if ray_pkg is None:
+                    self.assertTrue(np.all(np.isnan(t_abr_i)))
+                else:
+                    seg = ray_pkg[0][-1]
+                    defocused_pt = seg.p - (foc/seg.d[2])*seg.d
+                    npt.assert_allclose(t_abr_i, defocused_pt[:2] - image_pt,
+                                        rtol=0, atol=1e-12)
+
+    def test_ray_list_focus_array(self):
+        focs = np.array([-0.2, 0., 0.05])
+        ray_list = analyses.RayList(self.opm, num_rays=7, f=2, foc=focs)
+        self.assertEqual(ray_list.ray_abr.shape[:2], (2, len(focs)))
+        for k, foc in enumerate(focs):
+            ray_list_k = analyses.RayList(self.opm, num_rays=7, f=2, foc=foc)
+            npt.assert_allclose(ray_list.ray_abr[:, k], ray_list_k.ray_abr,
+                                rtol=0, atol=1e-12)
+
+    def test_ray_fan_focus_array(self):
+        focs = np.array([-0.2, 0., 0.05])
+        fan = analyses.RayFan(self.opm, f=2, foc=focs, num_rays=11)
+        self.assertEqual(len(fan.fan), len(focs))
+        for fan_k, foc in zip(fan.fan, focs):
+            fan_ref = analyses.RayFan(self.opm, f=2, foc=foc, num_rays=11)
+            self.assertEqual([p for p, _ in fan_k],
+                             [p for p, _ in fan_ref.fan])
+            npt.assert_allclose([data for _, data in fan_k],
+                                [data for _, data in fan_ref.fan],
+                                rtol=0, atol=1e-12)
+
+
+class PSFTestCase(unittest.TestCase):
+    def test_calc_psf(self):
+        ndim, maxdim = 16, 64
+        x = np.linspace(-1., 1., ndim)
+        xx, yy = np.meshgrid(x, x, indexing='ij')
+        inside = xx**2 + yy**2 < 1.0
+        # perfect wavefront with a no data hole, zero opd is in the pupil
+        wavefront = np.where(inside, 0., np.NaN)
+        wavefront[ndim//2, ndim//2] = np.NaN
+        pupil = np.zeros((maxdim, maxdim), dtype=complex)
+        start = maxdim//2 - (ndim//2 - 1)
+        pupil[start:start+ndim, start:start+ndim] = np.isfinite(wavefront)
+        psf = np.abs(np.fft.fftshift(np.fft.fft2(np.fft.fftshift(pupil))))**2
+        for i in range(2):  # the 2nd call reuses the work buffer
+            AP = analyses.calc_psf(wavefront, ndim, maxdim)
+            npt.assert_allclose(AP, psf/psf.max(), rtol=0, atol=1e-12)
+        self.assertEqual(np.argmax(AP), maxdim//2*maxdim + maxdim//2)
+
+    def test_calc_psf_mft(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        root_pth = Path(ro.__file__).resolve().parent
+        opm = open_model(root_pth/'codev/tests/ag_dblgauss.seq')
+        ndim, maxdim, npix = 32, 128, 31
+        pupil_grid = analyses.RayGrid(opm, f=1, num_rays=ndim)
+        AP = analyses.calc_psf(pupil_grid.grid[2], ndim, maxdim)
+        delta_x, delta_xp = analyses.calc_psf_scaling(pupil_grid, ndim,
+                                                      maxdim)
+        # the odd window is centered on the FFT sample of the image point
+        AP_mft = analyses.calc_psf_mft(pupil_grid, npix, delta_xp)
+        c = maxdim//2
+        AP_fft = AP[c-npix//2:c+npix//2+1, c-npix//2:c+npix//2+1]
+        npt.assert_allclose(AP_mft/AP_mft.max(), AP_fft/AP_fft.max(),
+                            rtol=0, atol=1e-12)
+        self.assertLess(AP_mft.max(), 1.0)
+
+    def test_polychromatic_psf(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        root_pth = Path(ro.__file__).resolve().parent
+        opm = open_model(root_pth/'codev/tests/ag_dblgauss.seq')
+        fld = opm.optical_spec.field_of_view.fields[1]
+        wvls = opm.optical_spec.spectral_region.wavelengths
+        poly = analyses.PolychromaticPSF(opm, 32, 0.001, f=fld)
+        self.assertEqual(sorted(poly.psfs), sorted(wvls))
+        self.assertLess(poly.AP.sum(), 1.0)
+        self.assertGreater(poly.AP.sum(), 0.5)
+        psfs = dict(poly.psfs)
+
+        # reweighting reuses the cached wavelength psfs
+        poly.wts = [0., 1., 0.]
+        poly.update_data(build='update')
+        for wvl in wvls:
+            self.assertIs(poly.psfs[wvl], psfs[wvl])
+
+        # the wavelengths share the image point of the central wavelength
+        cr_pkg = analyses.get_chief_ray_pkg(opm, fld, wvls[1], poly.foc)
+        image_pt_2d = analyses.setup_exit_pupil_coords(opm, fld, wvls[1],
+                                                       poly.foc,
+                                                       cr_pkg)[0][:2]
+        pupil_grid = analyses.RayGrid(opm, f=fld, wl=wvls[1], num_rays=32,
+                                      image_pt_2d=image_pt_2d)
+        AP = analyses.calc_psf_mft(pupil_grid, 32, 0.001, norm='energy')
+        npt.assert_allclose(poly.AP, AP, rtol=0, atol=1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
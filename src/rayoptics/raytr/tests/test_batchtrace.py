@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright © 2026 Michael J. Hayford
+"""Test the batch ray trace against the single ray trace
+
+.. Created on Sun Oct 18 04:21:48 2026
+
+.. codeauthor: Michael J. Hayford
+"""
+
+
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+import rayoptics.optical.model_constants as mc
+from rayoptics.gui.appcmds import open_model
+from rayoptics.raytr import raytrace as rt
+from rayoptics.raytr import batchtrace as bt
+from rayoptics.raytr import trace
+from rayoptics.raytr.opticalspec import Field
+from rayoptics.raytr.traceerror import (TraceError, TraceStatus,
+                                        TraceRayBlockedError)
+
+root_pth = Path(ro.__file__).resolve().parent
+# all of the bundled models, plus an aspheric test model
+model_files = ([str(pth.relative_to(root_pth))
+                for pth in sorted(root_pth.glob('models/*.roa'))] +
+               [str(pth.relative_to(root_pth))
+                for pth in sorted(root_pth.glob('codev/tests/*.seq'))] +
+               ['optical/tests/cell_phone_camera.roa'])
+
+
+def open_test_model(test_case, model_file):
+    """ open **model_file**, skipping models that need an unsupported glass
+
+    The Schott glass catalog installed in some environments lacks the
+    dispersion coefficients, and the models using it can't be opened.
+    """
+    try:
+        return open_model(root_pth/model_file)
+    except AttributeError as err:
+        if "'SchottGlass' object has no attribute 'coefs'" not in str(err):
+            raise
+        test_case.skipTest(f"{model_file}: {err}")
+
+
+def grid_of_start_rays(opm, fld, num_rays=11, pupil_radius=1.):
+    """ returns pt0, dir0 for a square grid of rays over the entrance pupil """
+    osp = opm.optical_spec
+    fod = osp.parax_data.fod
+    aim_pt = fld.aim_pt if fld.aim_pt is not None else np.array([0., 0.])
+    pupil_coords = np.linspace(-pupil_radius, pupil_radius, num_rays)
+    pupil_x, pupil_y = np.meshgrid(pupil_coords, pupil_coords)
+    pt1 = np.stack([fod.enp_radius*pupil_x.ravel() + aim_pt[0],
+                    fod.enp_radius*pupil_y.ravel() + aim_pt[1],
+                    np.full(num_rays**2, fod.obj_dist + fod.enp_dist)],
+                   axis=1)
+    pt0 = np.tile(osp.obj_coords(fld), (len(pt1), 1))
+    dir0 = pt1 - pt0
+    dir0 /= np.linalg.norm(dir0, axis=1)[:, np.newaxis]
+    return pt0, dir0
+
+
+class BatchTraceTestCase(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        self.root_pth = Path(ro.__file__).resolve().parent
+
+    def compare_to_trace(self, opm):
+        sm = opm.seq_model
+        wvl = sm.central_wavelength()
+        # roundoff grows with the size of the system
+        atol = 1e-12*max(1., sum(abs(gap.thi) for gap in sm.gaps[1:]))
+        for fld in opm.optical_spec.field_of_view.fields:
+            pt0, dir0 = grid_of_start_rays(opm, fld, pupil_radius=1.5)
+            ray_batch = bt.trace(sm, pt0, dir0, wvl)
+            for i in range(len(pt0)):
+                ray, op, _, status, surf = rt.trace(sm, pt0[i], dir0[i], wvl,
+                                                    raise_errors=False)
+                self.assertEqual(status, ray_batch.status[i])
+                self.assertEqual(op is not None, ray_batch.valid[i])
+                if status != TraceStatus.OK:
+                    self.assertEqual(surf, ray_batch.fail_surf[i])
+                batch_ray = ray_batch.ray(i)
+                self.assertEqual(len(ray), len(batch_ray))
+                for seg, batch_seg in zip(ray, batch_ray):
+                    for item, batch_item in zip(seg, batch_seg):
+                        npt.assert_allclose(batch_item, item,
+                                            rtol=1e-12, atol=atol)
+                if op is not None:
+                    npt.assert_allclose(ray_batch.op[i], op,
+                                        rtol=1e-12, atol=atol)
+
+    def test_raise_errors(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        sm = opm.seq_model
+        wvl = sm.central_wavelength()
+        fld = opm.optical_spec.field_of_view.fields[-1]
+        pt0, dir0 = grid_of_start_rays(opm, fld, pupil_radius=3.)
+        ray_batch = bt.trace(sm, pt0, dir0, wvl)
+        self.assertTrue(np.any(~ray_batch.valid))
+        i = np.flatnonzero(~ray_batch.valid)[0]
+        with self.assertRaises(TraceError) as cm:
+            rt.trace(sm, pt0[i], dir0[i], wvl)
+        self.assertEqual(cm.exception.status, ray_batch.status[i])
+        self.assertEqual(cm.exception.surf, ray_batch.fail_surf[i])
+
+    def test_check_apertures(self):
+        opm = open_model(self.root_pth/'codev/tests/threemir.seq')
+        sm = opm.seq_model
+        wvl = sm.central_wavelength()
+        fld = opm.optical_spec.field_of_view.fields[-1]
+        pt0, dir0 = grid_of_start_rays(opm, fld, pupil_radius=1.2)
+        ray_batch = bt.trace(sm, pt0, dir0, wvl, check_apertures=True)
+        blocked = ray_batch.status == TraceStatus.Blocked
+        self.assertTrue(np.any(blocked))
+        self.assertTrue(np.all(bt.trace(sm, pt0, dir0, wvl).valid))
+        for i in range(len(pt0)):
+            ray, op, _, status, surf = rt.trace(sm, pt0[i], dir0[i], wvl,
+                                                raise_errors=False,
+                                                check_apertures=True)
+            self.assertEqual(status, ray_batch.status[i])
+            self.assertEqual(len(ray), ray_batch.num_segs[i])
+            if status != TraceStatus.OK:
+                self.assertEqual(surf, ray_batch.fail_surf[i])
+        i = np.flatnonzero(blocked)[0]
+        with self.assertRaises(TraceRayBlockedError):
+            rt.trace(sm, pt0[i], dir0[i], wvl, check_apertures=True)
+
+    def test_ray_segs(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        sm = opm.seq_model
+        fld = opm.optical_spec.field_of_view.fields[0]
+        pt0, dir0 = grid_of_start_rays(opm, fld, num_rays=3)
+        ray_batch = bt.trace(sm, pt0, dir0, sm.central_wavelength())
+        ray, op, wvl = ray_batch.ray_pkg(4)
+        self.assertTrue(np.shares_memory(ray, ray_batch.segs))
+        self.assertEqual(len(ray), len(sm.ifcs))
+        npt.assert_array_equal(ray[-1].p, ray_batch.p[4, -1])
+        npt.assert_array_equal(ray[1][mc.d], ray_batch.d[4, 1])
+        self.assertEqual(ray[2].dst, ray_batch.dst[4, 2])
+
+    def test_endpoint_only(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        sm = opm.seq_model
+        wvl = sm.central_wavelength()
+        fld = opm.optical_spec.field_of_view.fields[-1]
+        pt0, dir0 = grid_of_start_rays(opm, fld, pupil_radius=1.5)
+        for i in range(len(pt0)):
+            ray, op, _, status, surf = rt.trace(sm, pt0[i], dir0[i], wvl,
+                                                raise_errors=False)
+            last_seg, last_op, _, last_status, last_surf = rt.trace(
+                sm, pt0[i], dir0[i], wvl, raise_errors=False,
+                endpoint_only=True)
+            self.assertEqual(len(last_seg), 1)
+            self.assertEqual((status, surf), (last_status, last_surf))
+            self.assertEqual(op, last_op)
+            for item, last_item in zip(ray[-1], last_seg[-1]):
+                npt.assert_array_equal(last_item, item)
+
+    def test_trace_wavelengths(self):
+        opm = open_model(self.root_pth/'codev/tests/CODV_65988.seq')
+        sm = opm.seq_model
+        wvls = opm.optical_spec.spectral_region.wavelengths
+        fld = opm.optical_spec.field_of_view.fields[-1]
+        pt0, dir0 = grid_of_start_rays(opm, fld, pupil_radius=1.5)
+        wvl_batch = bt.trace_wavelengths(sm, pt0, dir0, wvls)
+        self.assertEqual(wvl_batch.op.shape, (len(wvls), len(pt0)))
+        for k, wvl in enumerate(wvls):
+            ray_batch = bt.trace(sm, pt0, dir0, wvl)
+            wvl_view = wvl_batch.for_wavelength(k)
+            self.assertEqual(wvl_view.wvl, wvl)
+            npt.assert_array_equal(wvl_view.status, ray_batch.status)
+            npt.assert_allclose(wvl_view.p, ray_batch.p,
+                                rtol=1e-12, atol=1e-12)
+            npt.assert_allclose(wvl_view.op, ray_batch.op,
+                                rtol=1e-12, atol=1e-12)
+
+    def test_aim_chief_rays(self):
+        for model_file in ['codev/tests/ag_dblgauss.seq',
+                           'codev/tests/threemir.seq']:
+            opm = open_model(self.root_pth/model_file)
+            sm = opm.seq_model
+            wvl = sm.central_wavelength()
+            flds = opm.optical_spec.field_of_view.fields
+            aim_pts = [trace.aim_chief_ray(opm, fld, wvl) for fld in flds]
+            for fld in flds:
+                fld.aim_pt = None
+            batch_aim_pts = trace.aim_chief_rays(opm, flds, wvl)
+            for fld, aim_pt, batch_aim_pt in zip(flds, aim_pts,
+                                                 batch_aim_pts):
+                npt.assert_allclose(batch_aim_pt, aim_pt, atol=1e-5)
+                fld.aim_pt = batch_aim_pt
+                ray, _, _ = trace.trace_base(opm, [0., 0.], fld, wvl)
+                npt.assert_allclose(ray[sm.stop_surface][mc.p][:2], 0.,
+                                    atol=1e-5)
+
+    def test_incremental_trace(self):
+        # the aspheres of the cell phone camera are intersected iteratively
+        for model_file, srf in [('codev/tests/ag_dblgauss.seq', 10),
+                                ('optical/tests/cell_phone_camera.roa', 5)]:
+            opm = open_model(self.root_pth/model_file)
+            sm = opm.seq_model
+            wvl = sm.central_wavelength()
+            fld = opm.optical_spec.field_of_view.fields[-1]
+            pt0, dir0 = grid_of_start_rays(opm, fld, pupil_radius=1.5)
+            inc_trace = bt.IncrementalTrace(sm, pt0, dir0, wvl)
+            inc_trace.trace()
+            self.assertEqual(inc_trace.start_surf, 0)
+            for i in range(2):
+                inc_trace.trace()
+                self.assertIsNone(inc_trace.start_surf)
+
+            sm.ifcs[srf].profile.cv *= 1.01
+            opm.update_model()
+            ray_batch = inc_trace.trace()
+            self.assertEqual(inc_trace.start_surf, srf-1)
+            full_batch = bt.trace(sm, pt0, dir0, wvl)
+            self.assertTrue(np.any(~full_batch.valid))
+            npt.assert_array_equal(ray_batch.status, full_batch.status)
+            npt.assert_array_equal(ray_batch.num_segs, full_batch.num_segs)
+            npt.assert_array_equal(ray_batch.p, full_batch.p)
+            npt.assert_array_equal(ray_batch.d, full_batch.d)
+            npt.assert_array_equal(ray_batch.op, full_batch.op)
+
+    def test_float32_trace(self):
+        for model_file in ['codev/tests/ag_dblgauss.seq',
+                           'codev/tests/threemir.seq']:
+            opm = open_model(self.root_pth/model_file)
+            sm = opm.seq_model
+            wvl = sm.central_wavelength()
+            length = sum(abs(gap.thi) for gap in sm.gaps[1:])
+            for fld in opm.optical_spec.field_of_view.fields:
+                pt0, dir0 = grid_of_start_rays(opm, fld)
+                ray_batch = bt.trace(sm, pt0, dir0, wvl)
+                batch32 = bt.trace(sm, pt0, dir0, wvl, dtype=np.float32)
+                self.assertEqual(batch32.p.dtype, np.float32)
+                npt.assert_array_equal(batch32.status, ray_batch.status)
+                valid = ray_batch.valid
+                npt.assert_allclose(batch32.p[valid, -1],
+                                    ray_batch.p[valid, -1],
+                                    rtol=0, atol=2.5e-6*length)
+                npt.assert_allclose(batch32.d[valid, -1],
+                                    ray_batch.d[valid, -1],
+                                    rtol=0, atol=2e-6)
+
+    def test_coddington_batch(self):
+        for model_file in ['optical/tests/cell_phone_camera.roa',
+                           'codev/tests/threemir.seq']:
+            opm = open_model(self.root_pth/model_file)
+            osp = opm.optical_spec
+            _, wvl, foc = osp.lookup_fld_wvl_focus(0)
+            max_field = osp.field_of_view.max_field()[0]
+            flds = [Field(y=y) for y in np.linspace(0., max_field, 5)]
+            s_dfoc, t_dfoc = trace.trace_astigmatism_coddington_fans(
+                opm, flds, wvl, foc)
+            for fld, s_foc, t_foc in zip(flds, s_dfoc, t_dfoc):
+                s_ref, t_ref = trace.trace_astigmatism(opm, fld, wvl, foc,
+                                                       dx=1e-4, dy=1e-4)
+                npt.assert_allclose([s_foc, t_foc], [s_ref, t_ref],
+                                    atol=1e-4)
+                cr = trace.RayPkg(*trace.trace_base(opm, [0., 0.], fld, wvl))
+                npt.assert_allclose(trace.trace_coddington_fan(opm, cr, foc),
+                                    [s_foc, t_foc], rtol=1e-12, atol=1e-12)
+
+    def test_reverse_trace(self):
+        for model_file in model_files:
+            with self.subTest(model=model_file):
+                opm = open_test_model(self, model_file)
+                sm = opm.seq_model
+                wvl = sm.central_wavelength()
+                plan = sm.trace_plan(wvl)
+                atol = 1e-10*max(1., sum(abs(gap.thi) for gap in sm.gaps[1:]))
+                fld = opm.optical_spec.field_of_view.fields[-1]
+                pt0, dir0 = grid_of_start_rays(opm, fld, num_rays=5)
+                ray_batch = bt.trace(sm, pt0, dir0, wvl)
+                valid = ray_batch.valid
+                rev_batch = bt.trace_reverse(sm, ray_batch.p[:, -1],
+                                             -ray_batch.d[:, -1], wvl)
+                self.assertTrue(np.all(rev_batch.valid[valid]))
+                # the reversed directions leaving each interface are the
+                #  forward directions arriving at it
+                d_in = np.einsum('kij,nkj->nki', plan.rot[:-1],
+                                 ray_batch.d[:, :-1])
+                rev_p = rev_batch.p[valid, ::-1]
+                rev_d = rev_batch.d[valid, ::-1]
+                npt.assert_allclose(rev_p[:, 1:], ray_batch.p[valid, 1:],
+                                    rtol=1e-10, atol=atol)
+                npt.assert_allclose(rev_d[:, 1:], -d_in[valid],
+                                    rtol=1e-10, atol=1e-10)
+                npt.assert_allclose(rev_batch.op[valid], ray_batch.op[valid],
+                                    rtol=1e-10, atol=atol)
+
+        opm = open_model(self.root_pth/'models/Cassegrain.roa')
+        sm = opm.seq_model
+        wvl = sm.central_wavelength()
+        fld = opm.optical_spec.field_of_view.fields[-1]
+        ray_batch = trace.trace_base_batch(opm, [[0., 0.]], fld, wvl)
+        rev_batch = trace.trace_reverse_batch(opm, ray_batch.p[:, -1, :2],
+                                              [0., 0.], wvl)
+        npt.assert_allclose(-rev_batch.d[0, -1], ray_batch.d[0, 0],
+                            atol=1e-8)
+
+    def test_models(self):
+        for model_file in model_files:
+            with self.subTest(model=model_file):
+                opm = open_test_model(self, model_file)
+                self.compare_to_trace(opm)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
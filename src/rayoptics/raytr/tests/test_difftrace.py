@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright © 2026 Michael J. Hayford
+"""Test the differential trace against finite differences of the batch trace
+
+.. Created on Sun Oct 18 05:10:50 2026
+
+.. codeauthor: Michael J. Hayford
+"""
+
+
+import copy
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.raytr import difftrace as dt
+from rayoptics.raytr import trace
+
+
+class DiffTraceTestCase(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        self.root_pth = Path(ro.__file__).resolve().parent
+
+    def test_finite_differences(self):
+        pupils = np.array([[0.3, 0.2], [0.5, -0.3], [-0.7, 0.6]])
+        h = 1e-4
+        for model_file in ['codev/tests/singlet.seq',
+                           'codev/tests/folded_lenses.seq',
+                           'codev/tests/dec_tilt_test.seq']:
+            opm = open_model(self.root_pth/model_file)
+            wvl = opm.seq_model.central_wavelength()
+            fld = opm.optical_spec.field_of_view.fields[-1]
+            diff_rays = dt.trace_pupil_field(opm, pupils, fld, wvl)
+            self.assertEqual(diff_rays.jacobian().shape, (3, 2, 4))
+            for m in range(4):
+                rays = []
+                for sign in (1., -1.):
+                    pp = pupils.copy()
+                    fl = copy.copy(fld)
+                    if m < 2:
+                        pp[:, m] += sign*h
+                    elif m == 2:
+                        fl.x += sign*h
+                    else:
+                        fl.y += sign*h
+                    rays.append(trace.trace_base_batch(opm, pp, fl, wvl))
+                fd_p = (rays[0].p - rays[1].p)/(2*h)
+                fd_d = (rays[0].d - rays[1].d)/(2*h)
+                npt.assert_allclose(diff_rays.dp[:, 1:, m], fd_p[:, 1:],
+                                    rtol=0, atol=1e-5)
+                npt.assert_allclose(diff_rays.dd[:, 1:, m], fd_d[:, 1:],
+                                    rtol=0, atol=1e-7)
+
+    def test_astigmatism(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        wvl = opm.seq_model.central_wavelength()
+        for fld in opm.optical_spec.field_of_view.fields:
+            s_foc, t_foc = dt.trace_astigmatism(opm, fld, wvl, 0.)
+            s_ref, t_ref = trace.trace_astigmatism(opm, fld, wvl, 0.,
+                                                   dx=1e-4, dy=1e-4)
+            npt.assert_allclose([s_foc, t_foc], [s_ref, t_ref], atol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright © 2026 Michael J. Hayford
+"""Test the compiled trace kernels against the single ray trace
+
+    If numba isn't installed, the kernels run as Python functions.
+
+.. Created on Sun Oct 18 04:47:34 2026
+
+.. codeauthor: Michael J. Hayford
+"""
+
+
+import unittest
+import warnings
+
+import numpy.testing as npt
+
+from rayoptics.raytr import raytrace as rt
+from rayoptics.raytr import batchtrace as bt
+from rayoptics.raytr.traceerror import TraceStatus
+
+from rayoptics.raytr.tests.test_batchtrace import (grid_of_start_rays,
+                                                   model_files,
+                                                   open_test_model)
+
+
+class JitKernelsTestCase(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+    def compare_to_trace_raw(self, opm):
+        sm = opm.seq_model
+        wvl = sm.central_wavelength()
+        path = list(sm.path(wvl))
+        for fld in opm.optical_spec.field_of_view.fields:
+            pt0, dir0 = grid_of_start_rays(opm, fld, num_rays=7,
+                                           pupil_radius=1.5)
+            ray_batch = bt.trace(sm, pt0, dir0, wvl, use_jit=True)
+            for i in range(len(pt0)):
+                ray, op, _, status, surf = rt.trace_raw(
+                    path, pt0[i], dir0[i], wvl, raise_errors=False,
+                    first_surf=1, last_surf=sm.get_num_surfaces()-2)
+                self.assertEqual(status, ray_batch.status[i])
+                if status != TraceStatus.OK:
+                    self.assertEqual(surf, ray_batch.fail_surf[i])
+                    continue
+                batch_ray = ray_batch.ray(i)
+                self.assertEqual(len(ray), len(batch_ray))
+                for seg, batch_seg in zip(ray, batch_ray):
+                    for item, batch_item in zip(seg, batch_seg):
+                        npt.assert_allclose(batch_item, item,
+                                            rtol=1e-10, atol=1e-10)
+                npt.assert_allclose(ray_batch.op[i], op,
+                                    rtol=1e-10, atol=1e-10)
+
+    def test_models(self):
+        for model_file in model_files:
+            with self.subTest(model=model_file):
+                opm = open_test_model(self, model_file)
+                self.compare_to_trace_raw(opm)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright © 2026 Michael J. Hayford
+"""Test tracing lists and grids of rays with a process pool
+
+.. Created on Sun Oct 18 04:44:10 2026
+
+.. codeauthor: Michael J. Hayford
+"""
+
+
+import unittest
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.raytr import analyses
+from rayoptics.raytr.parallel import ModelPoolExecutor
+
+
+class ParallelTraceTestCase(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        self.root_pth = Path(ro.__file__).resolve().parent
+        self.opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+
+    def test_trace_list_of_rays(self):
+        wvl = self.opm.seq_model.central_wavelength()
+        rays = [(np.array([0., y, 0.]), np.array([0., 0., 1.]), wvl)
+                for y in np.linspace(-60., 60., 41)]
+        serial = analyses.trace_list_of_rays(self.opm, rays,
+                                             output_filter='last')
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            pooled = analyses.trace_list_of_rays(self.opm, rays,
+                                                 output_filter='last',
+                                                 executor=executor,
+                                                 chunksize=6)
+        self.assertEqual(len(pooled), len(rays))
+        self.assertTrue(any(ray_pkg is None for ray_pkg in serial))
+        for ray_pkg, pooled_pkg in zip(serial, pooled):
+            self.assertEqual(ray_pkg is None, pooled_pkg is None)
+            if ray_pkg is not None:
+                npt.assert_array_equal(pooled_pkg[0][0], ray_pkg[0][0])
+                self.assertEqual(pooled_pkg[1], ray_pkg[1])
+
+    def test_trace_ray_grid(self):
+        osp = self.opm.optical_spec
+        fld = osp.field_of_view.fields[-1]
+        wvl = self.opm.seq_model.central_wavelength()
+        grid_rng = [np.array([-1., -1.]), np.array([1., 1.]), 9]
+        serial = analyses.trace_ray_grid(self.opm, grid_rng, fld, wvl, 0.)
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            pooled = analyses.trace_ray_grid(self.opm, grid_rng, fld, wvl, 0.,
+                                             executor=executor)
+        for row, pooled_row in zip(serial, pooled):
+            for ri, pooled_ri in zip(row, pooled_row):
+                self.assertEqual(ri[:2], pooled_ri[:2])
+                self.assertEqual(ri[2] is None, pooled_ri[2] is None)
+                if ri[2] is not None:
+                    npt.assert_array_equal(pooled_ri[2][0].p, ri[2][0].p)
+
+    def test_model_pool_executor(self):
+        wvl = self.opm.seq_model.central_wavelength()
+        rays = [(np.array([0., y, 0.]), np.array([0., 0., 1.]), wvl)
+                for y in np.linspace(-20., 20., 21)]
+        # a second model, changed so that its rays differ
+        other_opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        other_opm.seq_model.ifcs[1].profile.cv *= 1.01
+        other_opm.update_model()
+        with ModelPoolExecutor(self.opm, max_workers=2) as executor:
+            for opm in (self.opm, other_opm):
+                serial = analyses.trace_list_of_rays(opm, rays,
+                                                     output_filter='last')
+                pooled = analyses.trace_list_of_rays(opm, rays,
+                                                     output_filter='last',
+                                                     executor=executor,
+                                                     chunksize=4)
+                for ray_pkg, pooled_pkg in zip(serial, pooled):
+                    npt.assert_array_equal(pooled_pkg[0][0], ray_pkg[0][0])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
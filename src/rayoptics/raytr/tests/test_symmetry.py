@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright © 2026 Michael J. Hayford
+"""Test pupil sampling using the symmetry of the model against a full trace
+
+.. Created on Sun Oct 18 05:26:54 2026
+
+.. codeauthor: Michael J. Hayford
+"""
+
+
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.elem.profiles import YToroid
+from rayoptics.raytr import symmetry as sym
+from rayoptics.raytr import trace
+
+
+class SymmetryTestCase(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        self.root_pth = Path(ro.__file__).resolve().parent
+        g = np.linspace(-1., 1., 9)
+        self.pupils = np.array([[x, y] for x in g for y in g
+                                if x**2 + y**2 < 1.0])
+
+    def compare_traces(self, opm, symmetries):
+        wvl = opm.seq_model.central_wavelength()
+        flds = opm.optical_spec.field_of_view.fields
+        for fld, symmetry in zip(flds, symmetries):
+            self.assertEqual(sym.field_symmetry(opm, fld), symmetry)
+            full = trace.trace_base_batch(opm, self.pupils, fld, [wvl])
+            rays = trace.trace_base_batch(opm, self.pupils, fld, [wvl],
+                                          use_symmetry=True)
+            npt.assert_array_equal(rays.valid, full.valid)
+            valid = full.valid
+            for attr in ('p', 'd', 'nrml', 'op'):
+                npt.assert_allclose(getattr(rays, attr)[valid],
+                                    getattr(full, attr)[valid],
+                                    rtol=0, atol=1e-12)
+
+    def test_rotational(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        self.assertEqual(sym.model_symmetry(opm.seq_model), sym.Rotational)
+        self.compare_traces(opm, [sym.Rotational, sym.Bilateral,
+                                  sym.Bilateral])
+
+    def test_biaxial(self):
+        opm = open_model(self.root_pth/'codev/tests/singlet.seq')
+        s1 = opm.seq_model.ifcs[1]
+        s1.profile = YToroid(c=s1.profile.cv, rR=-80.)
+        opm.update_model()
+        self.assertEqual(sym.model_symmetry(opm.seq_model), sym.Biaxial)
+        self.compare_traces(opm, [sym.Biaxial, sym.Bilateral])
+
+    def test_bilateral(self):
+        opm = open_model(self.root_pth/'codev/tests/folded_lenses.seq')
+        self.assertEqual(sym.model_symmetry(opm.seq_model), sym.Bilateral)
+        self.compare_traces(opm, [sym.Bilateral])
+
+    def test_unique_pupils(self):
+        unique, index, xfrm = sym.unique_pupils(self.pupils, sym.Rotational)
+        r = np.hypot(self.pupils[:, 0], self.pupils[:, 1])
+        self.assertEqual(len(unique), len(np.unique(r)))
+        npt.assert_allclose(np.einsum('nij,nj->ni', xfrm, unique[index]),
+                            self.pupils, atol=1e-15)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
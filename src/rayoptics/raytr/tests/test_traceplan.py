@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright © 2026 Michael J. Hayford
+"""Test TracePlan construction and caching
+
+.. Created on Sun Oct 18 04:29:28 2026
+
+.. codeauthor: Michael J. Hayford
+"""
+
+
+import unittest
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.raytr import batchtrace as bt
+from rayoptics.raytr import traceplan
+from rayoptics.raytr.traceplan import Dummy, Refract, Reflect, Phase
+
+from rayoptics.raytr.tests.test_batchtrace import grid_of_start_rays
+
+
+class TracePlanTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_pth = Path(ro.__file__).resolve().parent
+
+    def test_plan_matches_path(self):
+        opm = open_model(self.root_pth/'codev/tests/threemir.seq')
+        sm = opm.seq_model
+        wvl = sm.central_wavelength()
+        plan = sm.trace_plan(wvl)
+        path = list(sm.path(wvl))
+        self.assertEqual(len(plan), len(path))
+        for i, (sg, plan_sg) in enumerate(zip(path, plan)):
+            self.assertIs(sg[0], plan_sg[0])
+            npt.assert_array_equal(plan.rot[i], sg[2][0])
+            npt.assert_array_equal(plan.t[i], sg[2][1])
+            self.assertEqual(plan.rndx[i], sg[3])
+            self.assertEqual(plan.z_dir[i], sg[4])
+            self.assertEqual(plan.opcode[i],
+                             traceplan.opcode_for_interface(sg[0]))
+        self.assertEqual(np.count_nonzero(plan.opcode == Reflect), 3)
+
+    def test_phase_opcode(self):
+        opm = open_model(self.root_pth/'codev/tests/CODV_65988.seq')
+        plan = opm.seq_model.trace_plan()
+        phs = [i for i, ifc in enumerate(plan.ifcs)
+               if hasattr(ifc, 'phase_element')]
+        self.assertTrue(len(phs) > 0)
+        for i in phs:
+            self.assertEqual(plan.opcode[i], Refract | Phase)
+        self.assertTrue(np.all(plan.opcode[[0, -1]] != Dummy))
+
+    def test_cache_invalidation(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        sm = opm.seq_model
+        plan = sm.trace_plan()
+        self.assertIs(plan, sm.trace_plan())
+        sm.ifcs[1].profile.cv *= 1.01
+        opm.update_model()
+        new_plan = sm.trace_plan()
+        self.assertIsNot(plan, new_plan)
+        self.assertEqual(new_plan.cv[1], sm.ifcs[1].profile.cv)
+
+    def test_stale_profile_data(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        sm = opm.seq_model
+        wvl = sm.central_wavelength()
+        fld = opm.optical_spec.field_of_view.fields[-1]
+        pt0, dir0 = grid_of_start_rays(opm, fld, num_rays=5)
+        plan = sm.trace_plan(wvl)
+        self.assertTrue(plan.is_current())
+        # change the curvatures without update_model()
+        for srf in (3, 5):
+            sm.ifcs[srf].profile.cv *= 1.01
+            self.assertFalse(plan.is_current())
+        new_plan = sm.trace_plan(wvl)
+        self.assertIsNot(plan, new_plan)
+        self.assertTrue(new_plan.is_current())
+        jit_batch = bt.trace(sm, pt0, dir0, wvl, use_jit=True)
+        np_batch = bt.trace(sm, pt0, dir0, wvl, use_jit=False)
+        npt.assert_array_equal(jit_batch.status, np_batch.status)
+        valid = np_batch.valid
+        self.assertTrue(np.any(valid))
+        npt.assert_allclose(jit_batch.p[valid], np_batch.p[valid],
+                            rtol=1e-12, atol=1e-12)
+        npt.assert_allclose(jit_batch.d[valid], np_batch.d[valid],
+                            rtol=1e-12, atol=1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -19,11 +19,16 @@ import pandas as pd
 import attr
 
 from . import raytrace as rt
+from . import batchtrace as bt
+from . import parallel
+from . import symmetry as sym
 from .analyses import (wave_abr_full_calc,
                        get_chief_ray_pkg,
                        setup_exit_pupil_coords)
 from rayoptics.optical import model_constants as mc
-from .traceerror import TraceError, TraceMissedSurfaceError, TraceTIRError
+from .traceplan import TracePlan
+from .traceerror import (TraceError, TraceMissedSurfaceError, TraceTIRError,
+                         TraceStatus)
 from rayoptics.util.misc_math import normalize
 
 
@@ -152,6 +157,94 @@ def trace_base(opt_model, pupil, fld, wvl, **kwargs):
     return rt.trace(opt_model.seq_model, pt0, dir0, wvl, **kwargs)
 
 
+def trace_base_batch(opt_model, pupils, fld, wvl, **kwargs):
+    """Trace a batch of rays specified by relative aperture and field point.
+
+    Args:
+        opt_model: instance of :class:`~.OpticalModel` to trace
+        pupils: (N, 2) array of relative pupil coordinates of the rays
+        fld: instance of :class:`~.Field`
+        wvl: ray trace wavelength in nm, or a list of wavelengths
+        **kwargs: keyword arguments
+
+    Keyword Args:
+        use_symmetry: if True, only the pupil points that are unique under
+                      the symmetry of the model and field are traced, and
+                      the results are mirrored or rotated back to the full
+                      list of pupils; see :mod:`~.symmetry`. The default is
+                      False.
+
+    Returns:
+        a :class:`~.RayBatch` with the traced ray data. If **wvl** is a list,
+        the rays are traced in all of the wavelengths in a single pass and the
+        RayBatch has a leading wavelength axis; see
+        :func:`~.batchtrace.trace_wavelengths`.
+    """
+    if kwargs.pop('use_symmetry', False):
+        symmetry = sym.NoSymmetry
+        if not (kwargs.get('check_apertures', False) or 'restart' in kwargs):
+            symmetry = sym.field_symmetry(opt_model, fld)
+        if symmetry != sym.NoSymmetry:
+            unique, index, xfrm = sym.unique_pupils(pupils, symmetry)
+            ray_batch = trace_base_batch(opt_model, unique, fld, wvl,
+                                         **kwargs)
+            return sym.expand_ray_batch(ray_batch, index, xfrm)
+
+    vig_pupils = np.array([fld.apply_vignetting(pupil)
+                           for pupil in pupils]).reshape(-1, 2)
+    osp = opt_model.optical_spec
+    fod = osp.parax_data.fod
+    eprad = fod.enp_radius
+    aim_pt = np.array([0., 0.])
+    if hasattr(fld, 'aim_pt') and fld.aim_pt is not None:
+        aim_pt = fld.aim_pt
+    pt1 = np.empty((len(vig_pupils), 3))
+    pt1[:, :2] = eprad*vig_pupils + aim_pt
+    pt1[:, 2] = fod.obj_dist+fod.enp_dist
+    pt0 = np.tile(osp.obj_coords(fld), (len(vig_pupils), 1))
+    dir0 = pt1 - pt0
+    length = norm(dir0, axis=1)
+    dir0 = dir0/length[:, np.newaxis]
+    if np.ndim(wvl) == 0:
+        return bt.trace(opt_model.seq_model, pt0, dir0, wvl, **kwargs)
+    else:
+        return bt.trace_wavelengths(opt_model.seq_model, pt0, dir0, wvl,
+                                    **kwargs)
+
+
+def trace_reverse_batch(opt_model, img_pts, pupils, wvl, **kwargs):
+    """Trace a batch of rays from the image back to the object.
+
+    The rays start from points on the image interface and are aimed at
+    points in the paraxial exit pupil, e.g. to back project the pixels of a
+    detector through the model.
+
+    Args:
+        opt_model: instance of :class:`~.OpticalModel` to trace
+        img_pts: (N, 2) array of x, y coordinates on the image interface
+        pupils: (N, 2) array of relative exit pupil coordinates of the rays,
+                or a single pupil point for all of the rays
+        wvl: ray trace wavelength in nm, or a list of wavelengths
+        **kwargs: keyword arguments for :func:`~.batchtrace.trace_raw`
+
+    Returns:
+        a :class:`~.RayBatch` with the traced ray data, with the interfaces
+        in reverse order, see :func:`~.batchtrace.trace_reverse`
+    """
+    fod = opt_model.optical_spec.parax_data.fod
+    img_pts = np.array(img_pts, dtype=float).reshape(-1, 2)
+    pupils = np.broadcast_to(np.asarray(pupils, dtype=float), img_pts.shape)
+    pt0 = np.zeros((len(img_pts), 3))
+    pt0[:, :2] = img_pts
+    pt1 = np.empty((len(img_pts), 3))
+    pt1[:, :2] = fod.exp_radius*pupils
+    pt1[:, 2] = fod.exp_dist - fod.img_dist
+    dir0 = pt1 - pt0
+    length = norm(dir0, axis=1)
+    dir0 = dir0/length[:, np.newaxis]
+    return bt.trace_reverse(opt_model.seq_model, pt0, dir0, wvl, **kwargs)
+
+
 def iterate_ray(opt_model, ifcx, xy_target, fld, wvl, **kwargs):
     """ iterates a ray to xy_target on interface ifcx, returns aim points on
     the paraxial entrance pupil plane
@@ -259,10 +352,9 @@ def trace_boundary_rays_at_field(opt_model, fld, wvl, use_named_tuples=False):
     rim_rays = []
     osp = opt_model.optical_spec
     for p in osp.pupil.pupil_rays:
-        try:
-            ray, op, wvl = trace_base(opt_model, p, fld, wvl)
-        except TraceError as ray_error:
-            ray = ray_error.ray
+        ray, op, wvl, status, _ = trace_base(opt_model, p, fld, wvl,
+                                             raise_errors=False)
+        if status != TraceStatus.OK:
             op = 0.
 
         if use_named_tuples:
@@ -340,18 +432,27 @@ def trace_chief_ray(opt_model, fld, wvl, foc):
     return cr, cr_exp_seg
 
 
-def trace_fan(opt_model, fan_rng, fld, wvl, foc, img_filter=None,
-              **kwargs):
+def fan_pupils(fan_rng):
+    """ returns a list of the pupil coordinates for the fan **fan_rng** """
     start = np.array(fan_rng[0])
     stop = fan_rng[1]
     num = fan_rng[2]
     step = (stop - start)/(num - 1)
-    fan = []
+    pupils = []
     for r in range(num):
-        pupil = np.array(start)
-        ray, op, wvl = trace_base(opt_model, pupil, fld, wvl, **kwargs)
-        # opl = rt.calc_optical_path(ray, opt_model.seq_model.path())
-        ray_pkg = ray, op, wvl
+        pupils.append(np.array(start))
+        start += step
+    return pupils
+
+
+def trace_fan(opt_model, fan_rng, fld, wvl, foc, img_filter=None,
+              **kwargs):
+    """ trace a fan of rays; failed rays are passed as None to img_filter """
+    pupils = fan_pupils(fan_rng)
+    ray_batch = trace_base_batch(opt_model, pupils, fld, wvl, **kwargs)
+    fan = []
+    for k, pupil in enumerate(pupils):
+        ray_pkg = ray_batch.ray_pkg(k)
 
         if img_filter:
             result = img_filter(pupil, ray_pkg)
@@ -359,48 +460,122 @@ def trace_fan(opt_model, fan_rng, fld, wvl, foc, img_filter=None,
         else:
             fan.append([pupil, ray_pkg])
 
-        start += step
     return fan
 
 
 def trace_grid(opt_model, grid_rng, fld, wvl, foc, img_filter=None,
                form='grid', append_if_none=True, **kwargs):
+    """ trace a grid of rays; see :func:`trace_grid_wavelengths` """
+    if img_filter:
+        def wvl_filter(pupil, wi, ray_pkg):
+            return img_filter(pupil, ray_pkg)
+    else:
+        wvl_filter = None
+    grids = trace_grid_wavelengths(opt_model, grid_rng, fld, [wvl], foc,
+                                   img_filter=wvl_filter, form=form,
+                                   append_if_none=append_if_none, **kwargs)
+    return grids[0]
+
+
+def trace_pupil_list(opt_model, pupils, fld, wvls, use_symmetry=True,
+                     **kwargs):
+    """ trace a list of pupil coordinates in each of the wavelengths **wvls**
+
+    If **use_symmetry** is True, only the pupil coordinates that are unique
+    under the symmetry of the model and field are traced, see
+    :mod:`~.symmetry`.
+
+    Returns:
+        a list of (pupil, ray_pkgs) for each pupil, where ray_pkgs is a list
+        of the ray_pkg for each wavelength, None if the ray failed
+    """
+    ray_batch = trace_base_batch(opt_model, pupils, fld, wvls,
+                                 use_symmetry=use_symmetry, **kwargs)
+    return [(pupil, [ray_batch.ray_pkg((wi, k)) for wi in range(len(wvls))])
+            for k, pupil in enumerate(pupils)]
+
+
+def trace_grid_wavelengths(opt_model, grid_rng, fld, wvls, foc,
+                           img_filter=None, form='grid', append_if_none=True,
+                           executor=None, chunksize=None, **kwargs):
+    """ trace a grid of rays in all of **wvls** in a single pass
+
+    Args:
+        opt_model: instance of :class:`~.OpticalModel` to trace
+        grid_rng: [start, stop, num] definition of the pupil grid
+        fld: instance of :class:`~.Field`
+        wvls: list of wavelengths in nm
+        foc: focus shift to apply to the results
+        img_filter: optional callable, img_filter(pupil, wi, ray_pkg), that
+                    returns the result for each pupil point. ray_pkg is None
+                    if the pupil point is outside the pupil or the ray failed.
+        form: 'grid' returns a 2d grid per wavelength, 'list' a list of
+              results
+        append_if_none: if True, results for rays outside the pupil or that
+                        failed are included when they are None
+        executor: optional :class:`concurrent.futures.Executor` used to
+                  trace chunks of rays in parallel, see :mod:`~.parallel`.
+                  The img_filter is applied to the results in the calling
+                  process.
+        chunksize: the number of rays in each chunk traced by the executor
+
+    Returns:
+        a list of the grid of results for each wavelength
+    """
     start = np.array(grid_rng[0])
     stop = grid_rng[1]
     num = grid_rng[2]
     step = np.array((stop - start)/(num - 1))
-    grid = []
+    pupils = []
     for i in range(num):
-        if form == 'list':
-            working_grid = grid
-        elif form == 'grid':
-            grid_row = []
-            working_grid = grid_row
-
         for j in range(num):
-            pupil = np.array(start)
-            if (pupil[0]**2 + pupil[1]**2) < 1.0:
-                ray_pkg = trace_base(opt_model, pupil, fld, wvl, **kwargs)
-                if img_filter:
-                    result = img_filter(pupil, ray_pkg)
-                    working_grid.append(result)
-                else:
-                    working_grid.append([pupil[0], pupil[1], ray_pkg])
-            else:  # ray outside pupil
+            pupils.append(np.array(start))
+            start[1] += step[1]
+        start[0] += step[0]
+        start[1] = grid_rng[0][1]
+
+    inside = [(pupil[0]**2 + pupil[1]**2) < 1.0 for pupil in pupils]
+    inside_pupils = [p for p, ok in zip(pupils, inside) if ok]
+    if executor is None:
+        traced = trace_pupil_list(opt_model, inside_pupils, fld, wvls,
+                                  **kwargs)
+    else:
+        traced = parallel.map_chunks(executor, trace_pupil_list, opt_model,
+                                     inside_pupils, fld, wvls,
+                                     chunksize=chunksize, **kwargs)
+
+    grids = []
+    for wi in range(len(wvls)):
+        grid = []
+        k = 0
+        for i in range(num):
+            if form == 'list':
+                working_grid = grid
+            elif form == 'grid':
+                grid_row = []
+                working_grid = grid_row
+
+            for j in range(num):
+                if inside[i*num + j]:
+                    pupil, ray_pkgs = traced[k]
+                    ray_pkg = ray_pkgs[wi]
+                    k += 1
+                else:  # ray outside pupil
+                    pupil = pupils[i*num + j]
+                    ray_pkg = None
                 if img_filter:
-                    result = img_filter(pupil, None)
-                    if result is not None or append_if_none:
+                    result = img_filter(pupil, wi, ray_pkg)
+                    if (ray_pkg is not None or result is not None or
+                            append_if_none):
                         working_grid.append(result)
                 else:
-                    if append_if_none:
-                        working_grid.append([pupil[0], pupil[1], None])
+                    if ray_pkg is not None or append_if_none:
+                        working_grid.append([pupil[0], pupil[1], ray_pkg])
 
-            start[1] += step[1]
-        if form == 'grid':
-            grid.append(grid_row)
-        start[0] += step[0]
-        start[1] = grid_rng[0][1]
-    return np.array(grid)
+            if form == 'grid':
+                grid.append(grid_row)
+        grids.append(np.array(grid))
+    return grids
 
 
 def aim_chief_ray(opt_model, fld, wvl=None):
@@ -413,6 +588,118 @@ def aim_chief_ray(opt_model, fld, wvl=None):
     return aim_pt
 
 
+def aim_chief_rays(opt_model, flds, wvl=None, max_iter=20, tol=1e-12):
+    """ aim the chief rays of all **flds** at the center of the stop surface
+
+    The fields are iterated together, using Newton's method with a forward
+    difference Jacobian. Each iteration traces the current aim points and the
+    x and y increments for all fields in a single batch. The rays are only
+    traced as far as the stop surface. The iteration starts from the current
+    aim_pt of each field, if it has one, and ends when the aim point
+    increment is less than **tol**, or the residual stops decreasing at the
+    limit of the ray trace precision.
+
+    As in :func:`iterate_ray`, fields with zero x object coordinate are only
+    iterated in y. Fields that fail to trace or converge are aimed using
+    :func:`aim_chief_ray`.
+
+    Args:
+        opt_model: the :class:`~.OpticalModel`
+        flds: list of :class:`~.Field` to be aimed
+        wvl: wavelength in nm, defaults to central wavelength
+        max_iter: maximum number of Newton iterations
+        tol: convergence tolerance on the aim point increment, relative to
+             the entrance pupil radius
+
+    Returns:
+        list of aim points on the paraxial entrance pupil plane, one for each
+        field
+    """
+    seq_model = opt_model.seq_model
+    if wvl is None:
+        wvl = seq_model.central_wavelength()
+    stop = seq_model.stop_surface
+    if stop is None:  # floating stop surface - use entrance pupil for aiming
+        return [np.array([0., 0.]) for fld in flds]
+
+    osp = opt_model.optical_spec
+    fod = osp.parax_data.fod
+    dist = fod.obj_dist + fod.enp_dist
+    enp_radius = abs(fod.enp_radius) if fod.enp_radius else 1.
+    h = 1e-5*enp_radius
+    # the partial path to the stop is traced on every iteration
+    plan = TracePlan(seq_model.path(wvl, stop=stop+1), wvl)
+
+    def stop_coords(aim_pts, pt0):
+        pt1 = np.empty((len(aim_pts), 3))
+        pt1[:, :2] = aim_pts
+        pt1[:, 2] = dist
+        dir0 = pt1 - pt0
+        dir0 = dir0/norm(dir0, axis=1)[:, np.newaxis]
+        ray_batch = bt.trace_raw(plan, pt0, dir0, wvl)
+        # rays that reach the stop surface are usable, even if they TIR there
+        return ray_batch.p[:, stop, :2], ray_batch.num_segs > stop
+
+    num_flds = len(flds)
+    pt0 = np.array([osp.obj_coords(fld) for fld in flds]).reshape(-1, 3)
+    aim_pts = np.zeros((num_flds, 2))
+    for i, fld in enumerate(flds):
+        if getattr(fld, 'aim_pt', None) is not None:
+            aim_pts[i] = fld.aim_pt
+    one_d = pt0[:, 0] == 0.0
+    aim_pts[one_d, 0] = 0.0
+
+    # a residual that stops decreasing below stall_tol is at the limit of the
+    #  ray trace precision. For distant objects, this is set by the
+    #  resolution of the ray direction, eps times the distance to the pupil.
+    obj_dist = norm(pt0 - [0., 0., dist], axis=1)
+    stall_tol = 1e3*tol*enp_radius + 10*np.finfo(float).eps*obj_dist
+
+    converged = np.zeros(num_flds, dtype=bool)
+    last_res = np.full(num_flds, np.inf)
+    active = np.arange(num_flds)
+    for _ in range(max_iter):
+        if len(active) == 0:
+            break
+        n = len(active)
+        aim = aim_pts[active]
+        xy, ok = stop_coords(np.concatenate((aim, aim + [h, 0.],
+                                             aim + [0., h])),
+                             np.tile(pt0[active], (3, 1)))
+        ok = ok[:n] & ok[n:2*n] & ok[2*n:]
+        r = xy[:n]
+        jac = np.stack(((xy[n:2*n] - r)/h, (xy[2*n:] - r)/h), axis=2)
+
+        delta = np.full((n, 2), np.nan)
+        od = one_d[active]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta[od, 0] = 0.
+            delta[od, 1] = -r[od, 1]/jac[od, 1, 1]
+            td = ~od & ok & (np.linalg.det(jac) != 0.)
+            if np.any(td):
+                delta[td] = -np.linalg.solve(jac[td],
+                                             r[td, :, np.newaxis])[..., 0]
+        good = ok & np.all(np.isfinite(delta), axis=1)
+
+        # stop when the residual no longer decreases. This is convergence
+        #  only if the residual is small; otherwise, e.g. after a Newton step
+        #  overshoots, the field is left to aim_chief_ray.
+        res = np.max(np.abs(r), axis=1)
+        stalled = good & (res >= last_res[active])
+        last_res[active] = res
+        good &= ~stalled
+        aim_pts[active[good]] += delta[good]
+        done = ((stalled & (res <= stall_tol[active])) |
+                (good & (np.max(np.abs(delta), axis=1) <= tol*enp_radius)))
+        converged[active[done]] = True
+        active = active[good & ~done]
+
+    aim_pts = list(aim_pts)
+    for i in np.flatnonzero(~converged):
+        aim_pts[i] = aim_chief_ray(opt_model, flds[i], wvl)
+    return aim_pts
+
+
 def apply_paraxial_vignetting(opt_model):
     osp = opt_model.optical_spec
     pm = opt_model.parax_model
@@ -487,65 +774,143 @@ def trace_astigmatism_coddington_fan(opt_model, fld, wvl, foc):
     return s_dfoc, t_dfoc
 
 
+def trace_astigmatism_coddington_fans(opt_model, flds, wvl, foc):
+    """ calculate astigmatism by Coddington trace at all of the **flds**
+
+    The chief rays of all of the fields are traced together in a single
+    batch, see :func:`trace_coddington_batch`. The aim point of each field is
+    used if it has one, as in :func:`trace_base`.
+
+    Returns:
+        (**s_dfoc**, **t_dfoc**) arrays of the sagittal and tangential focus
+        shifts at the **flds**, NaN where the chief ray failed to trace
+    """
+    osp = opt_model.optical_spec
+    fod = osp.parax_data.fod
+    pt0 = np.array([osp.obj_coords(fld) for fld in flds]).reshape(-1, 3)
+    pt1 = np.zeros((len(flds), 3))
+    for i, fld in enumerate(flds):
+        if getattr(fld, 'aim_pt', None) is not None:
+            pt1[i, :2] = fld.aim_pt
+    pt1[:, 2] = fod.obj_dist + fod.enp_dist
+    dir0 = pt1 - pt0
+    dir0 = dir0/norm(dir0, axis=1)[:, np.newaxis]
+    ray_batch = bt.trace(opt_model.seq_model, pt0, dir0, wvl)
+    return trace_coddington_batch(opt_model, ray_batch, foc=foc)
+
+
 def trace_coddington_fan(opt_model, ray_pkg, foc=None):
     """ astigmatism calculation via Coddington trace
 
-.. note:: spherical surfaces only
+    See :func:`trace_coddington_batch` for the assumptions made.
+
+    Args:
+        opt_model: the :class:`~.OpticalModel`
+        ray_pkg: the chief ray, as returned by :func:`trace_base`
+        foc: defocus amount
+
+    Returns:
+        tuple: sagittal and tangential focus shifts
     """
-    seq_model = opt_model.seq_model
-    wl = seq_model.index_for_wavelength(ray_pkg.wvl)
-
-    path = itertools.zip_longest(ray_pkg.ray, seq_model.ifcs,
-                                 [n[wl] for n in seq_model.rndx],
-                                 seq_model.lcl_tfrms,
-                                 seq_model.z_dir)
-
-    before_rind = seq_model.rndx[0][wl]
-    before_dir = None
-    for r, ifc, after_rind, tfrm, z_dir in path:
-        pt, after_dir, after_dst, normal = r
-        if before_dir is not None:
-            normal_len = norm(normal)
-            cosI_prime = np.dot(after_dir, normal)/normal_len
-            sinI_prime = math.sqrt(1.0 - cosI_prime**2)
-            sinI = after_rind*sinI_prime/before_rind
-            cosI = math.sqrt(1.0 - sinI**2)
-
-            obl_power = ifc.optical_power
-            if obl_power != 0.0:
-                obl_power *= ((after_rind*cosI_prime - before_rind*cosI) /
-                              (after_rind - before_rind))
-#                print("pwr, obl_pwr, after_dst:",
-#                      ifc.optical_power/(after_rind - before_rind),
-#                      obl_power, after_dst)
-#            else:
-#                print("pwr, obl_pwr, after_dst:",
-#                      ifc.optical_power, obl_power, after_dst)
-
-            n_by_s_prime = before_rind/s_before + obl_power
-            s_prime = after_rind/n_by_s_prime
-#            print("s, s':", s_before, s_prime)
-            s_before = s_prime - after_dst
-
-            n_cosIp2_by_t_prime = before_rind*cosI**2/t_before + obl_power
-            t_prime = after_rind*cosI_prime**2/n_cosIp2_by_t_prime
-#            print("t, t':", t_before, t_prime)
-            t_before = t_prime - after_dst
-        else:
-            s_before = -after_dst
-            t_before = -after_dst
+    ray = ray_pkg.ray
+    plan = opt_model.seq_model.trace_plan(ray_pkg.wvl)
+    p = np.array([r[mc.p] for r in ray])[np.newaxis]
+    d = np.array([r[mc.d] for r in ray])[np.newaxis]
+    dst = np.array([r[mc.dst] for r in ray])[np.newaxis]
+    s_dfoc, t_dfoc = coddington_trace(plan, p, d, dst, foc=foc)
+    return s_dfoc[0], t_dfoc[0]
 
-        before_rind = after_rind
-        before_dir = after_dir
 
-    s_dfoc = s_prime*after_dir[2] + pt[2]
-    t_dfoc = t_prime*after_dir[2] + pt[2]
-    if foc is not None:
-        focus_shift = foc
-        s_dfoc -= focus_shift
-        t_dfoc -= focus_shift
+def trace_coddington_batch(opt_model, ray_batch, foc=None):
+    """ astigmatism calculation via Coddington trace of a batch of chief rays
+
+    This is the generalized Coddington trace of :func:`coddington_trace`
+    applied to the rays of a :class:`~.RayBatch`.
 
-#    print("delta s, t:", s_dfoc, t_dfoc)
+    Returns:
+        (**s_dfoc**, **t_dfoc**) arrays of the sagittal and tangential focus
+        shifts of the rays, NaN for the rays that failed to trace
+    """
+    plan = opt_model.seq_model.trace_plan(ray_batch.wvl)
+    segs = ray_batch.segs
+    s_dfoc, t_dfoc = coddington_trace(plan, segs.p, segs.d, segs.dst,
+                                      foc=foc)
+    s_dfoc[~ray_batch.valid] = np.nan
+    t_dfoc[~ray_batch.valid] = np.nan
+    return s_dfoc, t_dfoc
+
+
+def coddington_trace(plan, p, d, dst, foc=None):
+    """ generalized Coddington trace along a batch of rays
+
+    The sagittal and tangential foci of the narrow pencils about each ray
+    are traced with the Coddington equations. The oblique power of each
+    interface uses the normal curvatures of its profile at the ray
+    intersection point, in the sagittal and tangential directions, so
+    that conics, aspheres and toroids are handled as well as spheres.
+    Interfaces without a profile use their optical power. The optical
+    path of phase elements is not included.
+
+    The sagittal and tangential directions are assumed to be principal
+    directions of the wavefront and of the profiles, i.e. the rays lie in a
+    plane of symmetry of the system, as for :func:`trace_astigmatism`. No
+    check is done to ensure this.
+
+    Args:
+        plan: the :class:`~.TracePlan` the rays were traced with
+        p: (N, num_ifcs, 3) array of the ray intersection points
+        d: (N, num_ifcs, 3) array of the ray directions after each interface
+        dst: (N, num_ifcs) array of the distances to the next interface
+        foc: defocus amount
+
+    Returns:
+        (**s_dfoc**, **t_dfoc**) arrays of the sagittal and tangential focus
+        shifts of the rays
+    """
+    num_rays = len(p)
+    s_before = -dst[:, 0]
+    t_before = -dst[:, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for k in range(1, len(plan)):
+            ifc = plan.ifcs[k]
+            n_before, n_after = plan.rndx[k-1], plan.rndx[k]
+            before_dir = np.matmul(d[:, k-1], plan.rot[k-1].T)
+            after_dir = d[:, k]
+            profile = getattr(ifc, 'profile', None)
+            if profile is not None:
+                pt = p[:, k]
+                normal = profile.normal_batch(pt)
+                cosI = np.einsum('nk,nk->n', before_dir, normal)
+                cosI_prime = np.einsum('nk,nk->n', after_dir, normal)
+
+                # sagittal and tangential directions on the profile
+                sag_dir = np.cross(before_dir, normal)
+                sag_len = norm(sag_dir, axis=1)
+                on_axis = sag_len < 1e-12
+                sag_dir[on_axis] = np.cross(normal[on_axis], [0., 1., 0.])
+                sag_dir /= norm(sag_dir, axis=1)[:, np.newaxis]
+                tan_dir = np.cross(normal, sag_dir)
+
+                gamma = n_after*cosI_prime - n_before*cosI
+                s_power = gamma*profile.normal_curvature_batch(pt, sag_dir)
+                t_power = gamma*profile.normal_curvature_batch(pt, tan_dir)
+            else:
+                cosI = cosI_prime = np.ones(num_rays)
+                s_power = t_power = np.full(num_rays, ifc.optical_power)
+
+            s_prime = n_after/(n_before/s_before + s_power)
+            t_prime = (n_after*cosI_prime**2 /
+                       (n_before*cosI**2/t_before + t_power))
+            s_before = s_prime - dst[:, k]
+            t_before = t_prime - dst[:, k]
+
+    after_dir = d[:, -1]
+    pt = p[:, -1]
+    s_dfoc = s_prime*after_dir[:, 2] + pt[:, 2]
+    t_dfoc = t_prime*after_dir[:, 2] + pt[:, 2]
+    if foc is not None:
+        s_dfoc -= foc
+        t_dfoc -= foc
     return s_dfoc, t_dfoc
 
 
@@ -7,6 +7,20 @@
 
 .. codeauthor: Michael J. Hayford
 """
+from enum import IntEnum
+
+
+class TraceStatus(IntEnum):
+    """ Ray status codes, used by traces that don't raise exceptions
+
+    The nonzero codes correspond to the :class:`TraceError` subclasses; each
+    has a **status** attribute with its code.
+    """
+    OK = 0
+    MissedSurface = 1
+    TIR = 2
+    Evanescent = 3
+    Blocked = 4
 
 
 class TraceError(Exception):
@@ -15,6 +29,8 @@ class TraceError(Exception):
 
 class TraceMissedSurfaceError(TraceError):
     """ Exception raised when ray misses a surface """
+    status = TraceStatus.MissedSurface
+
     def __init__(self, ifc=None, prev_seg=None):
         self.ifc = ifc
         self.prev_seg = prev_seg
@@ -22,6 +38,8 @@ class TraceMissedSurfaceError(TraceError):
 
 class TraceTIRError(TraceError):
     """ Exception raised when ray TIRs on a surface """
+    status = TraceStatus.TIR
+
     def __init__(self, inc_dir, normal, prev_indx, follow_indx):
         self.ifc = None
         self.int_pt = None
@@ -33,6 +51,8 @@ class TraceTIRError(TraceError):
 
 class TraceEvanescentRayError(TraceError):
     """ Exception raised when ray diffracts evanescently at a surface """
+    status = TraceStatus.Evanescent
+
     def __init__(self, ifc, int_pt, inc_dir, normal, prev_indx, follow_indx):
         self.ifc = ifc
         self.int_pt = int_pt
@@ -44,6 +64,8 @@ class TraceEvanescentRayError(TraceError):
 
 class TraceRayBlockedError(TraceError):
     """ Exception raised when ray is blocked by an aperture on a surface """
+    status = TraceStatus.Blocked
+
     def __init__(self, ifc, int_pt, inc_dir, prev_indx, follow_indx):
         self.ifc = ifc
         self.int_pt = int_pt
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright © 2026 Michael J. Hayford
+""" Precomputed description of a sequential path for ray tracing
+
+    A :class:`TracePlan` is built from a sequential model path for a single
+    wavelength. It stores the data needed by the ray tracers as flat lists and
+    numpy arrays, and replaces the per surface tests of the interface
+    interaction mode with integer opcodes.
+
+    Trace plans are cached by the :class:`~.SequentialModel`, see
+    :meth:`~.SequentialModel.trace_plan`. The cache is cleared when the model
+    is updated, and a cached plan is rebuilt after a change to any profile.
+
+.. Created on Sun Oct 18 04:29:28 2026
+
+.. codeauthor: Michael J. Hayford
+"""
+
+import numpy as np
+
+from rayoptics.elem.profiles import (Spherical, Conic, EvenPolynomial,
+                                     profile_version)
+from rayoptics.elem.surface import Surface
+from rayoptics.optical.model_constants import Intfc, Tfrm, Indx, Zdir
+
+# interface opcodes; Phase is a flag that may be combined with the others
+Dummy = 0
+Refract = 1
+Reflect = 2
+Phase = 4
+
+# profile types that can be traced using the profile data in the plan
+PrfOther = 0
+PrfConic = 1
+PrfEvenPoly = 2
+
+
+def opcode_for_interface(ifc):
+    """ returns the trace opcode for the interface **ifc** """
+    if ifc.interact_mode == 'reflect':
+        op_code = Reflect
+    elif ifc.interact_mode == 'transmit':
+        op_code = Refract
+    else:
+        op_code = Dummy
+    if hasattr(ifc, 'phase_element'):
+        op_code |= Phase
+    return op_code
+
+
+def profile_type_for_interface(ifc):
+    """ returns the profile type of the interface **ifc**
+
+    Only :class:`~.Surface` interfaces with :class:`~.Spherical`,
+    :class:`~.Conic` or :class:`~.EvenPolynomial` profiles are fully described
+    by the cv, cc and coefs data of a :class:`TracePlan`; all others are
+    PrfOther.
+    """
+    if type(ifc) is not Surface:
+        return PrfOther
+    prf_type = type(ifc.profile)
+    if prf_type is Spherical or prf_type is Conic:
+        return PrfConic
+    elif prf_type is EvenPolynomial:
+        return PrfEvenPoly
+    else:
+        return PrfOther
+
+
+def profile_data(ifcs):
+    """ returns the profile data of the interfaces **ifcs**
+
+    Returns:
+        (**prf_type**, **cv**, **cc**, **coefs**, **num_coefs**), arrays as
+        described in :class:`TracePlan`
+    """
+    prf_type = np.array([profile_type_for_interface(ifc) for ifc in ifcs],
+                        dtype=int)
+    profiles = [getattr(ifc, 'profile', None) for ifc in ifcs]
+    cv = np.array([getattr(prf, 'cv', 0.0) for prf in profiles])
+    cc = np.array([getattr(prf, 'cc', 0.0) for prf in profiles])
+    coef_lists = [getattr(prf, 'coefs', []) for prf in profiles]
+    max_coefs = max([len(c) for c in coef_lists], default=0)
+    coefs = np.zeros((len(ifcs), max_coefs))
+    for i, c in enumerate(coef_lists):
+        coefs[i, :len(c)] = c
+    num_coefs = np.array([getattr(prf, 'max_nonzero_coef', 0)
+                          for prf in profiles], dtype=int)
+    return prf_type, cv, cc, coefs, num_coefs
+
+
+class TracePlan():
+    """ Flat, precomputed form of a sequential path at a single wavelength
+
+    Iterating over a TracePlan returns the same sequence of path tuples,
+    (**Intfc, Gap, Tfrm, Indx, Zdir**), as the path it was built from.
+
+    Attributes:
+        wvl: wavelength in nm
+        reverse: True if the path runs from image space towards the object
+        seq: list of path tuples
+        ifcs: list of interfaces
+        rot: (num_ifcs, 3, 3) array of rotation matrices to the next interface
+        t: (num_ifcs, 3) array of translations to the next interface
+        rndx: (num_ifcs,) array of refractive indices following each interface
+        z_dir: (num_ifcs,) array of z_dir following each interface
+        opcode: (num_ifcs,) array of interface opcodes
+        prf_type: (num_ifcs,) array of profile types
+        cv: (num_ifcs,) array of profile curvatures
+        cc: (num_ifcs,) array of profile conic constants
+        coefs: (num_ifcs, max_coefs) array of profile polynomial coefficients
+        num_coefs: (num_ifcs,) array of the number of nonzero coefficients
+        profile_version: the :func:`~.profiles.profile_version` when the
+                         profile data was taken
+    """
+
+    def __init__(self, path, wvl, reverse=False):
+        self.wvl = wvl
+        self.reverse = reverse
+        self.seq = [tuple(sg) for sg in path]
+
+        self.ifcs = [sg[Intfc] for sg in self.seq]
+        self.rot = np.array([sg[Tfrm][0] for sg in self.seq]).reshape(-1, 3, 3)
+        self.t = np.array([sg[Tfrm][1] for sg in self.seq]).reshape(-1, 3)
+        self.rndx = np.array([sg[Indx] for sg in self.seq], dtype=float)
+        self.z_dir = np.array([sg[Zdir] for sg in self.seq], dtype=float)
+        self.opcode = np.array([opcode_for_interface(ifc)
+                                for ifc in self.ifcs], dtype=int)
+
+        self.profile_version = profile_version()
+        (self.prf_type, self.cv, self.cc, self.coefs,
+         self.num_coefs) = profile_data(self.ifcs)
+
+    def is_current(self):
+        """ returns True if no profile has changed since the plan was built
+
+        The profile data is a snapshot, taken when the plan was built, of the
+        interface profiles; it is used by the compiled kernels in
+        :mod:`~.jitkernels`, while the NumPy trace uses the interfaces
+        directly. The check compares :func:`~.profiles.profile_version`
+        counts, so it is cheap enough to make before every trace.
+        """
+        return self.profile_version == profile_version()
+
+    def __len__(self):
+        return len(self.seq)
+
+    def __iter__(self):
+        return iter(self.seq)
@@ -11,6 +11,10 @@
 
 from enum import Enum, auto
 
+import numpy as np
+
+from rayoptics.raytr.traceerror import TraceMissedSurfaceError
+
 
 class InteractionMode(Enum):
     """ enum for different interact_mode specifications
@@ -102,9 +106,50 @@ class Interface:
     def normal(self, p):
         pass
 
-    def phase(self, pt, d_in, normal, wl):
+    def intersect_batch(self, p0, d, eps=1.0e-12, z_dir=1.0):
+        """ Intersect a batch of rays with the interface.
+
+        The default implementation calls :meth:`intersect` for each ray.
+        Subclasses with an array-native intersection should override this.
+
+        Args:
+            p0: (N, 3) array of ray start points in interface coordinates
+            d: (N, 3) array of ray direction cosines in interface coordinates
+            eps: numeric tolerance for convergence of any iterative procedure
+            z_dir: +1 if propagation positive direction, -1 if otherwise
+
+        Returns:
+            tuple: distances *s* (N,), intersection points *p* (N, 3) and a
+            boolean *missed* mask (N,) for rays that missed the interface
+        """
+        num_rays = len(p0)
+        s = np.full(num_rays, np.nan)
+        p = np.full((num_rays, 3), np.nan)
+        missed = np.zeros(num_rays, dtype=bool)
+        for i in range(num_rays):
+            try:
+                s[i], p[i] = self.intersect(p0[i], d[i], eps=eps, z_dir=z_dir)
+            except TraceMissedSurfaceError:
+                missed[i] = True
+        return s, p, missed
+
+    def normal_batch(self, p):
+        """ Returns an (N, 3) array of the interface normals at points *p*. """
+        return np.array([self.normal(pi) for pi in p]).reshape(-1, 3)
+
+    def point_inside(self, x, y):
+        """ Returns True if the point x, y is inside the clear aperture. """
+        return True
+
+    def point_inside_batch(self, x, y):
+        """ Returns a boolean array, True where x, y are inside the aperture.
+        """
+        return np.ones(np.shape(x), dtype=bool)
+
+    def phase(self, pt, d_in, normal, wl, reverse=False):
         if hasattr(self, 'phase_element'):
-            return self.phase_element.phase(pt, d_in, normal, wl=wl)
+            return self.phase_element.phase(pt, d_in, normal, wl=wl,
+                                            reverse=reverse)
 
     def apply_scale_factor(self, scale_factor):
         self.max_aperture *= scale_factor
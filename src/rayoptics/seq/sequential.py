@@ -15,6 +15,7 @@ from . import medium as m
 from rayoptics.raytr import raytrace as rt
 from rayoptics.raytr import trace as trace
 from rayoptics.raytr import analyses
+from rayoptics.raytr import traceplan
 from rayoptics.elem import transform as trns
 from rayoptics.optical.model_constants import Intfc, Gap, Indx, Tfrm, Zdir
 from opticalglass import glassfactory as gfact
@@ -61,6 +62,8 @@ class SequentialModel:
         rndx: a list with refractive indices for all **wvls**
         z_dir: -1 if gap follows an odd number of reflections, otherwise +1
         gbl_tfrms: global coordinates of each interface wrt the 1st interface
+        trace_plans: dict of cached :class:`~.TracePlan`, keyed by wavelength
+                     and trace direction
         stop_surface (int): index of stop interface
         cur_surface (int): insertion index for next interface
     """
@@ -76,6 +79,7 @@ class SequentialModel:
         self.cur_surface = None
         self.wvlns = []
         self.rndx = []
+        self.trace_plans = {}
         self.do_apertures = True
         if do_init:
             self._initialize_arrays()
@@ -88,6 +92,7 @@ class SequentialModel:
         del attrs['z_dir']
         del attrs['wvlns']
         del attrs['rndx']
+        del attrs['trace_plans']
         return attrs
 
     def _initialize_arrays(self):
@@ -129,26 +134,65 @@ class SequentialModel:
             stop: first value beyond the end of the range
             step: increment or stride of range
 
+        If **step** is negative, the path runs from image space towards the
+        object, e.g. path(step=-1) is the full path in reverse. The
+        transforms, refractive indices and z_dir of a reverse path are those
+        for rays travelling backwards: the transform of each interface is to
+        the preceding interface, see :meth:`compute_reverse_transforms`, and
+        the index and z_dir are those of the preceding gap, with the sign of
+        z_dir reversed. The last interface of a reverse path keeps the index
+        and z_dir of the gap after it.
+
         Returns:
             (**ifcs, gaps, lcl_tfrms, rndx, z_dir**)
         """
         if wl is None:
             wl = self.central_wavelength()
 
+        wl_idx = self.index_for_wavelength(wl)
         if step < 0:
-            gap_start = start - 1
-        else:
-            gap_start = start
+            idx = range(len(self.ifcs))[start:stop:step]
+            ifcs = [self.ifcs[i] for i in idx]
+            # each reverse segment is in the gap preceding its interface
+            gaps = [self.gaps[i-1] for i in idx if i > 0]
+            seg_idx = [max(i-1, 0) for i in idx]
+            rndx = [self.rndx[i][wl_idx] for i in seg_idx]
+            z_dir = [-self.z_dir[i] for i in seg_idx]
+            rev_tfrms = self.compute_reverse_transforms()
+            tfrms = [rev_tfrms[i] for i in idx]
+            return itertools.zip_longest(ifcs, gaps, tfrms, rndx, z_dir)
 
-        wl_idx = self.index_for_wavelength(wl)
         rndx = [n[wl_idx] for n in self.rndx[start:stop:step]]
         path = itertools.zip_longest(self.ifcs[start:stop:step],
-                                     self.gaps[gap_start:stop:step],
+                                     self.gaps[start:stop:step],
                                      self.lcl_tfrms[start:stop:step],
                                      rndx,
                                      self.z_dir[start:stop:step])
         return path
 
+    def trace_plan(self, wl=None, reverse=False):
+        """ returns a :class:`~.TracePlan` for the full path at wavelength wl
+
+        The trace plan is cached until the model is updated. A cached plan
+        is also rebuilt after a change to any profile, e.g. to a curvature
+        without an update_model() call, see :meth:`~.TracePlan.is_current`;
+        changes to the gaps or decenters require update_model().
+
+        Args:
+            wl: wavelength in nm for path, defaults to central wavelength
+            reverse: if True, the plan is for the reverse path, from the
+                     image interface to the object
+        """
+        if wl is None:
+            wl = self.central_wavelength()
+
+        plan = self.trace_plans.get((wl, reverse))
+        if plan is None or not plan.is_current():
+            path = self.path(wl, step=-1 if reverse else 1)
+            plan = traceplan.TracePlan(path, wl, reverse=reverse)
+            self.trace_plans[(wl, reverse)] = plan
+        return plan
+
     def calc_ref_indices_for_spectrum(self, wvls):
         """ returns a list with refractive indices for all **wvls**
 
@@ -239,6 +283,7 @@ class SequentialModel:
 
         if ifc.interact_mode == 'reflect':
             self.update_reflections(start=surf)
+        self.trace_plans = {}
 
     def remove(self, *args, prev=False):
         """Remove surf and gap at cur_surface or an input index argument.
@@ -279,6 +324,7 @@ class SequentialModel:
         del self.gaps[idx]
         del self.z_dir[idx]
         del self.rndx[idx]
+        self.trace_plans = {}
 
     def add_surface(self, surf_data, **kwargs):
         """ add a surface where surf is a list that contains:
@@ -307,6 +353,7 @@ class SequentialModel:
                     sg[Gap].sync_to_restore(self)
         if not hasattr(self, 'do_apertures'):
             self.do_apertures = True
+        self.trace_plans = {}
 
     def update_model(self):
         # delta n across each surface interface must be set to some
@@ -340,6 +387,7 @@ class SequentialModel:
 
         self.gbl_tfrms = self.compute_global_coords()
         self.lcl_tfrms = self.compute_local_transforms()
+        self.trace_plans = {}
 
         if self.do_apertures:
             if len(self.ifcs) > 2:
@@ -355,6 +403,7 @@ class SequentialModel:
 
         self.gbl_tfrms = self.compute_global_coords()
         self.lcl_tfrms = self.compute_local_transforms()
+        self.trace_plans = {}
 
     def set_from_specsheet(self, specsheet):
         if self.opt_model.optical_spec.parax_data is None:
@@ -560,6 +609,11 @@ class SequentialModel:
         fan_start[xy] = -1.0
         fan_stop[xy] = 1.0
         fan_def = [fan_start, fan_stop, num_rays]
+
+        # trace the fan in all wavelengths at once
+        pupils = trace.fan_pupils(fan_def)
+        ray_batch = trace.trace_base_batch(self.opt_model, pupils, fld,
+                                           wvls.wavelengths)
         max_y_val = 0.0
         rc = []
         for wi, wvl in enumerate(wvls.wavelengths):
@@ -570,12 +624,14 @@ class SequentialModel:
                                                       image_pt=ref_img_pt)
             fld.chief_ray = cr_pkg
             fld.ref_sphere = rs_pkg
-            fan = trace.trace_fan(self.opt_model, fan_def, fld, wvl, foc,
-                                  img_filter=lambda p, ray_pkg:
-                                  fct(p, xy, ray_pkg, fld, wvl, foc))
             f_x = []
             f_y = []
-            for p, y_val in fan:
+            for k, p in enumerate(pupils):
+                ray_pkg = ray_batch.ray_pkg((wi, k))
+                if ray_pkg is not None:
+                    y_val = fct(p, xy, ray_pkg, fld, wvl, foc)
+                else:
+                    y_val = np.nan
                 f_x.append(p[xy])
                 f_y.append(y_val)
                 if abs(y_val) > max_y_val:
@@ -601,16 +657,14 @@ class SequentialModel:
         fld.chief_ray = cr_pkg
         fld.ref_sphere = rs_pkg
 
-        grids = []
         grid_start = np.array([-1., -1.])
         grid_stop = np.array([1., 1.])
         grid_def = [grid_start, grid_stop, num_rays]
-        for wi, wvl in enumerate(wv_list):
-            grid = trace.trace_grid(self.opt_model, grid_def, fld, wvl, foc,
-                                    form=form, append_if_none=append_if_none,
-                                    img_filter=lambda p, ray_pkg:
-                                    fct(p, wi, ray_pkg, fld, wvl, foc))
-            grids.append(grid)
+        grids = trace.trace_grid_wavelengths(
+            self.opt_model, grid_def, fld, wv_list, foc,
+            form=form, append_if_none=append_if_none,
+            img_filter=lambda p, wi, ray_pkg:
+            fct(p, wi, ray_pkg, fld, wv_list[wi], foc))
         rc = wvls.render_colors
         return grids, rc
 
@@ -690,6 +744,20 @@ class SequentialModel:
     def trace(self, pt0, dir0, wvl, **kwargs):
         return rt.trace(self, pt0, dir0, wvl, **kwargs)
 
+    def compute_reverse_transforms(self):
+        """ Return reverse surface coordinates (r.T, t) for each interface.
+
+        The transform of each interface is to the coordinates of the preceding
+        interface, in the same form as :meth:`compute_local_transforms`. The
+        first interface has an identity transform.
+        """
+        tfrms = [(np.identity(3), np.array([0., 0., 0.]))]
+        for i in range(1, len(self.ifcs)):
+            zdist = self.gaps[i-1].thi
+            r, t = trns.reverse_transform(self.ifcs[i-1], zdist, self.ifcs[i])
+            tfrms.append((r.transpose(), t))
+        return tfrms
+
     def compute_global_coords(self, glo=1):
         """ Return global surface coordinates (rot, t) wrt surface glo. """
         tfrms = []